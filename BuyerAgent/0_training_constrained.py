@@ -1,11 +1,22 @@
 import os
+import time
+import argparse
 import torch
 import numpy as np
 import random
 import pandas as pd
 import multiprocessing as mp
-from environment_constrained import StockEnvironment, EnvRunningStat
+from collections import deque
+from environment_constrained import VecStockEnvironment, EnvRunningStat
+from orchestration.dataset_cache import load_dataset
+from orchestration.shared_dataset import SharedDataset
+from orchestration.shared_rollout import SharedRollout, SharedWeights
+from orchestration.checkpoints import (TRAINING_STATE_SUFFIX, CheckpointKeeper, PlateauStopper, load_training_state,
+                                 rng_state, save_training_state, set_rng_state)
 from agent.ppo_agent import ParallelPPOAgent
+from training import (checkpoint_files, collect_rollout, evaluate_policy, load_running_stat, make_eval_env,
+                      merge_running_stats, resolve_config, running_stat_state, save_result, snapshot_agent,
+                      train_buyer_agent)
 from torch.utils.tensorboard import SummaryWriter
 from loguru import logger
 
@@ -25,92 +36,90 @@ GAMMA = 0.8
 K_EPOCHS = 30                
 EPS_CLIP = 0.2               
 BATCH_SIZE = 2048
+ADVANTAGE_MODE = "mc"        # "mc" (retornos Monte Carlo) ou "gae" (GAE(λ) vetorizado)
+GAE_LAMBDA = 0.95            # Só usado com ADVANTAGE_MODE = "gae"
+
+# Sobreposição atores/learner: com MAX_POLICY_LAG = 0 o ciclo é síncrono (os workers esperam pelo update);
+# com MAX_POLICY_LAG = k > 0 os workers recolhem a ronda seguinte com a política anterior enquanto o learner
+# otimiza, com até k rondas pedidas de avanço (a política de recolha fica no máximo k versões atrás do learner).
+# O desfasamento é corrigido pelo rácio de importância com clipping do PPO (logprobs guardados na recolha).
+MAX_POLICY_LAG = 0
 
 PRINT_FREQ_EPISODES = 1
-SAVE_MODEL_FREQ = 1
 
-def ppo_worker(worker_id, excel_path, num_envs, capacity, weights_queue, results_queue, shared_stats):
-    """ Worker que gere um bloco de ambientes PPO de forma sincronizada com ações limitadas """
-    # Criar sub-ambientes
-    envs = [StockEnvironment(excel_path=excel_path, is_training=True, train_split=0.6, 
-                             max_capacity=capacity, shared_stats=shared_stats) for _ in range(num_envs)]
+# Avaliação periódica no split de teste (ação determinística) a cada EVAL_FREQ iterações. Só ficam em disco os
+# TOP_K_CHECKPOINTS checkpoints com maior lucro de avaliação (gravados em segundo plano, ver checkpoints.json);
+# o treino pára ao fim de EVAL_PATIENCE avaliações seguidas sem melhorar mais de EVAL_MIN_DELTA € (0 = nunca).
+EVAL_FREQ = 10
+EVAL_PATIENCE = 10
+EVAL_MIN_DELTA = 0.0
+TOP_K_CHECKPOINTS = 3
+
+def ppo_worker(worker_id, excel_path, dataset_spec, num_envs, capacity, weights_queue, results_queue, shared_stats,
+               rollouts, shared_weights):
+    """
+    Worker que gere um bloco de ambientes PPO de forma sincronizada com ações limitadas.
+    Cada sinal indica o slot de `rollouts` a preencher: o worker carrega a versão mais recente dos pesos do ator
+    de shared_weights e escreve a ronda nas colunas [worker_id * num_envs, ...) desse slot; pelas filas só passam
+    o sinal de início e um resumo da ronda (com a versão da política usada).
+    """
+    lo = worker_id * num_envs
+    # Sub-ambientes vetorizados sobre o dataset publicado em memória partilhada pelo processo principal
+    dataset = SharedDataset.attach(dataset_spec)
+    vec_env = VecStockEnvironment(excel_path, num_envs, is_training=True, train_split=0.6,
+                                  max_capacity=capacity, shared_stats=shared_stats, data_frame=dataset.frame)
     
     # O limite de ação é definido dinamicamente pelo ambiente
-    max_order_limit = envs[0].max_order_limit
+    max_order_limit = vec_env.max_order_limit
     
     agent = ParallelPPOAgent(state_dim=17, action_dim=1, max_action=max_order_limit)
     agent.device = torch.device('cpu') 
     agent.policy_old_actor.to('cpu')
     agent.policy_old_critic.to('cpu')
     
-    states = [env.reset() for env in envs]
-    states_matrix = np.array(states)
+    states_matrix = vec_env.reset()
     
     while True:
-        weights = weights_queue.get()
-        if weights is None: break
+        slot = weights_queue.get()
+        if slot is None: break
         
-        agent.policy_old_actor.load_state_dict(weights['actor'])
-        worker_memory = {
-            'states': [], 'actions': [], 'logprobs': [], 'rewards': [], 'dones': [], 'profits': []
-        }
-        
-        for step in range(HORIZON):
-            with torch.no_grad():
-                st_t = torch.FloatTensor(states_matrix).to('cpu')
-                action_mean, log_std = agent.policy_old_actor(st_t)
-                dist = torch.distributions.Normal(action_mean, torch.exp(torch.clamp(log_std, -2.3, 1.5)))
-                action_percent = dist.sample()
-                action_logprob = dist.log_prob(action_percent)
-                # Escalar com base no limite máximo e não na capacidade total do armazém!
-                physical_actions = torch.round(torch.clamp(action_percent * max_order_limit, 0, max_order_limit)).numpy().flatten()
-
-            worker_memory['states'].append(st_t)
-            worker_memory['actions'].append(action_percent)
-            worker_memory['logprobs'].append(action_logprob)
-            
-            next_states_list = []
-            rewards_list = []
-            dones_list = []
-            profits_list = []
-            
-            for i in range(num_envs):
-                ns, r, d, info = envs[i].step(physical_actions[i])
-                if d:
-                    ns = envs[i].reset()
-                next_states_list.append(ns)
-                rewards_list.append(r)
-                dones_list.append(d)
-                profits_list.append(info['profit'])
-            
-            worker_memory['rewards'].append(rewards_list)
-            worker_memory['dones'].append(dones_list)
-            worker_memory['profits'].append(profits_list)
-            
-            states_matrix = np.array(next_states_list)
-            
-        with torch.no_grad():
-            st_final = torch.FloatTensor(states_matrix).to('cpu')
-            worker_memory['states'].append(st_final)
+        policy_version = shared_weights.load_into(agent.policy_old_actor)
+        states_matrix, total_profit = collect_rollout(vec_env, agent.policy_old_actor, rollouts[slot], lo, states_matrix)
         
         results_queue.put({
             'worker_id': worker_id,
-            'memory': worker_memory,
-            'total_profit': np.sum(worker_memory['profits'])
+            'slot': slot,
+            'policy_version': policy_version,
+            'total_profit': total_profit,
+            'rsl_cache': vec_env.rsl_cache.stats(),
+            'env_stats': {name: running_stat_state(stat) for name, stat in shared_stats.items()}
         })
 
-def train_multi_core(seed: int):
+    vec_env = None
+    dataset.close()
+
+def train_multi_core(seed: int, resume: bool = False):
+    """
+    Treino PPO multi-core de uma seed. No fim de cada iteração o estado completo do learner (pesos, momentos do
+    Adam, reward_scaler, contadores, geradores aleatórios, estatísticas de recompensa de cada worker e estado
+    da avaliação) é gravado em modelos_producao_constrained/ppo_constrained_seed<seed>_training_state.pt.
+    Com resume=True o treino continua a partir desse ficheiro, se existir: perde-se no máximo a iteração que
+    estava em curso. Os episódios a meio são recomeçados do início pelos workers.
+    """
     mp.set_start_method('spawn', force=True)
     random.seed(seed)
     np.random.seed(seed)
     torch.manual_seed(seed)
     
+    # Dataset publicado uma única vez em memória partilhada; os workers anexam-se sem o copiar
+    dataset = SharedDataset.publish(EXCEL_PATH)
+    
     # Determinar dinamicamente o limite máximo de procura no treino
-    df_temp = pd.read_excel(EXCEL_PATH)
+    df_temp = dataset.frame
     split_idx = int(len(df_temp) * 0.6)
     MAX_ORDER_LIMIT = float(df_temp.iloc[:split_idx]['real_value'].max())
     
-    logger.info(f"Iniciando PPO CONSTRANGIDO | {NUM_ENVS} ambientes em {NUM_WORKERS} cores | Seed: {seed}")
+    logger.info(f"Iniciando PPO CONSTRANGIDO | {NUM_ENVS} ambientes em {NUM_WORKERS} cores | Seed: {seed} | Vantagens: {ADVANTAGE_MODE}")
     logger.info(f"Limite Máximo de Encomenda Diária (MAX_ORDER_LIMIT) = {MAX_ORDER_LIMIT} un (Capacidade Armazém = {MAX_CAPACITY} un)")
     
     shared_stats = {
@@ -118,98 +127,189 @@ def train_multi_core(seed: int):
     }
     
     agent = ParallelPPOAgent(state_dim=17, action_dim=1, max_action=MAX_ORDER_LIMIT, 
-                             lr_actor=LR_ACTOR, lr_critic=LR_CRITIC, gamma=GAMMA, K_epochs=K_EPOCHS, eps_clip=EPS_CLIP, batch_size=BATCH_SIZE)
+                             lr_actor=LR_ACTOR, lr_critic=LR_CRITIC, gamma=GAMMA, K_epochs=K_EPOCHS, eps_clip=EPS_CLIP, batch_size=BATCH_SIZE,
+                             advantage_mode=ADVANTAGE_MODE, gae_lambda=GAE_LAMBDA)
     
     writer = SummaryWriter(log_dir=f"runs/ppo_constrained_seed_{seed}")
     save_dir = "modelos_producao_constrained"
     os.makedirs(save_dir, exist_ok=True)
+    eval_env = make_eval_env(EXCEL_PATH, dataset.frame, MAX_CAPACITY)
+    stopper = PlateauStopper(EVAL_PATIENCE, EVAL_MIN_DELTA)
+    keeper = CheckpointKeeper(save_dir, top_k=TOP_K_CHECKPOINTS)
+    
+    # Estatísticas de recompensa de cada worker (cada processo tem a sua cópia de shared_stats)
+    worker_stats = [shared_stats] * NUM_WORKERS
+    worker_env_stats = [{name: running_stat_state(stat) for name, stat in shared_stats.items()}] * NUM_WORKERS
+    state_path = os.path.join(save_dir, f"ppo_constrained_seed{seed}{TRAINING_STATE_SUFFIX}")
+    resume_state = None
+    if resume and os.path.exists(state_path):
+        resume_state = load_training_state(state_path)
+        # max_episodes pode mudar (prolongar um treino); os restantes hiperparâmetros devem ser os mesmos
+        changed = {k: v for k, v in resume_state['config'].items() if k != 'max_episodes' and training_config().get(k) != v}
+        if changed:
+            logger.warning(f"Hiperparâmetros diferentes dos do treino interrompido: {changed}")
+        agent.load_training_state(resume_state['agent'])
+        stopper.load_state_dict(resume_state['stopper'])
+        keeper.load_state_dict(resume_state['checkpoints'])
+        saved_stats = resume_state['worker_env_stats']
+        worker_env_stats = [saved_stats[i % len(saved_stats)] for i in range(NUM_WORKERS)]
+        worker_stats = [{name: load_running_stat(EnvRunningStat(), st) for name, st in ws.items()} for ws in worker_env_stats]
+        logger.info(f"A retomar o treino de {state_path}: iteração {resume_state['iteration']}, "
+                    f"{resume_state['episodes_played']} episódios")
+    elif resume:
+        logger.warning(f"Sem estado de treino em {state_path}: a começar do zero")
     
     weights_queues = [mp.Queue() for _ in range(NUM_WORKERS)]
     results_queue = mp.Queue()
     
+    # Rollouts e pesos do ator em memória partilhada: as filas só transportam sinais.
+    # Um slot de rollout por ronda em curso (max(1, MAX_POLICY_LAG)), reutilizado assim que é copiado para o buffer
+    rollouts = [SharedRollout(HORIZON, ENVS_PER_WORKER * NUM_WORKERS, state_dim=17, action_dim=1)
+                for _ in range(max(1, MAX_POLICY_LAG))]
+    shared_weights = SharedWeights(agent.policy_old_actor)
+    
     processes = []
     for i in range(NUM_WORKERS):
-        p = mp.Process(target=ppo_worker, args=(i, EXCEL_PATH, ENVS_PER_WORKER, MAX_CAPACITY, weights_queues[i], results_queue, shared_stats))
+        p = mp.Process(target=ppo_worker, args=(i, EXCEL_PATH, dataset.spec, ENVS_PER_WORKER, MAX_CAPACITY, weights_queues[i], results_queue, worker_stats[i],
+                                                rollouts, shared_weights))
         p.start()
         processes.append(p)
         
     episodes_played = 0
     iteration = 0
+    total_iterations = -(-MAX_EPISODES_TOTAL // NUM_ENVS)
     
     losses_total = []
     losses_actor = []
     losses_critic = []
+    if resume_state is not None:
+        iteration = resume_state['iteration']
+        episodes_played = resume_state['episodes_played']
+        losses_total, losses_actor, losses_critic = (list(l) for l in resume_state['losses'])
+        set_rng_state(resume_state['rng'])
+    
+    # Rondas pedidas aos workers e ainda não consumidas pelo learner (slot por ordem de pedido)
+    pending_slots = deque()
+    arrived = {slot: [] for slot in range(len(rollouts))}
+    dispatched = iteration
+    throughput = 0.0
+    
+    def dispatch(slot):
+        nonlocal dispatched
+        if dispatched >= total_iterations or stopper.should_stop:
+            return
+        for q in weights_queues:
+            q.put(slot)
+        pending_slots.append(slot)
+        dispatched += 1
     
     try:
-        while episodes_played < MAX_EPISODES_TOTAL:
+        shared_weights.publish(agent.policy_old_actor)
+        for slot in range(len(rollouts)):
+            dispatch(slot)
+        start_time = time.perf_counter()
+        start_episodes = episodes_played
+        wait_time = 0.0
+        
+        while pending_slots:
             iteration += 1
-            current_weights = {
-                'actor': {k: v.cpu() for k, v in agent.policy_old_actor.state_dict().items()}
-            }
-            for q in weights_queues:
-                q.put(current_weights)
-            
-            all_worker_data = []
-            for _ in range(NUM_WORKERS):
-                all_worker_data.append(results_queue.get())
+            slot = pending_slots.popleft()
             
-            T = len(all_worker_data[0]['memory']['rewards'])
+            # Os resultados de workers diferentes podem chegar intercalados entre slots
+            wait_start = time.perf_counter()
+            while len(arrived[slot]) < NUM_WORKERS:
+                res = results_queue.get()
+                arrived[res['slot']].append(res)
+            all_worker_data, arrived[slot] = arrived[slot], []
+            wait_time += time.perf_counter() - wait_start
+            for res in all_worker_data:
+                worker_env_stats[res['worker_id']] = res['env_stats']
             
-            for t in range(T):
-                step_states = torch.cat([res['memory']['states'][t] for res in all_worker_data], dim=0).to(agent.device)
-                step_actions = torch.cat([res['memory']['actions'][t] for res in all_worker_data], dim=0).to(agent.device)
-                step_logprobs = torch.cat([res['memory']['logprobs'][t] for res in all_worker_data], dim=0).to(agent.device)
-                step_rewards = []
-                step_dones = []
-                for res in all_worker_data:
-                    step_rewards.extend(res['memory']['rewards'][t])
-                    step_dones.extend(res['memory']['dones'][t])
-                
-                agent.buffer.states.append(step_states)
-                agent.buffer.actions.append(step_actions)
-                agent.buffer.logprobs.append(step_logprobs)
-                agent.buffer.rewards.append(step_rewards)
-                agent.buffer.is_terminals.append(step_dones)
-                
-            if len(all_worker_data[0]['memory']['states']) > T:
-                final_states = torch.cat([res['memory']['states'][T] for res in all_worker_data], dim=0).to(agent.device)
-                agent.buffer.states.append(final_states)
+            rollouts[slot].fill_buffer(agent.buffer, agent.device)
+            # O slot já foi copiado para o buffer: no modo assíncrono os workers começam já a ronda seguinte
+            policy_lag = shared_weights.version.item() - min(res['policy_version'] for res in all_worker_data)
+            if MAX_POLICY_LAG > 0:
+                dispatch(slot)
             
             loss_t, loss_a, loss_c = agent.update()
             losses_total.append(loss_t)
             losses_actor.append(loss_a)
             losses_critic.append(loss_c)
             
+            shared_weights.publish(agent.policy_old_actor)
+            if MAX_POLICY_LAG == 0:
+                dispatch(slot)
+            
             episodes_played += NUM_ENVS
+            elapsed = time.perf_counter() - start_time
+            episodes_per_sec = (episodes_played - start_episodes) / max(elapsed, 1e-9)
             avg_profit = np.mean([res['total_profit'] / ENVS_PER_WORKER for res in all_worker_data])
-            logger.info(f"Episodes: {episodes_played}/{MAX_EPISODES_TOTAL} | Batch Profit Avg: {avg_profit:.2f}€")
+            cache_hits = sum(res['rsl_cache']['hits'] for res in all_worker_data)
+            cache_misses = sum(res['rsl_cache']['misses'] for res in all_worker_data)
+            cache_hit_rate = cache_hits / max(1, cache_hits + cache_misses)
+            logger.info(f"Episodes: {episodes_played}/{MAX_EPISODES_TOTAL} | Batch Profit Avg: {avg_profit:.2f}€ | RSL cache hit rate: {cache_hit_rate:.1%} | "
+                        f"{episodes_per_sec:.1f} ep/s | Policy lag: {policy_lag}")
             writer.add_scalar("Profit/Avg_Batch", avg_profit, episodes_played)
+            writer.add_scalar("Perf/RSL_Cache_Hit_Rate", cache_hit_rate, episodes_played)
+            writer.add_scalar("Perf/Episodes_Per_Sec", episodes_per_sec, episodes_played)
+            writer.add_scalar("Perf/Learner_Wait_Fraction", wait_time / max(elapsed, 1e-9), episodes_played)
+            writer.add_scalar("Perf/Policy_Lag", policy_lag, episodes_played)
             
-            if iteration % SAVE_MODEL_FREQ == 0:
-                checkpoint_path = os.path.join(save_dir, f"ppo_constrained_iter{iteration}")
-                agent.save(checkpoint_path)
-                
-                econ_state = {
-                    'n': shared_stats['econ'].n,
-                    'mean': shared_stats['econ'].mean,
-                    'S': shared_stats['econ'].S
-                }
-                torch.save(econ_state, checkpoint_path + '_econ_stat.pth')
+            if iteration % EVAL_FREQ == 0 or iteration == total_iterations:
+                # A ronda seguinte já foi pedida: os workers recolhem enquanto o learner avalia
+                eval_profit = evaluate_policy(agent.policy_old_actor, eval_env)
+                improved = stopper.update(eval_profit, iteration)
+                # O stat_profit do processo principal nunca é atualizado: junta-se o dos workers
+                econ_stat = merge_running_stats(ws['econ'] for ws in worker_env_stats)
+                kept = keeper.offer(f"ppo_constrained_iter{iteration}", eval_profit,
+                                    checkpoint_files(snapshot_agent(agent, econ_stat)), step=iteration)
+                logger.info(f"Avaliação (teste) iteração {iteration}: lucro {eval_profit:.2f}€ | melhor {stopper.best:.2f}€ "
+                            f"(iteração {stopper.best_step})" + (" | checkpoint guardado" if kept else "")
+                            + ("" if improved else f" | sem melhoria há {stopper.evals_without_improvement} avaliações"))
+                writer.add_scalar("Profit/Eval_Test", eval_profit, episodes_played)
+                if stopper.should_stop and pending_slots:
+                    logger.info(f"Paragem antecipada: a terminar as {len(pending_slots)} rondas já pedidas aos workers")
+            
+            save_training_state(state_path, {
+                'iteration': iteration,
+                'episodes_played': episodes_played,
+                'config': training_config(),
+                'agent': agent.training_state(),
+                'worker_env_stats': list(worker_env_stats),
+                'stopper': stopper.state_dict(),
+                'checkpoints': keeper.state_dict(),
+                'losses': (losses_total, losses_actor, losses_critic),
+                'rng': rng_state(),
+            })
+            
+        elapsed = time.perf_counter() - start_time
+        throughput = (episodes_played - start_episodes) / max(elapsed, 1e-9)
+        mode = "síncrono" if MAX_POLICY_LAG == 0 else f"assíncrono (lag máx. {MAX_POLICY_LAG})"
+        logger.info(f"Modo {mode}: {episodes_played - start_episodes} episódios em {elapsed:.1f}s = {throughput:.2f} episódios/s "
+                    f"| learner à espera dos workers {wait_time / max(elapsed, 1e-9):.0%} do tempo")
+        if stopper.should_stop:
+            logger.info(f"Treino parado antecipadamente ao fim de {episodes_played}/{MAX_EPISODES_TOTAL} episódios "
+                        f"({EVAL_PATIENCE} avaliações sem melhoria)")
                 
     except KeyboardInterrupt:
         logger.warning("Treino interrompido.")
     finally:
         for q in weights_queues: q.put(None)
         for p in processes: p.join()
+        df_temp = None
+        eval_env = None
+        dataset.close()
+        dataset.unlink()
+        keeper.close()
+        if keeper.best is not None:
+            logger.info(f"Melhor checkpoint: {keeper.best['path']} (lucro de avaliação {keeper.best['score']:.2f}€, "
+                        f"iteração {keeper.best['step']})")
         
         final_path = os.path.join(save_dir, "ppo_constrained_final")
         agent.save(final_path)
         
-        econ_state = {
-            'n': shared_stats['econ'].n,
-            'mean': shared_stats['econ'].mean,
-            'S': shared_stats['econ'].S
-        }
+        # Mesmas estatísticas de worker gravadas no estado de treino (também após um --resume)
+        econ_state = running_stat_state(merge_running_stats(ws['econ'] for ws in worker_env_stats))
         torch.save(econ_state, final_path + '_econ_stat.pth')
         writer.close()
         
@@ -233,8 +333,43 @@ def train_multi_core(seed: int):
                 logger.info(f"[OK] Gráfico de losses guardado com sucesso em: {plot_loss_path}")
             except Exception as e:
                 logger.error(f"[ERRO] Falha ao gerar gráfico de losses: {e}")
+    
+    return throughput
+
+def training_config(overrides=None):
+    """ Hiperparâmetros deste script (constantes do módulo) com `overrides` aplicados por cima """
+    config = {
+        'num_envs': NUM_ENVS, 'max_episodes': MAX_EPISODES_TOTAL, 'horizon': HORIZON, 'max_capacity': MAX_CAPACITY,
+        'lr_actor': LR_ACTOR, 'lr_critic': LR_CRITIC, 'gamma': GAMMA, 'k_epochs': K_EPOCHS, 'eps_clip': EPS_CLIP,
+        'batch_size': BATCH_SIZE, 'advantage_mode': ADVANTAGE_MODE, 'gae_lambda': GAE_LAMBDA,
+        'eval_every': EVAL_FREQ, 'patience': EVAL_PATIENCE, 'min_delta': EVAL_MIN_DELTA,
+    }
+    return resolve_config(overrides, base=config)
+
+def train_single_process(seed, excel_path, save_dir, data_frame=None, hparams=None, log=logger.info):
+    """
+    Treino PPO completo num só processo (training.train_buyer_agent) com os hiperparâmetros deste script.
+    Usado pelo agendador de treinos (orchestration/training_scheduler.py), que corre vários treinos em paralelo,
+    um por core, em vez de um pool de workers por treino. `hparams` sobrepõe as constantes do módulo
+    (ver training_config). Guarda o modelo final em save_dir e devolve um resumo do treino.
+    """
+    def progress(info):
+        log(f"Episodes: {info['episodes']}/{info['max_episodes']} | Batch Profit Avg: {info['avg_profit']:.2f}€ | Loss Total: {info['loss_total']:.4f}"
+            + (f" | Eval Profit: {info['eval_profit']:.2f}€" if 'eval_profit' in info else ""))
+    
+    data = data_frame if data_frame is not None else load_dataset(excel_path)
+    result = train_buyer_agent(data, seed=seed, config=training_config(hparams), progress=progress,
+                               dataset_name=os.path.basename(excel_path))
+    final_path = os.path.join(save_dir, "ppo_constrained_final")
+    save_result(result, final_path)
+    return {**result['summary'], 'model_path': final_path, 'config': result['config']}
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Treino PPO constrangido multi-core (seeds 1337 e 42)")
+    parser.add_argument('--resume', action='store_true',
+                        help="retoma cada seed a partir do último estado de treino gravado em modelos_producao_constrained")
+    args = parser.parse_args()
+    
     SEEDS = [1337, 42]
     for current_seed in SEEDS:
-        train_multi_core(seed=current_seed)
+        train_multi_core(seed=current_seed, resume=args.resume)
@@ -8,6 +8,7 @@ import matplotlib.pyplot as plt
 
 from environment_constrained import StockEnvironment
 from agent.ppo_agent import ParallelPPOAgent
+from evaluation import evaluate, run_agent
 
 # --- CONFIGURAÇÃO ---
 EXCEL_PATH = r"Dados\m5_foods_3_080.xlsx" # Atualizado para o ficheiro correto do SKU 3_080
@@ -37,18 +38,6 @@ def inference_loop():
     # Inicia o ambiente simulando o mundo real usando os dados de teste (os últimos 40% do Excel)
     env = StockEnvironment(excel_path=EXCEL_PATH, is_training=False, train_split=0.6, max_capacity=MAX_CAPACITY)
     
-    # Inicializar Ambientes para as Baselines
-    env_dos = StockEnvironment(excel_path=EXCEL_PATH, is_training=False, train_split=0.6, max_capacity=MAX_CAPACITY)
-    env_dos.max_order_limit = float('inf') # Sem limite de encomenda para DOS
-    env_cnn = StockEnvironment(excel_path=EXCEL_PATH, is_training=False, train_split=0.6, max_capacity=MAX_CAPACITY)
-    env_cnn.max_order_limit = float('inf') # Sem limite de encomenda para CNN
-    env_minmax = StockEnvironment(excel_path=EXCEL_PATH, is_training=False, train_split=0.6, max_capacity=MAX_CAPACITY)
-    env_minmax.max_order_limit = float('inf') # Sem limite de encomenda para Min-Max
-    
-    env_dos.reset()
-    env_cnn.reset()
-    env_minmax.reset()
-    
     state_dim = 17
     action_dim = 1
     
@@ -69,9 +58,6 @@ def inference_loop():
     agent.policy_old_actor.to('cpu')
     agent.policy_old_actor.eval()
     
-    state = env.reset()
-    done = False
-    
     # Inicializa ou carrega a memória existente
     if os.path.exists(MEMORY_PATH):
         with open(MEMORY_PATH, 'rb') as f:
@@ -79,106 +65,42 @@ def inference_loop():
     else:
         experience_buffer = []
 
-    # Listas para guardar dados para os gráficos
-    rewards_agent = []
-    profits_agent = []
-    profits_dos = []
-    profits_cnn = []
-    profits_minmax = []
-    
-    actions_agent = []
-    actions_dos = []
-    actions_cnn = []
-    actions_minmax = []
-    
-    cum_profit_agent = 0
-    cum_profit_dos = 0
-    cum_profit_cnn = 0
-    cum_profit_minmax = 0
-
     print("\nSimulando a chegada de novos dias (Loop Rápido)...")
-    
-    dias_simulados = 0
-    
-    # Definição das funções das baselines (adaptadas de evaluate_ppo_mcts_foresight.py)
-    def simular_dos_3d(env_copy):
-        step = env_copy.current_step
-        lookahead = min(env_copy.max_steps, step + 3)
-        future_demands = env_copy.data.iloc[step:lookahead]['prediction'].sum()
-        current_stock = sum(env_copy.stock_profile) + sum(env_copy.in_transit.values())
-        return max(0, future_demands - current_stock)
-
-    def simular_cnn_naive(env_copy):
-        step = env_copy.current_step
-        pred_today = env_copy.data.iloc[step]['prediction']
-        pred_tomorrow = env_copy.data.iloc[min(env_copy.max_steps, step + 1)]['prediction']
-        current_stock = sum(env_copy.stock_profile) + sum(env_copy.in_transit.values())
-        stock_fim_do_dia = max(0, current_stock - pred_today)
-        return max(0, pred_tomorrow - stock_fim_do_dia)
-
-    def simular_min_max(env_copy, min_stock=100, max_stock=250):
-        current_stock = sum(env_copy.stock_profile) + sum(env_copy.in_transit.values())
-        if current_stock <= min_stock:
-            return max_stock - current_stock
-        return 0
-    
-    while not done:
-        day = env.current_step
-        
-        # 1. Ação do Agente
-        state_tensor = torch.FloatTensor(state).unsqueeze(0).to('cpu')
-        with torch.no_grad():
-            action_mean, log_std = agent.policy_old_actor(state_tensor)
-            dist = torch.distributions.Normal(action_mean, torch.exp(torch.clamp(log_std, -2.3, 1.5)))
-            action_percent = dist.sample()
-            action_logprob = dist.log_prob(action_percent)
-            physical_action = torch.round(torch.clamp(action_percent * max_order_limit, 0, max_order_limit)).numpy().flatten()[0]
 
-        # 2. Ações das Baselines
-        action_dos = simular_dos_3d(env_dos)
-        action_cnn = simular_cnn_naive(env_cnn)
-        action_minmax = simular_min_max(env_minmax)
+    # Baselines (adaptadas de evaluate_ppo_mcts_foresight.py), sem limite de encomenda, no pool de processos
+    baselines = {
+        'DOS': ('dos', {'days': 3}),
+        'CNN': ('cnn', {}),
+        'MinMax': ('minmax_position', {'min_stock': 100, 'max_stock': 250}),
+    }
 
-        # 3. Avançar os Ambientes
-        next_state, reward, done, info = env.step(physical_action)
-        _, _, _, info_dos = env_dos.step(action_dos)
-        _, _, _, info_cnn = env_cnn.step(action_cnn)
-        _, _, _, info_minmax = env_minmax.step(action_minmax)
-        
-        print(f"[Dia {day:02d}] Ação Ditada: {physical_action:04.0f} caixas | Lucro Realizado: {info['profit']:.2f}€")
-        
-        # O Gerente de Loja escreve a experiência no seu diário para o Analista ler mais tarde
-        experience_buffer.append({
-            'state': state_tensor.squeeze(0).numpy(),
-            'action': action_percent.squeeze(0).numpy(),
-            'logprob': action_logprob.squeeze(0).numpy(),
-            'reward': reward,
-            'is_terminal': done
-        })
-        
-        # Guardar dados para gráficos
-        rewards_agent.append(reward)
-        
-        cum_profit_agent += info['profit']
-        cum_profit_dos += info_dos['profit']
-        cum_profit_cnn += info_cnn['profit']
-        cum_profit_minmax += info_minmax['profit']
-        
-        profits_agent.append(cum_profit_agent)
-        profits_dos.append(cum_profit_dos)
-        profits_cnn.append(cum_profit_cnn)
-        profits_minmax.append(cum_profit_minmax)
-        
-        actions_agent.append(physical_action)
-        actions_dos.append(action_dos)
-        actions_cnn.append(action_cnn)
-        actions_minmax.append(action_minmax)
-        
-        state = next_state
-        dias_simulados += 1
-        
+    def print_day(day, action, info):
+        print(f"[Dia {day:02d}] Ação Ditada: {action:04.0f} caixas | Lucro Realizado: {info['profit']:.2f}€")
         # Simula uma pequena pausa para podermos ver no ecrã (opcional)
         time.sleep(0.01)
+
+    logs, (log_agente, experiences, _) = evaluate(EXCEL_PATH, baselines, max_capacity=MAX_CAPACITY,
+                                                  agent_rollout=lambda: run_agent(env, agent, on_day=print_day))
+
+    # O Gerente de Loja escreve as experiências no seu diário para o Analista ler mais tarde
+    experience_buffer.extend(experiences)
+    dias_simulados = len(log_agente['Dia'])
+
+    # Dados para os gráficos
+    rewards_agent = log_agente['Reward']
+    profits_agent = log_agente['Lucro_Acumulado']
+    profits_dos = logs['DOS']['Lucro_Acumulado']
+    profits_cnn = logs['CNN']['Lucro_Acumulado']
+    profits_minmax = logs['MinMax']['Lucro_Acumulado']
+
+    actions_agent = log_agente['Acao']
+    actions_dos = logs['DOS']['Acao']
+    actions_cnn = logs['CNN']['Acao']
+
+    cum_profit_agent = profits_agent[-1]
+    cum_profit_dos = profits_dos[-1]
+    cum_profit_cnn = profits_cnn[-1]
+    cum_profit_minmax = profits_minmax[-1]
         
     # Guarda o buffer atualizado no disco
     os.makedirs(os.path.dirname(MEMORY_PATH), exist_ok=True)
@@ -3,9 +3,12 @@ import sys
 import torch
 import pickle
 import glob
+import argparse
 
 from agent.ppo_agent import ParallelPPOAgent
 from environment_constrained import StockEnvironment
+from orchestration.checkpoints import TRAINING_STATE_SUFFIX, load_training_state, save_training_state
+from training import load_running_stat, running_stat_state
 
 # --- CONFIGURAÇÃO ---
 MODEL_DIR = "modelos_producao_constrained"
@@ -46,7 +49,12 @@ def get_next_version_name():
     next_v = max(versions) + 1 if versions else 1
     return os.path.join(MODEL_DIR, f"modelo_v{next_v}.pth")
 
-def continual_training():
+def continual_training(resume=False):
+    """
+    Fine-tuning com a experiência real acumulada. Cada versão gravada leva também o estado completo do learner
+    (<versão>_training_state.pt: momentos do Adam, reward_scaler e estatística de lucro do ambiente); com
+    resume=True o fine-tuning continua desse estado em vez de recomeçar o otimizador a zeros.
+    """
     print("======================================================")
     print(" INICIANDO MÓDULO DE TREINO (O ANALISTA FINANCEIRO)   ")
     print("======================================================")
@@ -78,12 +86,21 @@ def continual_training():
     
     # 2. Carregar o modelo atual
     model_path = get_latest_model()
-    try:
-        agent.load(model_path)
-        print(f"[OK] Manual Atual carregado de: {model_path}")
-    except Exception as e:
-        print(f"[ERRO CRÍTICO] Não consegui carregar o modelo base. {e}")
-        return
+    state_path = model_path + TRAINING_STATE_SUFFIX
+    if resume and os.path.exists(state_path):
+        training_state = load_training_state(state_path)
+        agent.load_training_state(training_state['agent'])
+        load_running_stat(env_train.stat_profit, training_state['env_stat'])
+        print(f"[OK] Estado completo de treino retomado de: {state_path}")
+    else:
+        if resume:
+            print(f"[AVISO] Sem estado de treino em {state_path}. A carregar só os pesos do modelo.")
+        try:
+            agent.load(model_path)
+            print(f"[OK] Manual Atual carregado de: {model_path}")
+        except Exception as e:
+            print(f"[ERRO CRÍTICO] Não consegui carregar o modelo base. {e}")
+            return
 
     # 3. Forçar as Learning Rates para modo "Fine-Tuning"
     for param_group in agent.optimizer_actor.param_groups:
@@ -152,6 +169,10 @@ def continual_training():
     # 5. Guardar a Nova Versão
     new_model_path = get_next_version_name()
     agent.save(new_model_path)
+    save_training_state(new_model_path + TRAINING_STATE_SUFFIX, {
+        'agent': agent.training_state(),
+        'env_stat': running_stat_state(env_train.stat_profit),
+    })
     print(f"[OK] Novo manual de regras impresso e guardado em: {new_model_path}")
     
     # 6. Limpar o Diário de Experiências (Opcionalmente, poderíamos arquivá-lo num CSV histórico)
@@ -161,4 +182,8 @@ def continual_training():
     print("======================================================")
 
 if __name__ == "__main__":
-    continual_training()
+    parser = argparse.ArgumentParser(description="Retreino contínuo do Buyer Agent com a experiência real")
+    parser.add_argument('--resume', action='store_true',
+                        help="continua do estado completo de treino gravado com o modelo (momentos do Adam, scalers)")
+    args = parser.parse_args()
+    continual_training(resume=args.resume)
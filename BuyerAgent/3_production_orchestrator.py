@@ -6,6 +6,7 @@ import matplotlib.pyplot as plt
 
 from environment_constrained import StockEnvironment
 from agent.ppo_agent import ParallelPPOAgent
+from evaluation import MIN_MAX_CONFIGS, evaluate, merge_logs, run_agent
 
 # --- CONFIGURAÇÃO ---
 PRODUCT_SKU = "3_252" # Pode ser: "3_080", "3_090", "3_252", "3_586"
@@ -13,15 +14,6 @@ EXCEL_PATH = rf"datasets\m5_foods_{PRODUCT_SKU}.xlsx"
 MAX_CAPACITY = 500 # Usa a capacidade máxima otimizada
 UPDATE_INTERVAL_DAYS = 15
 
-# Melhores valores de Min-Max (s, S) estabelecidos em conversas anteriores para cada SKU
-MIN_MAX_CONFIGS = {
-    "3_080": {"s": 24, "S": 60},
-    "3_090": {"s": 100, "S": 250},
-    "3_252": {"s": 10, "S": 70}, # Alterado para s=10, S=70 para igualar ao comparativo (anteriormente s=35, S=130 no orquestrador)
-    "3_586": {"s": 100, "S": 250},
-    "911753": {"s": 35, "S": 130}
-}
-
 # Hyperparams de Fine-Tuning (Baixos para não destruir o treino de 35k episódios)
 ONLINE_LR_ACTOR = 1e-5
 ONLINE_LR_CRITIC = 5e-5
@@ -106,11 +98,6 @@ def production_loop():
     S_max = config_minmax["S"]
     print(f"[OK] Configuração Min-Max baseline para {PRODUCT_SKU}: s={s_min}, S={S_max}")
     
-    env_minmax = StockEnvironment(excel_path=EXCEL_PATH, is_training=False, train_split=0.6, max_capacity=MAX_CAPACITY)
-    env_minmax.max_order_limit = float('inf') # Sem limite de encomenda para Min-Max
-    env_oracle = StockEnvironment(excel_path=EXCEL_PATH, is_training=False, train_split=0.6, max_capacity=MAX_CAPACITY)
-    env_oracle.max_order_limit = float('inf') # Sem limite de encomenda para o Oráculo
-    
     print("[INIT] A preparar Ambiente de Treino (Para resgatar memórias antigas)...")
     env_train = StockEnvironment(excel_path=EXCEL_PATH, is_training=True, train_split=0.6, max_capacity=MAX_CAPACITY)
     
@@ -137,7 +124,7 @@ def production_loop():
     if os.path.exists(econ_stat_path):
         econ_state = torch.load(econ_stat_path, weights_only=False)
         print(f"[OK] Estatísticas de Recompensa do Ambiente carregadas: {econ_stat_path}")
-        for env in [env_test, env_minmax, env_oracle, env_train]:
+        for env in [env_test, env_train]:
             env.stat_profit.n = econ_state['n']
             env.stat_profit.mean = econ_state['mean']
             env.stat_profit.S = econ_state['S']
@@ -147,181 +134,52 @@ def production_loop():
     # Garantir que o ator está em modo de avaliação e no dispositivo correto
     agent.policy_old_actor.to(agent.device)
     agent.policy_old_actor.eval()
-    
-    state = env_test.reset()
-    state_minmax = env_minmax.reset()
-    state_oracle = env_oracle.reset()
-    
-    done = False
-    
-    # Variáveis de Log
-    rewards_agent = []
-    profits_agent = []
-    actions_agent = []
-    vendas_reais = []
-    
-    profits_minmax = []
-    profits_oracle = []
-    
-    update_days = [] # Guarda os dias exatos em que o modelo foi atualizado para marcar no gráfico
-    
-    cum_profit_agent = 0
-    cum_profit_minmax = 0
-    cum_profit_oracle = 0
-    
-    dias_simulados = 0
-    
-    # Listas detalhadas para gravação em Excel e marcadores Plotly
-    log_dias = []
-    log_procura_real = []
-    log_preco_venda = []
-    
-    log_acoes_agente = []
-    log_acoes_minmax = []
-    log_acoes_oracle = []
-    
-    log_stock_inicial_agente = []
-    log_stock_final_agente = []
-    log_vendas_agente = []
-    log_vendas_perdidas_agente = []
-    log_apodrecimento_agente = []
-    log_excesso_agente = []
-    
-    log_lucro_diario_agente = []
-    log_lucro_acumulado_agente = []
-    log_lucro_acumulado_minmax = []
-    log_lucro_acumulado_oracle = []
-    
-    flag_stockout = []
-    flag_clientes_perdidos = []
-    flag_excesso_armazem = []
-    flag_apodrecimento = []
-    
-    # Buffer temporário para armazenar a experiência a cada 15 dias
-    current_15d_buffer = []
 
     print("\n[PRODUÇÃO] A iniciar simulação contínua do mercado livre...\n")
-    
-    while not done:
-        day = env_test.current_step
-        
-        # --- FASE 1.1: MIN-MAX BASELINE ---
-        stock_hoje_minmax = sum(env_minmax.stock_profile) + env_minmax.in_transit.get(env_minmax.current_step, 0)
-        vendas_hoje_minmax = env_minmax.data.iloc[env_minmax.current_step]['real_value']
-        # O stock que vamos ter garantido amanhã de manhã (Stock Hoje - Vendas Hoje + Camiões a chegar amanhã)
-        stock_amanha_minmax = max(0, stock_hoje_minmax - vendas_hoje_minmax) + env_minmax.in_transit.get(env_minmax.current_step + 1, 0)
-        
-        action_minmax = 0
-        if stock_amanha_minmax <= s_min:
-            action_minmax = max(0, S_max - stock_amanha_minmax)
-            action_minmax = min(action_minmax, MAX_CAPACITY)
-        _, _, _, info_minmax = env_minmax.step(action_minmax)
-        cum_profit_minmax += info_minmax['profit']
-        profits_minmax.append(cum_profit_minmax)
 
-        # --- FASE 1.2: ORÁCULO PERFEITO (GOD MODE) ---
-        stock_hoje_oracle = sum(env_oracle.stock_profile) + env_oracle.in_transit.get(env_oracle.current_step, 0)
-        vendas_hoje_oracle = env_oracle.data.iloc[env_oracle.current_step]['real_value']
-        stock_amanha_oracle = max(0, stock_hoje_oracle - vendas_hoje_oracle) + env_oracle.in_transit.get(env_oracle.current_step + 1, 0)
-        
-        action_oracle = 0
-        demand_tomorrow = env_oracle.data.iloc[env_oracle.current_step + 1]['real_value'] if env_oracle.current_step + 1 <= env_oracle.max_steps else 0
-        
-        if stock_amanha_oracle < demand_tomorrow:
-            future_demand = 0
-            for i in range(1, 5): # T+1 a T+4
-                idx = env_oracle.current_step + i
-                if idx <= env_oracle.max_steps:
-                    future_demand += env_oracle.data.iloc[idx]['real_value']
-            
-            action_oracle = max(0, future_demand - stock_amanha_oracle)
-            action_oracle = min(action_oracle, MAX_CAPACITY)
-            
-        _, _, _, info_oracle = env_oracle.step(action_oracle)
-        cum_profit_oracle += info_oracle['profit']
-        profits_oracle.append(cum_profit_oracle)
+    # --- FASE 1: BASELINES (MIN-MAX E ORÁCULO PERFEITO) NO POOL DE PROCESSOS ---
+    # Os rollouts das baselines não dependem do agente: correm em paralelo enquanto o agente avança aqui
+    baselines = {
+        'MinMax': ('minmax', {'s': s_min, 'S': S_max, 'max_capacity': MAX_CAPACITY}),
+        'Oraculo': ('oracle', {'max_capacity': MAX_CAPACITY}),
+    }
 
-        # --- FASE 1.3: INFERÊNCIA DIÁRIA (O GERENTE DECIDE) ---
-        state_tensor = torch.FloatTensor(state).unsqueeze(0).to(agent.device)
-        with torch.no_grad():
-            action_mean, log_std = agent.policy_old_actor(state_tensor)
-            dist = torch.distributions.Normal(action_mean, torch.exp(torch.clamp(log_std, -2.3, 1.5)))
-            action_percent = dist.sample()
-            action_logprob = dist.log_prob(action_percent)
-            physical_action = torch.round(torch.clamp(action_percent * max_order_limit, 0, max_order_limit)).cpu().numpy().flatten()[0]
+    # --- FASE 2: INFERÊNCIA DIÁRIA (O GERENTE DECIDE) E TRIGGER DE ATUALIZAÇÃO (O ANALISTA TRABALHA) ---
+    def print_day(day, action, info):
+        print(f"[Dia {day:03d}] Ação Agente: {action:03.0f} || Lucro Diário Agente: {info['profit']:.2f}€")
 
-        stock_inicial_hoje = sum(env_test.stock_profile)
+    def fine_tune(cycle_buffer):
+        # Passa a prancheta de 15 dias para o Analista (Treino Contínuo)
+        continual_training_step(agent, cycle_buffer, env_train, max_order_limit)
 
-        next_state, reward, done_env, info = env_test.step(physical_action)
-        done = done_env
-        
-        print(f"[Dia {day:03d}] Ações -> Agente: {physical_action:03.0f} | MinMax: {action_minmax:03.0f} | Oráculo: {action_oracle:03.0f} || Lucros Diários -> Agente: {info['profit']:.2f}€ | Oráculo: {info_oracle['profit']:.2f}€")
-        
-        # O gerente anota o que aconteceu neste dia para entregar ao analista mais tarde
-        current_15d_buffer.append({
-            'state': state_tensor.squeeze(0).cpu().numpy(),
-            'action': action_percent.squeeze(0).cpu().numpy(),
-            'logprob': action_logprob.squeeze(0).cpu().numpy(),
-            'reward': reward,
-            'is_terminal': done
-        })
-        
-        # Logs Globais para Gráficos
-        rewards_agent.append(reward)
-        cum_profit_agent += info['profit']
-        profits_agent.append(cum_profit_agent)
-        actions_agent.append(physical_action)
-        vendas_reais.append(env_test.data.iloc[day]['real_value'])
-        
-        # Logs detalhados para Excel e Plotly
-        stock_final_hoje = sum(env_test.stock_profile)
-        sales = info['sales']
-        real_demand = info['real_demand']
-        spoilage = info['spoilage']
-        lost_sales = max(0, real_demand - sales)
-        overcapacity_waste = max(0, info['overflow_waste'] - spoilage)
-        
-        log_dias.append(day)
-        log_procura_real.append(real_demand)
-        log_preco_venda.append(info['price_today'])
-        
-        log_acoes_agente.append(physical_action)
-        log_acoes_minmax.append(action_minmax)
-        log_acoes_oracle.append(action_oracle)
-        
-        log_stock_inicial_agente.append(stock_inicial_hoje)
-        log_stock_final_agente.append(stock_final_hoje)
-        log_vendas_agente.append(sales)
-        log_vendas_perdidas_agente.append(lost_sales)
-        log_apodrecimento_agente.append(spoilage)
-        log_excesso_agente.append(overcapacity_waste)
-        
-        log_lucro_diario_agente.append(info['profit'])
-        log_lucro_acumulado_agente.append(cum_profit_agent)
-        log_lucro_acumulado_minmax.append(cum_profit_minmax)
-        log_lucro_acumulado_oracle.append(cum_profit_oracle)
-        
-        # Flags de Penalidades
-        flag_stockout.append(1 if stock_final_hoje <= 0 else 0)
-        flag_clientes_perdidos.append(1 if lost_sales > 0 else 0)
-        flag_excesso_armazem.append(1 if overcapacity_waste > 0 else 0)
-        flag_apodrecimento.append(1 if spoilage > 0 else 0)
-        
-        state = next_state
-        dias_simulados += 1
-        
-        # --- FASE 2: TRIGGER DE ATUALIZAÇÃO (O ANALISTA TRABALHA) ---
-        if dias_simulados % UPDATE_INTERVAL_DAYS == 0 and not done:
-            update_days.append(dias_simulados)
-            
-            # Passa a prancheta de 15 dias para o Analista (Treino Contínuo)
-            continual_training_step(agent, current_15d_buffer, env_train, max_order_limit)
-            
-            # Deita fora as anotações antigas para começar o novo ciclo de 15 dias do zero
-            current_15d_buffer = []
-            
-            # Garante que o ator volta a modo de inferência rigorosa
-            agent.policy_old_actor.eval()
+    logs, (log_agente, _, update_days) = evaluate(
+        EXCEL_PATH, baselines, max_capacity=MAX_CAPACITY,
+        agent_rollout=lambda: run_agent(env_test, agent, update_interval_days=UPDATE_INTERVAL_DAYS,
+                                        fine_tune=fine_tune, on_day=print_day))
+    df_dias = merge_logs({'Agente': log_agente, **logs})
+
+    # Logs para gráficos, Excel e marcadores Plotly
+    dias_simulados = len(df_dias)
+    rewards_agent = log_agente['Reward']
+    profits_agent = log_agente['Lucro_Acumulado']
+    profits_minmax = logs['MinMax']['Lucro_Acumulado']
+    profits_oracle = logs['Oraculo']['Lucro_Acumulado']
+    cum_profit_agent = profits_agent[-1]
+    cum_profit_minmax = profits_minmax[-1]
+    cum_profit_oracle = profits_oracle[-1]
+
+    log_dias = log_agente['Dia']
+    log_procura_real = log_agente['Procura_Real']
+    log_acoes_agente = log_agente['Acao']
+    log_acoes_minmax = logs['MinMax']['Acao']
+    log_vendas_perdidas_agente = log_agente['Vendas_Perdidas']
+    log_apodrecimento_agente = log_agente['Apodrecimento']
+    log_excesso_agente = log_agente['Excesso_Armazem']
+
+    flag_stockout = [1 if stock <= 0 else 0 for stock in log_agente['Stock_Final']]
+    flag_clientes_perdidos = [1 if lost > 0 else 0 for lost in log_vendas_perdidas_agente]
+    flag_excesso_armazem = [1 if waste > 0 else 0 for waste in log_excesso_agente]
+    flag_apodrecimento = [1 if spoilage > 0 else 0 for spoilage in log_apodrecimento_agente]
 
     print("\n======================================================")
     print(f"[FIM DA SIMULAÇÃO] {dias_simulados} dias concluídos com {len(update_days)} atualizações de modelo.")
@@ -403,22 +261,22 @@ def production_loop():
     print(f"\nA gravar os dados completos da simulação no Excel...")
     try:
         df_excel = pd.DataFrame({
-            'Dia': log_dias,
-            'Procura_Real': log_procura_real,
-            'Preco_Venda_Dia': log_preco_venda,
-            'Acao_Agente_PPO': log_acoes_agente,
-            'Acao_MinMax': log_acoes_minmax,
-            'Acao_Oraculo': log_acoes_oracle,
-            'Stock_Inicial_Agente': log_stock_inicial_agente,
-            'Stock_Final_Agente': log_stock_final_agente,
-            'Vendas_Agente': log_vendas_agente,
-            'Vendas_Perdidas_Agente': log_vendas_perdidas_agente,
-            'Apodrecimento_Agente': log_apodrecimento_agente,
-            'Excesso_Armazem_Agente': log_excesso_agente,
-            'Lucro_Diario_Agente': log_lucro_diario_agente,
-            'Lucro_Acumulado_Agente': log_lucro_acumulado_agente,
-            'Lucro_Acumulado_MinMax': log_lucro_acumulado_minmax,
-            'Lucro_Acumulado_Oraculo': log_lucro_acumulado_oracle,
+            'Dia': df_dias['Dia'],
+            'Procura_Real': df_dias['Procura_Real'],
+            'Preco_Venda_Dia': df_dias['Preco_Venda'],
+            'Acao_Agente_PPO': df_dias['Acao_Agente'],
+            'Acao_MinMax': df_dias['Acao_MinMax'],
+            'Acao_Oraculo': df_dias['Acao_Oraculo'],
+            'Stock_Inicial_Agente': df_dias['Stock_Inicial_Agente'],
+            'Stock_Final_Agente': df_dias['Stock_Final_Agente'],
+            'Vendas_Agente': df_dias['Vendas_Agente'],
+            'Vendas_Perdidas_Agente': df_dias['Vendas_Perdidas_Agente'],
+            'Apodrecimento_Agente': df_dias['Apodrecimento_Agente'],
+            'Excesso_Armazem_Agente': df_dias['Excesso_Armazem_Agente'],
+            'Lucro_Diario_Agente': df_dias['Lucro_Diario_Agente'],
+            'Lucro_Acumulado_Agente': df_dias['Lucro_Acumulado_Agente'],
+            'Lucro_Acumulado_MinMax': df_dias['Lucro_Acumulado_MinMax'],
+            'Lucro_Acumulado_Oraculo': df_dias['Lucro_Acumulado_Oraculo'],
             'Flag_Stockout': flag_stockout,
             'Flag_Clientes_Perdidos': flag_clientes_perdidos,
             'Flag_Excesso_Armazem': flag_excesso_armazem,
@@ -1,3 +1,4 @@
+import math
 import torch
 import torch.nn as nn
 import torch.optim as optim
@@ -22,30 +23,162 @@ class RunningStat:
             self.mean = old_mean + (x - old_mean) / self.n
             self.S = self.S + (x - old_mean) * (x - self.mean)
 
+    def push_batch(self, x):
+        """
+        Junta um lote de observações (eixo 0) de uma só vez pela combinação de variâncias de Chan et al.
+        Equivale a chamar push() para cada elemento, pela ordem, a menos de arredondamentos.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        k = x.shape[0]
+        if k == 0:
+            return
+        batch_mean = x.mean(axis=0)
+        batch_S = np.square(x - batch_mean).sum(axis=0)
+        if self.n == 0:
+            self.mean = batch_mean
+            self.S = batch_S
+        else:
+            delta = batch_mean - self.mean
+            total = self.n + k
+            self.mean = self.mean + delta * k / total
+            self.S = self.S + batch_S + np.square(delta) * self.n * k / total
+        self.n += k
+
     @property
     def std(self):
         variance = self.S / (self.n - 1) if self.n > 1 else np.square(self.mean)
         return np.sqrt(variance)
 
+class StepColumn:
+    """
+    Uma coluna do buffer num tensor pré-alocado [capacidade, N, ...], preenchido passo a passo com append().
+    A memória é reutilizada entre rondas (clear() só recua o cursor) e a capacidade duplica se uma ronda
+    for mais longa do que as anteriores. view() devolve os passos escritos sem torch.stack.
+    """
+    def __init__(self, dtype=None, capacity=128):
+        self.dtype = dtype
+        self.capacity = capacity
+        self.data = None
+        self.size = 0
+
+    def _reserve(self, template, n_steps):
+        if self.data is not None and self.size > 0 and self.data.shape[1:] != template.shape[1:]:
+            raise ValueError(f"Passo com forma {tuple(template.shape[1:])} num buffer de passos {tuple(self.data.shape[1:])}")
+        needed = self.size + n_steps
+        if self.data is None or (self.size == 0 and (self.data.shape[1:] != template.shape[1:] or
+                                                     self.data.device != template.device)):
+            self.data = torch.empty((max(self.capacity, needed),) + tuple(template.shape[1:]),
+                                    dtype=template.dtype, device=template.device)
+        elif needed > self.data.shape[0]:
+            grown = torch.empty((max(2 * self.data.shape[0], needed),) + tuple(self.data.shape[1:]),
+                                dtype=self.data.dtype, device=self.data.device)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+
+    def append(self, step):
+        step = torch.as_tensor(step, dtype=self.dtype).detach()
+        data = self.data
+        if data is None or self.size >= data.shape[0] or step.shape != data.shape[1:] or step.device != data.device:
+            self._reserve(step.unsqueeze(0), 1)
+            data = self.data
+        data[self.size] = step
+        self.size += 1
+
+    def extend(self, steps):
+        """ Acrescenta vários passos de uma vez (tensor [T, N, ...]) """
+        steps = torch.as_tensor(steps, dtype=self.dtype).detach()
+        self._reserve(steps, steps.shape[0])
+        self.data[self.size:self.size + steps.shape[0]] = steps
+        self.size += steps.shape[0]
+
+    def view(self):
+        return self.data[:self.size]
+
+    def clear(self):
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        return self.view()[i]
+
 class ParallelRolloutBuffer:
-    """ Buffer adapted for parallel N-environments. """
+    """
+    Buffer adapted for parallel N-environments.
+    Cada campo é uma StepColumn (tensor pré-alocado reutilizado entre rondas); append() mantém a interface de lista.
+    """
     def __init__(self):
-        self.states = []
-        self.actions = []
-        self.logprobs = []
-        self.rewards = []
-        self.is_terminals = []
+        self.states = StepColumn()
+        self.actions = StepColumn()
+        self.logprobs = StepColumn()
+        self.rewards = StepColumn(dtype=torch.float64)
+        self.is_terminals = StepColumn(dtype=torch.bool)
         # Values are NOT stored here during rollout anymore!
+
+    def load(self, states, actions, logprobs, rewards, is_terminals):
+        """ Carrega uma ronda completa de uma vez (tensores [T, N, ...]; states pode ter T + 1 passos) """
+        self.clear()
+        self.states.extend(states)
+        self.actions.extend(actions)
+        self.logprobs.extend(logprobs)
+        self.rewards.extend(rewards)
+        self.is_terminals.extend(is_terminals)
     
     def clear(self):
-        del self.states[:]
-        del self.actions[:]
-        del self.logprobs[:]
-        del self.rewards[:]
-        del self.is_terminals[:]
+        self.states.clear()
+        self.actions.clear()
+        self.logprobs.clear()
+        self.rewards.clear()
+        self.is_terminals.clear()
+
+    def discounted_returns(self, gamma, bootstrap=None):
+        """
+        Retornos Monte Carlo descontados [T, N] (float64), com o desconto reiniciado nos passos terminais.
+        `bootstrap` é o valor do estado final (V(s_T)) quando a ronda não termina no fim do horizonte.
+        Calculados sobre a ronda inteira por segmented_discounted_sum (sem ciclo Python sobre os passos).
+        """
+        tail = None if bootstrap is None else torch.as_tensor(bootstrap, dtype=torch.float64)
+        returns = segmented_discounted_sum(self.rewards.view().cpu(), self.is_terminals.view().cpu(), gamma, tail=tail)
+        return returns.numpy()
+
+def segmented_discounted_sum(values, dones, discount, tail=None):
+    """
+    Soma descontada para trás por ambiente, y_t = x_t + discount * (1 - done_t) * y_{t+1}, sobre um rollout
+    [T, N] inteiro com operações tensoriais (sem ciclo Python sobre os passos): y_t = discount^-t * (R_t - R_e),
+    com R a soma acumulada invertida de discount^k * x_k e e o passo a seguir ao primeiro terminal >= t.
+    `tail` [N] é o valor depois do último passo (bootstrap), que só chega aos passos sem terminal até ao fim.
+    Rollouts longos são processados em blocos para discount^k não sair da gama de float64.
+    """
+    values = values.to(torch.float64)
+    dones = dones.to(torch.bool)
+    T = values.shape[0]
+    chunk = max(1, int(600.0 / -math.log(discount))) if 0.0 < discount < 1.0 else (1 if discount <= 0.0 else T)
+    if T > chunk:
+        # Blocos do fim para o início: o primeiro valor de cada bloco é o `tail` do bloco anterior
+        parts = []
+        for lo in reversed(range(0, T, chunk)):
+            part = segmented_discounted_sum(values[lo:lo + chunk], dones[lo:lo + chunk], discount, tail)
+            parts.append(part)
+            tail = part[0]
+        return torch.cat(parts[::-1])
+
+    steps = torch.arange(T, device=values.device)
+    powers = torch.pow(discount, steps.to(torch.float64)).unsqueeze(-1)
+    suffix = torch.flip(torch.cumsum(torch.flip(values * powers, [0]), dim=0), [0])
+    suffix = torch.cat([suffix, torch.zeros_like(suffix[:1])])
+    # Primeiro passo terminal em [t, T) (T se não houver)
+    terminal_at = torch.where(dones, steps.unsqueeze(-1), T)
+    segment_end = torch.flip(torch.cummin(torch.flip(terminal_at, [0]), dim=0).values, [0])
+    out = (suffix[:-1] - torch.gather(suffix, 0, (segment_end + 1).clamp(max=T))) / powers
+    if tail is not None:
+        tail_decay = torch.pow(discount, (T - steps).to(torch.float64)).unsqueeze(-1)
+        out = out + (segment_end == T) * tail_decay * tail.to(torch.float64)
+    return out
 
 class ParallelPPOAgent:
-    def __init__(self, state_dim, action_dim, max_action, lr_actor=0.0003, lr_critic=0.001, gamma=0.99, K_epochs=30, eps_clip=0.2, batch_size=1024):
+    def __init__(self, state_dim, action_dim, max_action, lr_actor=0.0003, lr_critic=0.001, gamma=0.99, K_epochs=30, eps_clip=0.2, batch_size=1024,
+                 advantage_mode='mc', gae_lambda=0.95):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
         self.gamma = gamma
@@ -53,9 +186,16 @@ class ParallelPPOAgent:
         self.K_epochs = K_epochs
         self.max_action = max_action
         self.batch_size = batch_size
+        # Estimativa das vantagens: 'mc' (retornos Monte Carlo normalizados, por omissão) ou 'gae' (GAE(λ))
+        if advantage_mode not in ('mc', 'gae'):
+            raise ValueError(f"advantage_mode desconhecido: {advantage_mode!r} (usar 'mc' ou 'gae')")
+        self.advantage_mode = advantage_mode
+        self.gae_lambda = gae_lambda
         
         self.buffer = ParallelRolloutBuffer()
         self.reward_scaler = RunningStat()
+        # Gerador (CPU) opcional para a ordem dos mini-lotes; None usa o RNG global do PyTorch
+        self.generator = None
 
         self.policy_actor = ActorMLP(state_dim, action_dim, max_action).to(self.device)
         self.policy_critic = CriticMLP(state_dim).to(self.device)
@@ -114,59 +254,82 @@ class ParallelPPOAgent:
         
         return action_logprobs, state_values, dist_entropy
 
+    def _gae_targets(self, all_state_values):
+        """
+        GAE(λ) sobre a ronda [T, N] inteira, só com operações tensoriais. As recompensas são escaladas pelo
+        desvio-padrão do reward_scaler (alimentado com os retornos descontados, como no modo 'mc'); as vantagens
+        são a soma descontada por γλ dos erros TD e o alvo do crítico é vantagem + V(s).
+        Devolve (alvos, vantagens), ambos [T, N] float32.
+        """
+        rewards = self.buffer.rewards.view().to(self.device)
+        dones = self.buffer.is_terminals.view().to(self.device)
+        T = rewards.shape[0]
+        values = all_state_values[:T].to(torch.float64)
+        bootstrap = all_state_values[T].to(torch.float64) if len(self.buffer.states) == T + 1 else None
+
+        returns = segmented_discounted_sum(rewards, dones, self.gamma, tail=bootstrap)
+        self.reward_scaler.push_batch(returns.flip(0).reshape(-1).cpu().numpy())
+        scaled_rewards = rewards.to(torch.float64) / float(self.reward_scaler.std + 1e-8)
+
+        # V(s_{t+1}), com o estado final da ronda como bootstrap e zero depois de um passo terminal
+        next_values = torch.zeros_like(values)
+        next_values[:-1] = values[1:]
+        if bootstrap is not None:
+            next_values[-1] = bootstrap
+        deltas = scaled_rewards + self.gamma * next_values * (~dones) - values
+        advantages = segmented_discounted_sum(deltas, dones, self.gamma * self.gae_lambda)
+        return (advantages + values).float(), advantages.float()
+
     def update(self):
         # 1. Evaluate the entire episode's baseline ONE SINGLE TIME! 
         # (The Great Critic Optimization)
         # We stack all days: shape [TIMESTEPS, NUM_ENVS, 28]
-        all_states_tensor = torch.stack(self.buffer.states, dim=0).to(self.device)
+        all_states_tensor = self.buffer.states.view().to(self.device)
         
         with torch.no_grad():
             # Critic processes all 91 days of 32 environments instantly. Shape: [TIMESTEPS, NUM_ENVS, 1]
             all_state_values = self.policy_old_critic(all_states_tensor).squeeze(-1) 
             
-        # 2. Monte Carlo Estimate of Return (Discounted cumulative rewards)
-        # Note: self.buffer.rewards shape is [TIMESTEPS, NUM_ENVS]
-        rewards = []
-        discounted_reward = np.zeros(len(self.buffer.rewards[0])) # vector of size NUM_ENVS
-        
-        # Se o buffer tiver um estado a mais, usamos para bootstrapping (Cenário B)
-        if len(self.buffer.states) == len(self.buffer.rewards) + 1:
-            discounted_reward = all_state_values[-1].detach().cpu().numpy()
+        # 2. Alvos do crítico: retornos Monte Carlo normalizados (modo 'mc', por omissão) ou GAE(λ)
+        gae_advantages = None
+        if self.advantage_mode == 'gae':
+            rewards_tensor, gae_advantages = self._gae_targets(all_state_values)
+        else:
+            # Monte Carlo Estimate of Return (Discounted cumulative rewards)
+            # Note: self.buffer.rewards shape is [TIMESTEPS, NUM_ENVS]
+            # Se o buffer tiver um estado a mais, usamos para bootstrapping (Cenário B)
+            bootstrap = None
+            if len(self.buffer.states) == len(self.buffer.rewards) + 1:
+                bootstrap = all_state_values[-1].detach().cpu().numpy()
+            returns = self.buffer.discounted_returns(self.gamma, bootstrap)
         
-        # Reverse iterate through time
-        for step_t in reversed(range(len(self.buffer.rewards))):
-            reward_t = np.array(self.buffer.rewards[step_t])
-            is_terminal_t = np.array(self.buffer.is_terminals[step_t])
-            
-            # Reset discount if terminal (for each env individually)
-            discounted_reward[is_terminal_t] = 0
-            
-            discounted_reward = reward_t + (self.gamma * discounted_reward)
-            
-            # Welford's Scaler requires pushing items. For matrices, pushing individually or mean is tricky. 
-            # We'll vectorize it:
-            for val in discounted_reward:
-                self.reward_scaler.push(val)
+            # Normalização pelo Welford's Scaler, que recebe os retornos do último passo para o primeiro
+            # (um lote de NUM_ENVS valores por passo)
+            rewards = np.empty_like(returns)
+            for step_t in reversed(range(returns.shape[0])):
+                discounted_reward = returns[step_t]
+                self.reward_scaler.push_batch(discounted_reward)
                 
-            normalized_r = (discounted_reward - self.reward_scaler.mean) / (self.reward_scaler.std + 1e-8)
-            clipped_r = np.clip(normalized_r, -3.0, 3.0)
+                normalized_r = (discounted_reward - self.reward_scaler.mean) / (self.reward_scaler.std + 1e-8)
+                rewards[step_t] = np.clip(normalized_r, -3.0, 3.0)
             
-            rewards.insert(0, clipped_r)
-            
-        rewards_tensor = torch.tensor(np.array(rewards), dtype=torch.float32).to(self.device)
+            rewards_tensor = torch.tensor(rewards, dtype=torch.float32).to(self.device)
 
         # 3. Flatten the batches for PyTorch
         # Se tivermos um estado a mais (bootstrapping), ignoramos o último para o treino direto
         T = len(self.buffer.rewards)
-        old_states = all_states_tensor[:T].view(-1, all_states_tensor.size(-1)).detach()
-        old_actions = torch.stack(self.buffer.actions, dim=0).view(-1, 1).detach()
-        old_logprobs = torch.stack(self.buffer.logprobs, dim=0).view(-1, 1).detach()
+        old_states = all_states_tensor[:T].reshape(-1, all_states_tensor.size(-1)).detach()
+        old_actions = self.buffer.actions.view().to(self.device).reshape(-1, 1).detach()
+        old_logprobs = self.buffer.logprobs.view().to(self.device).reshape(-1, 1).detach()
         
         rewards_flat = rewards_tensor.view(-1, 1)
         old_state_values_flat = all_state_values[:T].view(-1, 1).detach()
 
         # 4. Calculate Advantages
-        advantages = rewards_flat - old_state_values_flat
+        if gae_advantages is None:
+            advantages = rewards_flat - old_state_values_flat
+        else:
+            advantages = gae_advantages.view(-1, 1)
         advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-5)
 
         # 5. Optimize the Policy
@@ -179,7 +342,7 @@ class ParallelPPOAgent:
         num_updates = 0
         
         for _ in range(self.K_epochs):
-            indices = torch.randperm(buffer_size).to(self.device)
+            indices = torch.randperm(buffer_size, generator=self.generator).to(self.device)
             
             for start in range(0, buffer_size, actual_batch_size):
                 end = start + actual_batch_size
@@ -227,6 +390,30 @@ class ParallelPPOAgent:
         mean_critic = epoch_critic_loss / num_updates if num_updates > 0 else 0.0
         return mean_total, mean_actor, mean_critic
         
+    def training_state(self):
+        """ Estado completo do learner para retomar o treino: redes atuais e old, momentos do Adam e reward_scaler """
+        return {
+            'policy_actor': self.policy_actor.state_dict(),
+            'policy_critic': self.policy_critic.state_dict(),
+            'policy_old_actor': self.policy_old_actor.state_dict(),
+            'policy_old_critic': self.policy_old_critic.state_dict(),
+            'optimizer_actor': self.optimizer_actor.state_dict(),
+            'optimizer_critic': self.optimizer_critic.state_dict(),
+            'reward_scaler': {'n': self.reward_scaler.n, 'mean': self.reward_scaler.mean, 'S': self.reward_scaler.S},
+        }
+
+    def load_training_state(self, state):
+        """ Repõe o estado devolvido por training_state() (as redes e o otimizador ficam no dispositivo do agente) """
+        self.policy_actor.load_state_dict(state['policy_actor'])
+        self.policy_critic.load_state_dict(state['policy_critic'])
+        self.policy_old_actor.load_state_dict(state['policy_old_actor'])
+        self.policy_old_critic.load_state_dict(state['policy_old_critic'])
+        self.optimizer_actor.load_state_dict(state['optimizer_actor'])
+        self.optimizer_critic.load_state_dict(state['optimizer_critic'])
+        self.reward_scaler.n = state['reward_scaler']['n']
+        self.reward_scaler.mean = state['reward_scaler']['mean']
+        self.reward_scaler.S = state['reward_scaler']['S']
+
     def save(self, checkpoint_path):
         torch.save(self.policy_old_actor.state_dict(), checkpoint_path + '_actor.pth')
         torch.save(self.policy_old_critic.state_dict(), checkpoint_path + '_critic.pth')
@@ -1,9 +1,50 @@
 import pandas as pd
 import numpy as np
+import copy
 import random
 from sklearn.preprocessing import MinMaxScaler
 import math
 import os
+import sys
+
+# Adicionar a raiz do repositório ao path para partilhar o módulo biology com o StockManagement
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from biology.maturation import (batches_to_columns, advance_columns, advance_batch,
+                                day_coefficient_cache, MAX_PROJECTION_DAYS, QUALITY_SPOILED)
+from biology.batch_store import BatchStore
+from orchestration.dataset_cache import load_dataset
+from biology.presets import FRUIT_PRESETS
+from biology.rsl_cache import SHARED_RSL_CACHE
+
+# Horizonte máximo (dias) procurado para cobrir stock + encomenda com a procura prevista
+MAX_COVERAGE_DAYS = 60
+
+
+def forecast_prefix_sums(prediction, pad_days=MAX_COVERAGE_DAYS + 1):
+    """
+    Procura prevista acumulada: cum[i] = soma de prediction[:i], com a série prolongada por pad_days cópias do
+    último valor (o mesmo que se assume depois do fim do split). Previsões negativas contam como 0 para que a
+    série seja monótona e possa ser pesquisada por bisseção.
+    """
+    prediction = np.maximum(np.asarray(prediction, dtype=np.float64), 0.0)
+    if prediction.size == 0:
+        prediction = np.zeros(1, dtype=np.float64)
+    padded = np.concatenate([prediction, np.full(pad_days, prediction[-1])])
+    return np.concatenate([[0.0], np.cumsum(padded)])
+
+
+def min_required_shelf_lives(cum_demand, start, targets, max_days=MAX_COVERAGE_DAYS):
+    """
+    Número de dias, a contar do índice start, até que a procura acumulada cubra cada quantidade de targets
+    (bisseção em cum_demand de forecast_prefix_sums). Limitado a max_days + 1, como o ciclo dia-a-dia original.
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    idx = np.searchsorted(cum_demand, cum_demand[start] + targets, side='left')
+    return np.minimum(idx - start, max_days + 1).astype(np.int64)
+
 
 class EnvRunningStat:
     """ Estatístico Dinâmico Independente para o MORL (Welford's Algorithm) """
@@ -24,6 +65,52 @@ class EnvRunningStat:
                 
             self.mean = old_mean + (x - old_mean) / self.n
             self.S = self.S + (x - old_mean) * (x - self.mean)
+    def push_batch(self, x, return_running=False):
+        """
+        Junta um lote de valores escalares de uma só vez (combinação de variâncias de Chan et al.), o mesmo que
+        push() a cada elemento pela ordem, a menos de arredondamentos. Com return_running=True devolve também
+        (média, desvio-padrão) depois de cada elemento, i.e. os valores que push() sequencial teria visto.
+        """
+        x = np.asarray(x, dtype=np.float64).ravel()
+        k = x.size
+        if k == 0:
+            return (x, x) if return_running else None
+        counts = np.arange(1, k + 1)
+        # Estatísticas de cada prefixo do lote, com os dados centrados para não perder precisão
+        shift = x.mean()
+        d = x - shift
+        prefix_mean = shift + np.cumsum(d) / counts
+        prefix_S = np.maximum(np.cumsum(d * d) - counts * np.square(prefix_mean - shift), 0.0)
+        if self.n == 0:
+            means, Ss = prefix_mean, prefix_S
+        else:
+            delta = prefix_mean - self.mean
+            totals = self.n + counts
+            means = self.mean + delta * counts / totals
+            Ss = self.S + prefix_S + np.square(delta) * self.n * counts / totals
+        ns = self.n + counts
+        self.n = int(ns[-1])
+        self.mean = means[-1]
+        self.S = Ss[-1]
+        if return_running:
+            variance = np.where(ns > 1, Ss / np.maximum(ns - 1, 1), np.square(means))
+            return means, np.sqrt(variance)
+    def merge(self, other):
+        """
+        Junta as estatísticas de outro EnvRunningStat (p.ex. o de outro worker) com a mesma combinação de Chan et
+        al. de push_batch: o resultado é o de ter visto as duas sequências de valores.
+        """
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean, self.S = other.n, other.mean, other.S
+            return self
+        total = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.n / total
+        self.S = self.S + other.S + np.square(delta) * self.n * other.n / total
+        self.n = total
+        return self
     @property
     def variance(self):
         return self.S / (self.n - 1) if self.n > 1 else np.square(self.mean)
@@ -38,75 +125,16 @@ class StockEnvironment:
     Uses FruitModel2 biological decay presets and active batch FEFO.
     """
     
-    # Presets biológicos por fruta retirados de FruitModel2.ipynb
-    PRESETS = {
-        "kiwi_hayward": {
-            "label": "Kiwi (Hayward)",
-            "Tref_C": 5.0, "Ea_J": 60000.0, "k_firm_ref": 0.06, "alpha_E": 1.8,
-            "beta_RH": 1.2, "RH_ref": 90.0,
-            "dureza_min": 3.0, "dureza_0_default": 45.0,
-            "brix_min": 11.0, "brix_max": 17.0, "brix_g": 0.35, "brix_0_default": 11.0,
-            "qual_firm_threshold": 8.0, "qual_brix_target": 15.0,
-            "E0_int": 0.02, "Eref_prod": 0.12, "E_t0": 10.0, "E_g": 0.9, "E_auto": 0.35,
-            "E_decay": 0.7, "Ea_E_J": 52000.0, "E_ext_shift": 2.0,
-            "RH_mold_thr": 95.0, "mold_rate_ref": 0.05, "mold_sens_RH": 9.0,
-            "mold_max_penalty": 0.65, "Ea_mold_J": 43000.0
-        },
-        "maca_golden": {
-            "label": "Maçã (Golden)",
-            "Tref_C": 5.0, "Ea_J": 50000.0, "k_firm_ref": 0.025, "alpha_E": 0.8,
-            "beta_RH": 0.8, "RH_ref": 90.0,
-            "dureza_min": 12.0, "dureza_0_default": 72.0,
-            "brix_min": 11.5, "brix_max": 15.5, "brix_g": 0.18, "brix_0_default": 12.0,
-            "qual_firm_threshold": 35.0, "qual_brix_target": 13.5,
-            "E0_int": 0.01, "Eref_prod": 0.1, "E_t0": 18.0, "E_g": 0.6, "E_auto": 0.35,
-            "E_decay": 0.55, "Ea_E_J": 52000.0, "E_ext_shift": 1.8,
-            "RH_mold_thr": 95.0, "mold_rate_ref": 0.04, "mold_sens_RH": 8.0,
-            "mold_max_penalty": 0.60, "Ea_mold_J": 42000.0
-        },
-        "maca_reineta": {
-            "label": "Maçã (Reineta)",
-            "Tref_C": 5.0, "Ea_J": 52000.0, "k_firm_ref": 0.035, "alpha_E": 1.1,
-            "beta_RH": 1.0, "RH_ref": 90.0,
-            "dureza_min": 10.0, "dureza_0_default": 65.0,
-            "brix_min": 11.0, "brix_max": 14.0, "brix_g": 0.16, "brix_0_default": 11.5,
-            "qual_firm_threshold": 30.0, "qual_brix_target": 12.5,
-            "E0_int": 0.01, "Eref_prod": 0.13, "E_t0": 14.0, "E_g": 0.7, "E_auto": 0.40,
-            "E_decay": 0.6, "Ea_E_J": 52000.0, "E_ext_shift": 2.0,
-            "RH_mold_thr": 95.0, "mold_rate_ref": 0.05, "mold_sens_RH": 9.0,
-            "mold_max_penalty": 0.65, "Ea_mold_J": 43000.0
-        },
-        "maca_gala": {
-            "label": "Maçã (Gala)",
-            "Tref_C": 5.0, "Ea_J": 48000.0, "k_firm_ref": 0.04, "alpha_E": 1.3,
-            "beta_RH": 0.9, "RH_ref": 90.0,
-            "dureza_min": 9.0, "dureza_0_default": 60.0,
-            "brix_min": 12.5, "brix_max": 17.0, "brix_g": 0.25, "brix_0_default": 13.0,
-            "qual_firm_threshold": 28.0, "qual_brix_target": 14.5,
-            "E0_int": 0.015, "Eref_prod": 0.18, "E_t0": 10.0, "E_g": 0.9, "E_auto": 0.5,
-            "E_decay": 0.65, "Ea_E_J": 52000.0, "E_ext_shift": 2.2,
-            "RH_mold_thr": 95.0, "mold_rate_ref": 0.05, "mold_sens_RH": 9.0,
-            "mold_max_penalty": 0.65, "Ea_mold_J": 43000.0
-        },
-        "maca_fuji": {
-            "label": "Maçã (Fuji)",
-            "Tref_C": 5.0, "Ea_J": 47000.0, "k_firm_ref": 0.018, "alpha_E": 0.6,
-            "beta_RH": 0.7, "RH_ref": 90.0,
-            "dureza_min": 15.0, "dureza_0_default": 80.0,
-            "brix_min": 13.0, "brix_max": 19.0, "brix_g": 0.15, "brix_0_default": 14.0,
-            "qual_firm_threshold": 40.0, "qual_brix_target": 16.0,
-            "E0_int": 0.008, "Eref_prod": 0.06, "E_t0": 25.0, "E_g": 0.5, "E_auto": 0.25,
-            "E_decay": 0.45, "Ea_E_J": 52000.0, "E_ext_shift": 1.4,
-            "RH_mold_thr": 95.0, "mold_rate_ref": 0.035, "mold_sens_RH": 8.0,
-            "mold_max_penalty": 0.55, "Ea_mold_J": 42000.0
-        }
-    }
+    # Presets biológicos por fruta retirados de FruitModel2.ipynb (biology.presets)
+    PRESETS = {key: dict(preset) for key, preset in FRUIT_PRESETS.items()}
 
     def __init__(self, excel_path, is_training=True, train_split=0.6, max_capacity=1000, shared_stats=None,
                  holding_cost=0.70, transport_cost=10.0, fixed_transport_cost=10.0,
-                 stockout_penalty=0.25, waste_penalty=1.0, zero_stock_penalty=5.0):
-        # 1. Load Data
-        self.df = pd.read_excel(excel_path)
+                 stockout_penalty=0.25, waste_penalty=1.0, zero_stock_penalty=5.0,
+                 data_frame=None):
+        # 1. Load Data (data_frame: dataset já carregado, p.ex. o SharedDataset anexado por um worker PPO;
+        # excel_path continua a identificar o SKU)
+        self.df = data_frame if data_frame is not None else load_dataset(excel_path)
         
         # 2. Train/Test Split
         split_index = int(len(self.df) * train_split)
@@ -127,6 +155,7 @@ class StockEnvironment:
             
         self.max_steps = len(self.data) - 1
         self.current_step = 0
+        self.refresh_columns()
         
         # Mapeamento do SKU para chave do preset biológico
         excel_name = os.path.basename(excel_path).lower()
@@ -184,7 +213,9 @@ class StockEnvironment:
         self.avg_price = self.data['price'].mean() if 'price' in self.data.columns else 2.0
         
         self.stock_profile = [0.0, 0.0, 0.0, 0.0] # [G0, G1, G2, G3]
-        self.active_batches = []                  # Lotes físicos ativos: [{'quantity', 'dureza', 'brix', 'mold', 'E_int', 'age', 'quality'}]
+        self.rsl_cache = SHARED_RSL_CACHE         # Cache de RSL partilhada pelos ambientes do processo
+        self._coeffs = None                       # Coeficientes diários do preset (ver _day_coeffs)
+        self.batches = BatchStore()               # Lotes físicos ativos em colunas: quantity, dureza, brix, mold, E_int, age, quality
         self.in_transit = {}                      # Dictionary to track {day_of_arrival: quantity}
         
         # --- GLOBAL/LOCAL STATISTICS (Robust Z-Score) ---
@@ -213,208 +244,150 @@ class StockEnvironment:
         p = self.PRESETS[self.fruit_key]
         
         # Inicializa o armazém com o lote inicial no dia 0
-        self.active_batches = [{
-            'quantity': self.stock_inicial,
+        self.batches.clear()
+        self.batches.add(self.stock_inicial, self._fresh_batch_state(p))
+        
+        self.in_transit = {}
+        self._update_stock_profile_from_batches()
+        return self._get_state()
+
+    @property
+    def active_batches(self):
+        """ Lotes ativos como lista de dicts (ordem FEFO); o estado vive em self.batches """
+        return self.batches.to_dicts()
+
+    @active_batches.setter
+    def active_batches(self, batches):
+        self.batches = BatchStore.from_dicts(batches)
+
+    @staticmethod
+    def _fresh_batch_state(p):
+        return {
             'dureza': float(p["dureza_0_default"]),
             'brix': float(p["brix_0_default"]),
             'mold': 0.0,
             'E_int': float(p.get("E0_int", 0.01)),
             'age': 0.0,
             'quality': 100.0
-        }]
-        
-        self.in_transit = {}
-        self._update_stock_profile_from_batches()
-        return self._get_state()
+        }
 
     def advance_batch_one_day(self, batch, T_c, RH_pct, E_ext_ppm):
         """ Avança a maturação biológica de um lote por 1 dia usando dt = 0.05 """
-        p = self.PRESETS[self.fruit_key]
-        R = 8.314
-        dt = 0.05
-        steps = int(1.0 / dt)
-        
-        T_K = T_c + 273.15
-        Tref_K = p["Tref_C"] + 273.15
-        
-        def k_temp_scaling(Ea, T, Tref):
-            return math.exp((-Ea / R) * (1.0 / T - 1.0 / Tref))
-            
-        def sigmoid(x):
-            return 1.0 / (1.0 + math.exp(-x))
-            
-        kT_firm = p["k_firm_ref"] * k_temp_scaling(p["Ea_J"], T_K, Tref_K)
-        
-        RH_ref = p["RH_ref"]
-        RH_deficit = max(0.0, (RH_ref - RH_pct) / 100.0)
-        kRH = 1.0 + p["beta_RH"] * RH_deficit
-        
-        Ea_E_J = float(p.get("Ea_E_J", 52000.0))
-        Eref_prod = float(p.get("Eref_prod", 0.08))
-        E_decay = float(p.get("E_decay", 0.7))
-        E_t0 = float(p.get("E_t0", 15.0))
-        E_g = float(p.get("E_g", 0.8))
-        E_auto = float(p.get("E_auto", 0.35))
-        E_ext_shift = float(p.get("E_ext_shift", 2.0))
-        
-        t0_eff = E_t0 - E_ext_shift * math.log1p(max(0.0, E_ext_ppm))
-        prod_T = k_temp_scaling(Ea_E_J, T_K, Tref_K)
-        
-        dureza_min = float(p["dureza_min"])
-        alpha_E = float(p["alpha_E"])
-        
-        brix_min = float(p["brix_min"])
-        brix_max = float(p["brix_max"])
-        r0 = float(p["brix_g"])
-        alpha_bE = 0.25
-        bRH = max(0.0, (RH_ref - RH_pct) / 100.0)
-        rRH = 1.0 - 0.6 * bRH
-        rT = k_temp_scaling(Ea_E_J, T_K, Tref_K)
-        
-        RH_mold_thr = float(p["RH_mold_thr"])
-        mold_rate_ref = float(p["mold_rate_ref"])
-        mold_sens_RH = float(p["mold_sens_RH"])
-        mold_max_penalty = float(p["mold_max_penalty"])
-        Ea_mold_J = float(p["Ea_mold_J"])
-        
-        mold_T = k_temp_scaling(Ea_mold_J, T_K, Tref_K)
-        RH_excess = max(0.0, (RH_pct - RH_mold_thr) / 100.0)
-        RH_factor = 1.0 - math.exp(-mold_sens_RH * RH_excess)
-        
-        dureza = batch['dureza']
-        brix = batch['brix']
-        mold = batch['mold']
-        E_int = batch.get('E_int', float(p.get("E0_int", 0.01)))
-        age = batch.get('age', 0.0)
-        
-        for _ in range(steps):
-            current_age = age + (_ * dt)
-            ramp = sigmoid(E_g * (current_age - t0_eff))
-            prod = Eref_prod * prod_T * ramp
-            dE = (prod * (1.0 + E_auto * E_int) - E_decay * E_int) * dt
-            E_int = max(0.0, E_int + dE)
-            
-            E_total = E_ext_ppm + E_int
-            
-            kE = 1.0 + alpha_E * E_total
-            k = kT_firm * kRH * kE
-            dD = (-k * (dureza - dureza_min)) * dt
-            dureza = max(dureza_min, dureza + dD)
-            
-            r = r0 * rT * rRH * (1.0 + alpha_bE * E_total)
-            x = max(0.0, brix - brix_min)
-            K = max(1e-6, brix_max - brix_min)
-            db = (r * x * (1.0 - x / K)) * dt
-            brix = min(brix_max, max(brix_min, brix + db))
-            
-            rate = mold_rate_ref * mold_T * RH_factor
-            dm = (rate * (1.0 - mold)) * dt
-            mold = min(1.0, max(0.0, mold + dm))
-            
-        firm_score = 1.0 / (1.0 + math.exp(-0.35 * (dureza - float(p["qual_firm_threshold"]))))
-        brix_score = math.exp(-((brix - float(p["qual_brix_target"]))**2) / 2.0)
-        quality_base = 100.0 * (0.65 * firm_score + 0.35 * brix_score)
-        
-        mold_penalty = mold_max_penalty * mold
-        quality = quality_base * (1.0 - mold_penalty)
-        
-        return {
-            'quantity': batch['quantity'],
-            'dureza': dureza,
-            'brix': brix,
-            'mold': mold,
-            'E_int': E_int,
-            'age': age + 1.0,
-            'quality': quality
-        }
+        return advance_batch(self.PRESETS[self.fruit_key], batch, T_c, RH_pct, E_ext_ppm, dt=0.05, with_mold=True,
+                             coeffs=self._day_coeffs())
 
     def project_batch_rsl(self, batch):
         """ Projeta os dias restantes até que a qualidade caia abaixo de 30.0 """
-        b = {
-            'quantity': batch['quantity'],
-            'dureza': batch['dureza'],
-            'brix': batch['brix'],
-            'mold': batch['mold'],
-            'E_int': batch.get('E_int', 0.01),
-            'age': batch.get('age', 0.0),
-            'quality': batch.get('quality', 100.0)
-        }
-        
-        row = self.data.iloc[self.current_step]
-        T_c = row['temperature'] if 'temperature' in row else 1.5
-        RH_pct = row['humidity'] if 'humidity' in row else 92.0
-        E_ext_ppm = row['ethylene'] if 'ethylene' in row else 0.05
-        
-        days_remaining = 0
-        max_projection_days = 60
-        
-        while days_remaining < max_projection_days:
-            if b['quality'] < 30.0:
-                break
-            b = self.advance_batch_one_day(b, T_c, RH_pct, E_ext_ppm)
-            days_remaining += 1
-            
-        return days_remaining
+        return int(self.project_batches_rsl([batch])[0])
+
+    # Colunas do dataset lidas na simulação e o valor usado quando a coluna opcional não existe
+    DATA_COLUMNS = {
+        'prediction': None,
+        'real_value': None,
+        'price': 10.0,
+        'temperature': 1.5,
+        'humidity': 92.0,
+        'ethylene': 0.05,
+    }
+
+    def refresh_columns(self):
+        """
+        Copia o split de treino/teste para arrays NumPy contíguos (float64), lidos a cada passo em vez de
+        self.data.iloc[...]. Tem de ser chamado de novo se self.data for alterado depois da construção.
+        """
+        n = len(self.data)
+        self.columns = {}
+        for name, default in self.DATA_COLUMNS.items():
+            if name in self.data.columns:
+                self.columns[name] = np.ascontiguousarray(self.data[name].to_numpy(dtype=np.float64))
+            elif default is not None:
+                self.columns[name] = np.full(n, default, dtype=np.float64)
+
+        # Média e desvio-padrão móveis do preço em 15 dias (janela truncada no início do split),
+        # pré-calculados para o z-score do estado: _get_state passa a custar tempo constante
+        window = self.columns['price'][np.maximum(0, np.arange(n)[:, None] - np.arange(15))]
+        self.price_mean_15 = window.mean(axis=1)
+        self.price_std_15 = window.std(axis=1)
+
+        # Procura prevista acumulada (prolongada além do fim do split) para get_min_required_order_shelf_life
+        self.cum_prediction = forecast_prefix_sums(self.columns['prediction'])
+
+    def _current_climate(self):
+        i = self.current_step
+        cols = self.columns
+        return cols['temperature'][i], cols['humidity'][i], cols['ethylene'][i]
+
+    def _day_coeffs(self):
+        """ Coeficientes diários do preset, calculados uma vez por clima e partilhados pelos ambientes do processo """
+        p = self.PRESETS[self.fruit_key]
+        if self._coeffs is None or self._coeffs_preset is not p:
+            self._coeffs = day_coefficient_cache(p, dt=0.05, with_mold=True)
+            self._coeffs_preset = p
+        return self._coeffs
+
+    def _rsl_preset_key(self):
+        return self.rsl_cache.preset_key(self.fruit_key, self.PRESETS[self.fruit_key], dt=0.05, with_mold=True,
+                                         fingerprint=self._day_coeffs().fingerprint)
+
+    def project_batches_rsl(self, batches):
+        """ Versão vetorizada de project_batch_rsl: projeta numa só passagem os lotes que não estão em cache """
+        if not batches:
+            return np.zeros(0, dtype=np.int64)
+        return self._project_columns(batches_to_columns(batches, self.PRESETS[self.fruit_key]))
+
+    def _project_columns(self, cols, climate=None):
+        """ RSL de lotes já em colunas (ex.: slots de self.batches) com o clima do dia (ou o clima indicado) """
+        if len(cols['quality']) == 0:
+            return np.zeros(0, dtype=np.int64)
+        p = self.PRESETS[self.fruit_key]
+        T_c, RH_pct, E_ext_ppm = climate if climate is not None else self._current_climate()
+        return self.rsl_cache.project(self._rsl_preset_key(), p, cols, T_c, RH_pct, E_ext_ppm,
+                                      coeffs=self._day_coeffs())
 
     def get_stock_remaining_shelf_life(self):
         """ Retorna o menor RSL estimado entre os lotes ativos em armazém """
-        valid_batches = [b for b in self.active_batches if b['quantity'] > 0]
-        if not valid_batches:
+        slots = self.batches.live_slots()
+        if slots.size == 0:
             return 0
-        rsls = [self.project_batch_rsl(b) for b in valid_batches]
-        return min(rsls) if rsls else 0
+        rsls = self._project_columns(self.batches.columns(slots))
+        return int(rsls.min())
 
     def get_min_required_order_shelf_life(self, order_quantity):
         """ Retorna o shelf-life mínimo requerido para a nova encomenda sob FEFO """
-        if order_quantity <= 0:
-            return 0
-            
-        total_current_stock = sum(b['quantity'] for b in self.active_batches if b['quantity'] > 0)
-        target_qty = total_current_stock + order_quantity
-        
-        accumulated_demand = 0.0
-        days_ahead = 0
-        step_idx = self.current_step + 1
-        
-        while accumulated_demand < target_qty:
-            if step_idx <= self.max_steps:
-                pred_demand = self.data.iloc[step_idx]['prediction']
-            else:
-                pred_demand = self.data.iloc[-1]['prediction']
-                
-            accumulated_demand += pred_demand
-            days_ahead += 1
-            step_idx += 1
-            
-            if days_ahead > 60:
-                break
-                
-        return days_ahead
+        return int(self.get_min_required_order_shelf_lives([order_quantity])[0])
+
+    def get_min_required_order_shelf_lives(self, order_quantities):
+        """
+        Versão vetorizada de get_min_required_order_shelf_life: dias até que a procura prevista a partir de amanhã
+        cubra o stock atual mais cada quantidade candidata (0 para quantidades <= 0)
+        """
+        order_quantities = np.asarray(order_quantities, dtype=np.float64)
+        targets = self.batches.total_quantity() + order_quantities
+        days = min_required_shelf_lives(self.cum_prediction, self.current_step + 1, targets)
+        return np.where(order_quantities > 0, days, 0)
 
     def _update_stock_profile_from_batches(self):
         """ Atualiza self.stock_profile (G0-G3) somando os lotes pelo seu RSL """
-        self.stock_profile = [0.0, 0.0, 0.0, 0.0]
-        for b in self.active_batches:
-            if b['quantity'] <= 0:
-                continue
-            rsl = self.project_batch_rsl(b)
-            if rsl >= 4:
-                self.stock_profile[0] += b['quantity']
-            elif rsl == 3:
-                self.stock_profile[1] += b['quantity']
-            elif rsl == 2:
-                self.stock_profile[2] += b['quantity']
-            elif rsl == 1:
-                self.stock_profile[3] += b['quantity']
+        slots = self.batches.live_slots()
+        qty = self.batches.cols['quantity'][slots]
+        rsls = self._project_columns(self.batches.columns(slots))
+        self.stock_profile = [
+            float(qty[rsls >= 4].sum()),
+            float(qty[rsls == 3].sum()),
+            float(qty[rsls == 2].sum()),
+            float(qty[rsls == 1].sum())
+        ]
 
     def _get_state(self):
         """ Builds the Observation Vector (What the Actor SEES). """
-        row = self.data.iloc[self.current_step]
-        prediction_today = row['prediction']
-        price_today = row['price'] if 'price' in row else 10.0
+        prediction = self.columns['prediction']
+        real_value = self.columns['real_value']
+        prices = self.columns['price']
+        prediction_today = prediction[self.current_step]
+        price_today = prices[self.current_step]
         
         if self.current_step < self.max_steps:
-            prediction_tomorrow = self.data.iloc[self.current_step + 1]['prediction']
+            prediction_tomorrow = prediction[self.current_step + 1]
         else:
             prediction_tomorrow = prediction_today
             
@@ -422,12 +395,12 @@ class StockEnvironment:
         
         # --- HISTORICAL DEMAND ---
         if self.current_step >= 1:
-            real_t_minus_1 = self.data.iloc[self.current_step - 1]['real_value']
+            real_t_minus_1 = real_value[self.current_step - 1]
         else:
             real_t_minus_1 = prediction_today 
             
         if self.current_step >= 2:
-            real_t_minus_2 = self.data.iloc[self.current_step - 2]['real_value']
+            real_t_minus_2 = real_value[self.current_step - 2]
         else:
             real_t_minus_2 = real_t_minus_1
             
@@ -443,14 +416,8 @@ class StockEnvironment:
         cos_month = math.cos(2 * math.pi * month / 12.0)
 
         # --- Z-SCORE PRICE ---
-        window_prices = []
-        for i in range(15):
-            idx = max(0, self.current_step - i)
-            p = self.data.iloc[idx]['price'] if 'price' in self.data.columns else 10.0
-            window_prices.append(p)
-            
-        media_15dias = np.mean(window_prices)
-        std_15dias = np.std(window_prices)
+        media_15dias = self.price_mean_15[self.current_step]
+        std_15dias = self.price_std_15[self.current_step]
         preco_relativo = (price_today - media_15dias) / (std_15dias + 1e-8)
 
         # --- SUPER FEATURES ---
@@ -462,7 +429,7 @@ class StockEnvironment:
         urgencia_norm = self.stock_profile[3] / (stock_total_atual + 1e-8)
         
         if self.current_step >= 1:
-            prediction_yesterday = self.data.iloc[self.current_step - 1]['prediction']
+            prediction_yesterday = prediction[self.current_step - 1]
         else:
             prediction_yesterday = prediction_today
             
@@ -481,7 +448,8 @@ class StockEnvironment:
             real_t_minus_2
         ]
         
-        scaled_via1 = self.scaler.transform([via1_absolutas])[0]
+        # Mesma conta que self.scaler.transform (X * scale_ + min_), sem a validação do sklearn a cada passo
+        scaled_via1 = np.array(via1_absolutas, dtype=np.float64) * self.scaler.scale_ + self.scaler.min_
         preco_relativo_safe = np.clip(preco_relativo, -3.0, 3.0)
 
         via2_bypass = [
@@ -498,37 +466,44 @@ class StockEnvironment:
         final_state = np.concatenate([scaled_via1, via2_bypass])
         return final_state
 
+    def fork(self):
+        """
+        Cópia independente do ambiente no estado atual, para simulações de lookahead: as colunas do dataset,
+        presets e caches são partilhados (só são lidos durante um passo) e só o estado mutável (lotes, perfil
+        de stock, encomendas em trânsito) é copiado. A estatística de lucro (stat_profit) continua partilhada,
+        como entre os ambientes de um treino; usar step(..., update_stats=False) para não a alterar.
+        """
+        env = copy.copy(self)
+        env.batches = self.batches.copy()
+        env.stock_profile = list(self.stock_profile)
+        env.in_transit = dict(self.in_transit)
+        return env
+
     def get_checkpoint(self):
         return {
             'current_step': self.current_step,
             'stock_profile': list(self.stock_profile),
             'in_transit': {k: v for k, v in self.in_transit.items()},
-            'active_batches': [dict(b) for b in self.active_batches]
+            'batches': self.batches.snapshot()
         }
 
     def load_checkpoint(self, checkpoint):
         self.current_step = checkpoint['current_step']
         self.stock_profile = list(checkpoint['stock_profile'])
         self.in_transit = {k: v for k, v in checkpoint['in_transit'].items()}
-        if 'active_batches' in checkpoint:
-            self.active_batches = [dict(b) for b in checkpoint['active_batches']]
+        if 'batches' in checkpoint:
+            self.batches.restore(checkpoint['batches'])
+        elif 'active_batches' in checkpoint:
+            self.active_batches = checkpoint['active_batches']
         else:
-            p = self.PRESETS[self.fruit_key]
-            self.active_batches = [{
-                'quantity': sum(self.stock_profile),
-                'dureza': float(p["dureza_0_default"]),
-                'brix': float(p["brix_0_default"]),
-                'mold': 0.0,
-                'E_int': float(p.get("E0_int", 0.01)),
-                'age': 0.0,
-                'quality': 100.0
-            }]
+            self.batches.clear()
+            self.batches.add(sum(self.stock_profile), self._fresh_batch_state(self.PRESETS[self.fruit_key]))
 
     def step(self, action_quantity, update_stats=True):
         """
         The Core Physics Engine (With biological presets, FEFO and active batching)
         """
-        current_total_stock = sum(b['quantity'] for b in self.active_batches if b['quantity'] > 0)
+        current_total_stock = self.batches.total_quantity()
         
         # 1. Enforce Capacity Limits, Action Capping (max_order_limit), and Integer Constraints
         raw_order = max(0, min(action_quantity, self.max_order_limit, self.max_capacity - current_total_stock))
@@ -542,36 +517,16 @@ class StockEnvironment:
         
         accepted_arrivals = arrived_today - overflow_waste
         if accepted_arrivals > 0:
-            p = self.PRESETS[self.fruit_key]
-            self.active_batches.append({
-                'quantity': float(accepted_arrivals),
-                'dureza': float(p["dureza_0_default"]),
-                'brix': float(p["brix_0_default"]),
-                'mold': 0.0,
-                'E_int': float(p.get("E0_int", 0.01)),
-                'age': 0.0,
-                'quality': 100.0
-            })
+            self.batches.add(float(accepted_arrivals), self._fresh_batch_state(self.PRESETS[self.fruit_key]))
 
         # 3. The Oracle 
-        row = self.data.iloc[self.current_step]
-        real_demand = row['real_value']
-        price_today = row['price'] if 'price' in row else 10.0
+        real_demand = self.columns['real_value'][self.current_step]
+        price_today = self.columns['price'][self.current_step]
         
         # 4. Sell products (FEFO - Consome primeiro os lotes com menor RSL)
-        self.active_batches.sort(key=lambda b: self.project_batch_rsl(b))
-        remaining_demand = real_demand
-        sales = 0
-        
-        for b in self.active_batches:
-            if b['quantity'] <= 0:
-                continue
-            take = min(b['quantity'], remaining_demand)
-            b['quantity'] -= take
-            sales += take
-            remaining_demand -= take
-            if remaining_demand <= 0:
-                break
+        slots = self.batches.slots()
+        order = self.batches.sort_fefo(slots, self._project_columns(self.batches.columns(slots)))
+        sales, remaining_demand = self.batches.consume(order, real_demand)
                 
         missed_sales = remaining_demand
         
@@ -581,23 +536,30 @@ class StockEnvironment:
             self.in_transit[arrival_day] = self.in_transit.get(arrival_day, 0) + order_qty
 
         # 6. Aging and Decay for each active batch
-        T_c = row['temperature'] if 'temperature' in row else 1.5
-        RH_pct = row['humidity'] if 'humidity' in row else 92.0
-        E_ext_ppm = row['ethylene'] if 'ethylene' in row else 0.05
+        T_c, RH_pct, E_ext_ppm = self._current_climate()
         
         spoilage = 0.0
-        updated_batches = []
-        
-        for b in self.active_batches:
-            if b['quantity'] <= 0:
-                continue
-            b_next = self.advance_batch_one_day(b, T_c, RH_pct, E_ext_ppm)
-            if b_next['quality'] < 30.0:
-                spoilage += b_next['quantity']
-            else:
-                updated_batches.append(b_next)
-                
-        self.active_batches = updated_batches
+        
+        # Lotes esgotados libertam o slot; os restantes envelhecem de uma só vez no motor vetorizado
+        qty = self.batches.cols['quantity']
+        sold_out = qty[order] <= 0
+        self.batches.remove(order[sold_out])
+        live = order[~sold_out]
+        if live.size:
+            p = self.PRESETS[self.fruit_key]
+            cols = advance_columns(p, self.batches.columns(live), T_c, RH_pct, E_ext_ppm, coeffs=self._day_coeffs())
+
+            # O lote envelhecido é o 1.º dia da projeção feita no FEFO (mesmo clima): o seu RSL é o anterior - 1,
+            # o que evita voltar a projetá-lo em _update_stock_profile_from_batches
+            keys = self.rsl_cache.make_keys(self._rsl_preset_key(), cols, T_c, RH_pct, E_ext_ppm)
+            for key, rsl in zip(keys, self.batches.rsl[live].tolist()):
+                if 2 <= rsl < MAX_PROJECTION_DAYS:
+                    self.rsl_cache.put(key, rsl - 1)
+
+            self.batches.write(live, cols)
+            spoiled = live[cols['quality'] < QUALITY_SPOILED]
+            spoilage = float(qty[spoiled].sum())
+            self.batches.remove(spoiled)
         
         # Re-populate stock profile G0-G3
         self._update_stock_profile_from_batches()
@@ -645,3 +607,244 @@ class StockEnvironment:
         }
         
         return next_state, reward_z, done, info
+
+
+class VecStockEnvironment:
+    """
+    N cópias do StockEnvironment avançadas numa única chamada vetorizada.
+    O estado de todos os armazéns vive em arrays empilhados: perfil de stock (N x 4), encomenda em trânsito
+    (prazo de entrega de 1 dia, logo um valor por ambiente), current_step por ambiente e um único BatchStore
+    com o owner de cada lote. Chegadas, vendas FEFO, encomendas, maturação, deterioração e as contas de
+    lucro/recompensa correm para todos os ambientes de uma vez; os ambientes terminados fazem reset automático.
+
+    Os parâmetros (dataset, preset, custos, scaler, estatística de recompensa) vêm de um StockEnvironment
+    modelo construído com os mesmos argumentos. Com as mesmas ações, os resultados são idênticos aos de N
+    ambientes avançados um a um por ordem; as recompensas, normalizadas pela estatística partilhada de lucro
+    atualizada em lote, coincidem a menos de arredondamentos.
+    """
+
+    def __init__(self, excel_path, num_envs, **env_kwargs):
+        self.env = StockEnvironment(excel_path, **env_kwargs)
+        self.num_envs = num_envs
+        self.max_steps = self.env.max_steps
+        self.max_order_limit = self.env.max_order_limit
+        self.max_capacity = self.env.max_capacity
+        self.rsl_cache = self.env.rsl_cache
+
+        self.current_step = np.zeros(num_envs, dtype=np.int64)
+        self.in_transit = np.zeros(num_envs)            # Encomenda que chega em current_step
+        self.stock_profile = np.zeros((num_envs, 4))    # [G0, G1, G2, G3] por ambiente
+        self.batches = BatchStore(capacity=8 * num_envs)
+
+        # Tabelas de calendário (math.sin/cos, como em StockEnvironment._get_state)
+        self._sin_day = np.array([0.0] + [math.sin(2 * math.pi * d / 7.0) for d in range(1, 8)])
+        self._cos_day = np.array([0.0] + [math.cos(2 * math.pi * d / 7.0) for d in range(1, 8)])
+        self._sin_month = np.array([0.0] + [math.sin(2 * math.pi * m / 12.0) for m in range(1, 13)])
+        self._cos_month = np.array([0.0] + [math.cos(2 * math.pi * m / 12.0) for m in range(1, 13)])
+
+    def _preset(self):
+        return self.env.PRESETS[self.env.fruit_key]
+
+    def _climate(self, step):
+        cols = self.env.columns
+        return cols['temperature'][step], cols['humidity'][step], cols['ethylene'][step]
+
+    def _by_step(self, slots):
+        """ Agrupa slots pelo current_step do seu ambiente: (step, slots do grupo, máscara) """
+        steps = self.current_step[self.batches.owner[slots]]
+        first = steps[0] if steps.size else 0
+        if steps.size == 0 or (steps == first).all():
+            yield int(first), slots, None
+            return
+        for step in np.unique(steps):
+            mask = steps == step
+            yield int(step), slots[mask], mask
+
+    def _project_slots(self, slots):
+        """ RSL dos lotes indicados, cada um com o clima do dia do seu ambiente """
+        rsls = np.zeros(slots.size, dtype=np.int64)
+        for step, group, mask in self._by_step(slots):
+            projected = self.env._project_columns(self.batches.columns(group), climate=self._climate(step))
+            if mask is None:
+                rsls = projected
+            else:
+                rsls[mask] = projected
+        return rsls
+
+    def _update_stock_profiles(self, envs=None):
+        """ Recalcula o perfil G0-G3 dos ambientes indicados (todos por omissão) """
+        slots = self.batches.live_slots()
+        if envs is not None:
+            slots = slots[np.isin(self.batches.owner[slots], envs)]
+        owners = self.batches.owner[slots]
+        qty = self.batches.cols['quantity'][slots]
+        rsls = self._project_slots(slots)
+        bins = np.where(rsls >= 4, 0, 4 - np.clip(rsls, 0, 4))   # G0: rsl >= 4, G1..G3: rsl 3..1, 4: fora
+        profile = np.zeros((self.num_envs, 5))
+        np.add.at(profile, (owners, bins), qty)
+        if envs is None:
+            self.stock_profile = profile[:, :4]
+        else:
+            self.stock_profile[envs] = profile[envs, :4]
+
+    def _reset_envs(self, envs):
+        store = self.batches
+        used = np.flatnonzero(store.used)
+        store.remove(used[np.isin(store.owner[used], envs)])
+        self.current_step[envs] = 0
+        self.in_transit[envs] = 0.0
+        store.add_many(np.full(envs.size, self.env.stock_inicial),
+                       StockEnvironment._fresh_batch_state(self._preset()), envs)
+        self._update_stock_profiles(envs)
+
+    def reset(self):
+        """ Reinicia todos os ambientes no dia 0 e devolve os estados (N x 17) """
+        self.batches.clear()
+        self._reset_envs(np.arange(self.num_envs))
+        return self._get_states()
+
+    def _get_states(self):
+        """ StockEnvironment._get_state para todos os ambientes (N x 17) """
+        env = self.env
+        s = self.current_step
+        prediction = env.columns['prediction']
+        real_value = env.columns['real_value']
+        prediction_today = prediction[s]
+        price_today = env.columns['price'][s]
+        prediction_tomorrow = np.where(s < self.max_steps, prediction[np.minimum(s + 1, self.max_steps)],
+                                       prediction_today)
+
+        real_t_minus_1 = np.where(s >= 1, real_value[np.maximum(s - 1, 0)], prediction_today)
+        real_t_minus_2 = np.where(s >= 2, real_value[np.maximum(s - 2, 0)], real_t_minus_1)
+
+        day_of_year = (s % 365) + 1
+        day_of_week = (s % 7) + 1
+        month = np.minimum(12, (day_of_year / 30.416 + 1).astype(np.int64))
+
+        preco_relativo = (price_today - env.price_mean_15[s]) / (env.price_std_15[s] + 1e-8)
+
+        g = self.stock_profile
+        stock_total_atual = g[:, 0] + g[:, 1] + g[:, 2] + g[:, 3]
+        cobertura_norm = np.clip(stock_total_atual / (prediction_today + 1e-8), 0, 7) / 7.0
+        urgencia_norm = g[:, 3] / (stock_total_atual + 1e-8)
+
+        prediction_yesterday = np.where(s >= 1, prediction[np.maximum(s - 1, 0)], prediction_today)
+        erro_norm = np.clip((real_t_minus_1 - prediction_yesterday) / (prediction_yesterday + 1e-8), -1.0, 1.0)
+
+        via1_absolutas = np.column_stack([g, self.in_transit, prediction_today, prediction_tomorrow,
+                                          real_t_minus_1, real_t_minus_2])
+        scaled_via1 = via1_absolutas * env.scaler.scale_ + env.scaler.min_
+        via2_bypass = np.column_stack([
+            np.clip(preco_relativo, -3.0, 3.0),
+            self._sin_day[day_of_week],
+            self._cos_day[day_of_week],
+            self._sin_month[month],
+            self._cos_month[month],
+            cobertura_norm,
+            urgencia_norm,
+            erro_norm
+        ])
+        return np.concatenate([scaled_via1, via2_bypass], axis=1)
+
+    def step(self, actions, update_stats=True):
+        """
+        Avança os N ambientes um dia. Devolve (estados N x 17, recompensas, dones, info com um array por chave);
+        para os ambientes terminados o estado devolvido já é o do reset automático.
+        """
+        env = self.env
+        store = self.batches
+        n = self.num_envs
+        s = self.current_step
+        actions = np.asarray(actions, dtype=np.float64).reshape(n)
+
+        current_total_stock = store.total_quantity_by_owner(n)
+
+        # 1. Limites de capacidade e de encomenda, quantidades inteiras
+        raw_order = np.maximum(0, np.minimum(np.minimum(actions, self.max_order_limit),
+                                             self.max_capacity - current_total_stock))
+        order_qty = np.round(raw_order)
+
+        # 2. Chegadas (encomenda do dia anterior)
+        arrived_today = self.in_transit.copy()
+        overflow_waste = np.maximum(0, current_total_stock + arrived_today - self.max_capacity)
+        accepted_arrivals = arrived_today - overflow_waste
+        arriving = np.flatnonzero(accepted_arrivals > 0)
+        store.add_many(accepted_arrivals[arriving], StockEnvironment._fresh_batch_state(self._preset()), arriving)
+
+        # 3. Procura real e preço do dia
+        real_demand = env.columns['real_value'][s]
+        price_today = env.columns['price'][s]
+
+        # 4. Vendas FEFO (por ambiente, lotes com menor RSL primeiro)
+        slots = store.slots()
+        order = store.sort_fefo(slots, self._project_slots(slots))
+        sales, missed_sales = store.consume_by_owner(order, real_demand)
+
+        # 5. Nova encomenda (chega amanhã)
+        self.in_transit = order_qty.copy()
+
+        # 6. Maturação e deterioração
+        qty = store.cols['quantity']
+        sold_out = qty[order] <= 0
+        store.remove(order[sold_out])
+        live = order[~sold_out]
+        spoilage = np.zeros(n)
+        if live.size:
+            p = self._preset()
+            coeffs = env._day_coeffs()
+            for step, group, _ in self._by_step(live):
+                T_c, RH_pct, E_ext_ppm = self._climate(step)
+                cols = advance_columns(p, store.columns(group), T_c, RH_pct, E_ext_ppm, coeffs=coeffs)
+                keys = self.rsl_cache.make_keys(env._rsl_preset_key(), cols, T_c, RH_pct, E_ext_ppm)
+                for key, rsl in zip(keys, store.rsl[group].tolist()):
+                    if 2 <= rsl < MAX_PROJECTION_DAYS:
+                        self.rsl_cache.put(key, rsl - 1)
+                store.write(group, cols)
+                spoiled = group[cols['quality'] < QUALITY_SPOILED]
+                spoilage += np.bincount(store.owner[spoiled], weights=qty[spoiled], minlength=n)
+                store.remove(spoiled)
+
+        self._update_stock_profiles()
+        g = self.stock_profile
+        final_daily_stock = g[:, 0] + g[:, 1] + g[:, 2] + g[:, 3]
+
+        # 7. Contas financeiras
+        gross_profit = sales * price_today
+        storage_cost = (final_daily_stock * env.product_volume_m3) * env.CUSTO_ARMAZEM_POR_M3
+        transport_cost = np.where(order_qty > 0,
+                                  env.TAXA_PARAGEM_CAMIAO + (order_qty * env.product_volume_m3) * env.CUSTO_TRANSPORTE_POR_M3,
+                                  0.0)
+        stockout_cost = missed_sales * (price_today * env.STOCKOUT_PENALTY_MULT)
+        total_lost_boxes = overflow_waste + spoilage
+        waste_cost = total_lost_boxes * (price_today * env.WASTE_PENALTY_MULT)
+        zero_stock_cost = np.where(final_daily_stock <= 0, price_today * env.ZERO_STOCK_PENALTY_MULT, 0.0)
+
+        daily_profit = gross_profit - storage_cost - transport_cost - stockout_cost - waste_cost - zero_stock_cost
+
+        # A estatística de lucro recebe os N lucros num só lote; cada ambiente é normalizado com a média e o
+        # desvio-padrão que teria visto no ciclo escalar (depois dos lucros dos ambientes anteriores)
+        stat = env.stat_profit
+        if update_stats:
+            means, stds = stat.push_batch(daily_profit, return_running=True)
+        else:
+            means, stds = stat.mean, stat.std
+        rewards = np.clip((daily_profit - means) / (stds + env.eps), -env.clip_val, env.clip_val)
+
+        self.current_step = s + 1
+        dones = self.current_step >= self.max_steps
+        if dones.any():
+            self._reset_envs(np.flatnonzero(dones))
+        next_states = self._get_states()
+
+        info = {
+            'sales': sales,
+            'real_demand': real_demand,
+            'order_placed': order_qty,
+            'arrived_today': arrived_today,
+            'overflow_waste': total_lost_boxes,
+            'spoilage': spoilage,
+            'zero_stock_penalty': zero_stock_cost,
+            'profit': daily_profit,
+            'price_today': price_today
+        }
+        return next_states, rewards, dones, info
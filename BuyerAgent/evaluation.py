@@ -0,0 +1,368 @@
+"""
+Avaliação do Buyer Agent contra as baselines no split de teste, com um processo por política.
+
+Os rollouts das políticas são independentes entre si (cada uma tem o seu armazém), por isso não precisam de
+avançar em lockstep: evaluate() publica o dataset uma vez em memória partilhada (SharedDataset), corre cada
+baseline (Min-Max, Oráculo, DOS, CNN, ...) num processo do pool e, em simultâneo, o agente PPO (com o
+fine-tuning online) no processo atual. Cada rollout devolve um log diário (dict coluna -> lista) e
+merge_logs() junta-os numa tabela por dia, com as colunas de cada política sufixadas pelo seu nome:
+
+    logs, (log_agente, experiencias, update_days) = evaluate(EXCEL_PATH, {
+        'MinMax': ('minmax', {'s': 24, 'S': 60, 'max_capacity': 500}),
+        'Oraculo': ('oracle', {'max_capacity': 500}),
+    }, agent_rollout=lambda: run_agent(env_test, agent, update_interval_days=15, fine_tune=...))
+    df = merge_logs({'Agente': log_agente, **logs})     # Dia, Procura_Real, ..., Lucro_Acumulado_MinMax, ...
+
+As baselines correm sem limite de encomenda diária (max_order_limit = inf), como nos scripts originais.
+"""
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import torch
+
+from environment_constrained import StockEnvironment, VecStockEnvironment
+from orchestration.shared_dataset import SharedDataset
+
+# Colunas do log diário de um rollout (as duas primeiras são iguais em todas as políticas)
+LOG_COLUMNS = ['Dia', 'Procura_Real', 'Preco_Venda', 'Acao', 'Stock_Inicial', 'Stock_Final', 'Vendas',
+               'Vendas_Perdidas', 'Apodrecimento', 'Excesso_Armazem', 'Descarte_Total', 'Reward', 'Lucro_Diario',
+               'Lucro_Acumulado']
+SHARED_COLUMNS = ['Dia', 'Procura_Real', 'Preco_Venda']
+
+# Melhores valores de Min-Max (s, S) estabelecidos em conversas anteriores para cada SKU
+MIN_MAX_CONFIGS = {
+    "3_080": {"s": 24, "S": 60},
+    "3_090": {"s": 100, "S": 250},
+    "3_252": {"s": 10, "S": 70}, # Alterado para s=10, S=70 para igualar ao comparativo (anteriormente s=35, S=130 no orquestrador)
+    "3_586": {"s": 100, "S": 250},
+    "911753": {"s": 35, "S": 130}
+}
+
+
+# --- POLÍTICAS BASELINE ---
+# Cada política recebe o ambiente antes do passo do dia e devolve a quantidade a encomendar.
+
+def policy_minmax(env, s, S, max_capacity):
+    """ Min-Max (s, S) sobre o stock garantido amanhã de manhã (stock hoje - vendas hoje + chegadas amanhã) """
+    t = env.current_step
+    stock_hoje = sum(env.stock_profile) + env.in_transit.get(t, 0)
+    stock_amanha = max(0, stock_hoje - env.columns['real_value'][t]) + env.in_transit.get(t + 1, 0)
+    if stock_amanha <= s:
+        return min(max(0, S - stock_amanha), max_capacity)
+    return 0
+
+
+def policy_oracle(env, max_capacity, horizon=4):
+    """ Oráculo perfeito: conhece a procura real e, se amanhã faltar stock, cobre os próximos `horizon` dias """
+    t = env.current_step
+    real = env.columns['real_value']
+    stock_hoje = sum(env.stock_profile) + env.in_transit.get(t, 0)
+    stock_amanha = max(0, stock_hoje - real[t]) + env.in_transit.get(t + 1, 0)
+    demand_tomorrow = real[t + 1] if t + 1 <= env.max_steps else 0
+    if stock_amanha < demand_tomorrow:
+        future_demand = 0
+        for i in range(1, horizon + 1):
+            if t + i <= env.max_steps:
+                future_demand += real[t + i]
+        return min(max(0, future_demand - stock_amanha), max_capacity)
+    return 0
+
+
+def _inventory_position(env):
+    return sum(env.stock_profile) + sum(env.in_transit.values())
+
+
+def policy_dos(env, days=3):
+    """ Days of Supply: encomenda a previsão dos próximos `days` dias menos a posição de stock """
+    t = env.current_step
+    future_demand = env.columns['prediction'][t:min(env.max_steps, t + days)].sum()
+    return max(0, future_demand - _inventory_position(env))
+
+
+def policy_cnn_naive(env):
+    """ Repõe a previsão de amanhã sobre o stock que sobra depois da previsão de hoje """
+    t = env.current_step
+    prediction = env.columns['prediction']
+    stock_fim_do_dia = max(0, _inventory_position(env) - prediction[t])
+    return max(0, prediction[min(env.max_steps, t + 1)] - stock_fim_do_dia)
+
+
+def policy_minmax_position(env, min_stock=100, max_stock=250):
+    """ Min-Max clássico sobre a posição de stock (armazém + em trânsito) """
+    current_stock = _inventory_position(env)
+    if current_stock <= min_stock:
+        return max_stock - current_stock
+    return 0
+
+
+POLICIES = {
+    'minmax': policy_minmax,
+    'oracle': policy_oracle,
+    'dos': policy_dos,
+    'cnn': policy_cnn_naive,
+    'minmax_position': policy_minmax_position,
+}
+
+
+# --- ROLLOUTS ---
+
+def make_test_env(excel_path, max_capacity, data_frame=None):
+    """ Ambiente do split de teste (o do agente, com o limite de encomenda diária do treino) """
+    return StockEnvironment(excel_path=excel_path, is_training=False, train_split=0.6, max_capacity=max_capacity,
+                            data_frame=data_frame)
+
+
+def make_baseline_env(excel_path, max_capacity, data_frame=None):
+    """ Ambiente do split de teste sem limite de encomenda diária """
+    env = make_test_env(excel_path, max_capacity, data_frame=data_frame)
+    env.max_order_limit = float('inf')
+    return env
+
+
+def _record(log, day, action, reward, info, stock_inicial, stock_final):
+    sales = float(info['sales'])
+    real_demand = float(info['real_demand'])
+    spoilage = float(info['spoilage'])
+    profit = float(info['profit'])
+    log['Dia'].append(day)
+    log['Procura_Real'].append(real_demand)
+    log['Preco_Venda'].append(float(info['price_today']))
+    log['Acao'].append(float(action))
+    log['Stock_Inicial'].append(stock_inicial)
+    log['Stock_Final'].append(stock_final)
+    log['Vendas'].append(sales)
+    log['Vendas_Perdidas'].append(max(0.0, real_demand - sales))
+    log['Apodrecimento'].append(spoilage)
+    log['Excesso_Armazem'].append(max(0.0, float(info['overflow_waste']) - spoilage))
+    log['Descarte_Total'].append(float(info['overflow_waste']))
+    log['Reward'].append(float(reward))
+    log['Lucro_Diario'].append(profit)
+    log['Lucro_Acumulado'].append((log['Lucro_Acumulado'][-1] if log['Lucro_Acumulado'] else 0.0) + profit)
+
+
+def run_policy(env, policy, params=None, num_days=None):
+    """
+    Corre um episódio do ambiente com a política dada (nome em POLICIES ou função env -> ação) e devolve o
+    log diário. Com num_days pára ao fim desse número de dias.
+    """
+    decide = POLICIES[policy] if isinstance(policy, str) else policy
+    params = params or {}
+    max_days = env.max_steps if num_days is None else min(env.max_steps, num_days)
+    log = {column: [] for column in LOG_COLUMNS}
+    env.reset()
+    done = False
+    while not done and len(log['Dia']) < max_days:
+        day = env.current_step
+        action = decide(env, **params)
+        stock_inicial = float(sum(env.stock_profile))
+        _, reward, done, info = env.step(action)
+        _record(log, day, action, reward, info, stock_inicial, float(sum(env.stock_profile)))
+    return log
+
+
+def run_agent(env, agent, num_days=None, update_interval_days=None, fine_tune=None, on_day=None):
+    """
+    Rollout do agente PPO (ação amostrada da política, como em produção) no ambiente dado. Com fine_tune, a cada
+    update_interval_days dias fine_tune(experiências do ciclo) reajusta o agente. on_day(day, action, info) é
+    chamado no fim de cada dia. Devolve (log diário, todas as experiências, dias com fine-tuning).
+    """
+    actor = agent.policy_old_actor
+    device = next(actor.parameters()).device
+    max_order_limit = env.max_order_limit
+    max_days = env.max_steps if num_days is None else min(env.max_steps, num_days)
+    log = {column: [] for column in LOG_COLUMNS}
+    experiences = []
+    cycle_buffer = []
+    update_days = []
+
+    actor.eval()
+    state = env.reset()
+    done = False
+    while not done and len(log['Dia']) < max_days:
+        day = env.current_step
+        state_tensor = torch.FloatTensor(state).unsqueeze(0).to(device)
+        with torch.no_grad():
+            action_mean, log_std = actor(state_tensor)
+            dist = torch.distributions.Normal(action_mean, torch.exp(torch.clamp(log_std, -2.3, 1.5)))
+            action_percent = dist.sample()
+            action_logprob = dist.log_prob(action_percent)
+            physical_action = torch.round(torch.clamp(action_percent * max_order_limit, 0, max_order_limit)).cpu().numpy().flatten()[0]
+
+        stock_inicial = float(sum(env.stock_profile))
+        next_state, reward, done, info = env.step(physical_action)
+        _record(log, day, physical_action, reward, info, stock_inicial, float(sum(env.stock_profile)))
+
+        experience = {
+            'state': state_tensor.squeeze(0).cpu().numpy(),
+            'action': action_percent.squeeze(0).cpu().numpy(),
+            'logprob': action_logprob.squeeze(0).cpu().numpy(),
+            'reward': reward,
+            'is_terminal': done
+        }
+        experiences.append(experience)
+        cycle_buffer.append(experience)
+        if on_day is not None:
+            on_day(day, physical_action, info)
+
+        state = next_state
+        # Fine-tuning online (nunca no último dia)
+        if fine_tune is not None and len(log['Dia']) % update_interval_days == 0 and not done:
+            update_days.append(len(log['Dia']))
+            fine_tune(cycle_buffer)
+            cycle_buffer = []
+            actor = agent.policy_old_actor
+            actor.eval()
+
+    return log, experiences, update_days
+
+
+def _init_worker():
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+    torch.set_num_threads(1)
+
+
+def _run_baseline(dataset_spec, excel_path, preset, max_capacity, policy, params, num_days):
+    """ Rollout de uma baseline num processo do pool, sobre o dataset partilhado """
+    dataset = SharedDataset.attach(dataset_spec)
+    try:
+        env = make_baseline_env(excel_path, max_capacity, data_frame=dataset.frame)
+        # Coeficientes biológicos resolvidos no processo principal (p.ex. os da base de dados no dashboard)
+        env.PRESETS[env.fruit_key] = preset
+        return run_policy(env, policy, params, num_days)
+    finally:
+        env = None
+        dataset.close()
+
+
+def evaluate(excel_path, baselines, agent_rollout=None, max_capacity=500, num_days=None, max_workers=None):
+    """
+    Avalia as baselines ({nome: (política, parâmetros)}, com a política pelo nome em POLICIES) no split de
+    teste, uma por processo (por omissão tantos processos quanto baselines, até ao número de cores; com
+    max_workers = 0 corre tudo neste processo). agent_rollout(), se dado, corre neste processo enquanto as
+    baselines avançam no pool. Devolve ({nome: log diário}, resultado de agent_rollout).
+    """
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, len(baselines))
+    if max_workers == 0 or not baselines:
+        agent_result = agent_rollout() if agent_rollout is not None else None
+        logs = {}
+        for name, (policy, params) in baselines.items():
+            logs[name] = run_policy(make_baseline_env(excel_path, max_capacity), policy, params, num_days)
+        return logs, agent_result
+
+    dataset = SharedDataset.publish(excel_path)
+    try:
+        # Ambiente modelo no processo principal: resolve o preset biológico do SKU uma única vez
+        template = make_baseline_env(excel_path, max_capacity, data_frame=dataset.frame)
+        preset = dict(template.PRESETS[template.fruit_key])
+        template = None
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(baselines)), mp_context=mp.get_context('spawn'),
+                                 initializer=_init_worker) as pool:
+            futures = {name: pool.submit(_run_baseline, dataset.spec, excel_path, preset, max_capacity, policy,
+                                         params, num_days)
+                       for name, (policy, params) in baselines.items()}
+            agent_result = agent_rollout() if agent_rollout is not None else None
+            logs = {name: future.result() for name, future in futures.items()}
+    finally:
+        dataset.close()
+        dataset.unlink()
+    return logs, agent_result
+
+
+def summarize_log(log):
+    """ Métricas de um rollout (totais do log diário) """
+    procura = sum(log['Procura_Real'])
+    vendas = sum(log['Vendas'])
+    return {
+        'dias': len(log['Dia']),
+        'lucro_total': log['Lucro_Acumulado'][-1] if log['Lucro_Acumulado'] else 0.0,
+        'procura': procura,
+        'vendas': vendas,
+        'vendas_perdidas': sum(log['Vendas_Perdidas']),
+        'fill_rate': vendas / (procura + 1e-8) * 100,
+        'apodrecimento': sum(log['Apodrecimento']),
+        'excesso_armazem': sum(log['Excesso_Armazem']),
+        'descarte_total': sum(log['Descarte_Total']),
+        'encomendas': sum(1 for action in log['Acao'] if action > 0),
+        'unidades_encomendadas': sum(log['Acao']),
+        'dias_stock_zero': sum(1 for stock in log['Stock_Final'] if stock <= 0),
+    }
+
+
+def sweep_minmax(excel_path, s_values, S_values, max_capacity=500, num_days=None, data_frame=None):
+    """
+    Varrimento Min-Max: avalia de uma só vez todos os pares (s, S) da grelha s_values x S_values com S > s, cada
+    par num ambiente de um VecStockEnvironment (os pares são a dimensão de lote), com a mesma regra e os mesmos
+    resultados de policy_minmax num StockEnvironment sem limite de encomenda. Devolve:
+
+        {'s_values', 'S_values',
+         'profit', 'fill_rate', 'waste': superfícies len(s_values) x len(S_values) (NaN onde S <= s),
+         'best': {'s', 'S', 'profit', 'fill_rate', 'waste'} do par com maior lucro, 'pairs', 'days'}
+    """
+    s_values = np.array(sorted(set(s_values)), dtype=np.float64)
+    S_values = np.array(sorted(set(S_values)), dtype=np.float64)
+    s_grid, S_grid = np.meshgrid(s_values, S_values, indexing='ij')
+    valid = S_grid > s_grid
+    if not valid.any():
+        raise ValueError("A grelha não tem nenhum par (s, S) com S > s")
+    s_pairs, S_pairs = s_grid[valid], S_grid[valid]
+
+    vec_env = VecStockEnvironment(excel_path, s_pairs.size, is_training=False, train_split=0.6,
+                                  max_capacity=max_capacity, data_frame=data_frame)
+    vec_env.max_order_limit = float('inf')
+    real_value = vec_env.env.columns['real_value']
+    max_days = vec_env.max_steps if num_days is None else min(vec_env.max_steps, num_days)
+
+    profit = np.zeros(s_pairs.size)
+    sales = np.zeros(s_pairs.size)
+    waste = np.zeros(s_pairs.size)
+    demand = 0.0
+    vec_env.reset()
+    for _ in range(max_days):
+        # Todos os ambientes estão no mesmo dia; stock garantido amanhã de manhã, como em policy_minmax
+        t = vec_env.current_step[0]
+        g = vec_env.stock_profile
+        stock_amanha = np.maximum(0, g[:, 0] + g[:, 1] + g[:, 2] + g[:, 3] + vec_env.in_transit - real_value[t])
+        actions = np.where(stock_amanha <= s_pairs, np.minimum(np.maximum(0, S_pairs - stock_amanha), max_capacity), 0)
+        _, _, _, info = vec_env.step(actions, update_stats=False)
+        profit += info['profit']
+        sales += info['sales']
+        waste += info['overflow_waste']
+        demand += float(real_value[t])
+
+    fill_rate = sales / (demand + 1e-8) * 100
+
+    def surface(values):
+        grid = np.full(valid.shape, np.nan)
+        grid[valid] = values
+        return grid
+
+    best = int(np.argmax(profit))
+    return {
+        's_values': s_values,
+        'S_values': S_values,
+        'profit': surface(profit),
+        'fill_rate': surface(fill_rate),
+        'waste': surface(waste),
+        'best': {'s': float(s_pairs[best]), 'S': float(S_pairs[best]), 'profit': float(profit[best]),
+                 'fill_rate': float(fill_rate[best]), 'waste': float(waste[best])},
+        'pairs': int(s_pairs.size),
+        'days': max_days,
+    }
+
+
+def merge_logs(logs):
+    """
+    Junta os logs diários ({nome: log}) numa tabela por dia: Dia, Procura_Real e Preco_Venda uma vez e as
+    restantes colunas de cada política como <coluna>_<nome> (ex.: Lucro_Acumulado_MinMax).
+    """
+    frames = []
+    for i, (name, log) in enumerate(logs.items()):
+        df = pd.DataFrame(log).set_index('Dia')
+        shared = SHARED_COLUMNS[1:] if i == 0 else []
+        df = df[shared + [c for c in df.columns if c not in SHARED_COLUMNS]]
+        frames.append(df.rename(columns={c: f"{c}_{name}" for c in df.columns if c not in SHARED_COLUMNS}))
+    return pd.concat(frames, axis=1).reset_index()
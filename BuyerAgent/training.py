@@ -0,0 +1,284 @@
+"""
+Treino PPO do Buyer Agent como API importável: recebe o dataset em memória (DataFrame ou colunas em arrays),
+corre o learner e um VecStockEnvironment no próprio processo e devolve os state_dicts, sem ficheiro Excel,
+subprocesso nem ficheiros .pth intermédios. O progresso é emitido por callback a cada iteração.
+
+    from training import train_buyer_agent
+    result = train_buyer_agent({'real_value': vendas, 'price': precos}, seed=1337, config={'max_episodes': 640},
+                               progress=lambda info: print(info['episodes'], info['avg_profit']))
+    agent.policy_actor.load_state_dict(result['actor'])
+
+Com config['eval_every'] > 0 a política é avaliada no split de teste (evaluate_policy) a cada eval_every iterações;
+o resultado devolvido é o da melhor avaliação e o treino pára ao fim de config['patience'] avaliações sem melhoria.
+
+0_training_constrained.py (treino multi-core) e o agendador de treinos usam a mesma recolha (collect_rollout).
+"""
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from environment_constrained import StockEnvironment, VecStockEnvironment, EnvRunningStat
+from orchestration.checkpoints import PlateauStopper
+from orchestration.shared_rollout import SharedRollout
+from agent.ppo_agent import ParallelPPOAgent
+
+# Hiperparâmetros por omissão (os mesmos valores das constantes de 0_training_constrained.py)
+DEFAULT_CONFIG = {
+    'num_envs': 64,
+    'max_episodes': 20000,
+    'horizon': 90,
+    'max_capacity': 500,
+    'lr_actor': 0.0003,
+    'lr_critic': 0.001,
+    'gamma': 0.8,
+    'k_epochs': 30,
+    'eps_clip': 0.2,
+    'batch_size': 2048,
+    'advantage_mode': "mc",
+    'gae_lambda': 0.95,
+    'eval_every': 10,
+    'patience': 10,
+    'min_delta': 0.0,
+}
+
+
+def resolve_config(config=None, base=None):
+    """ `base` (por omissão DEFAULT_CONFIG) com `config` aplicado por cima; rejeita chaves desconhecidas """
+    resolved = dict(DEFAULT_CONFIG if base is None else base)
+    unknown = set(config or {}) - set(resolved)
+    if unknown:
+        raise ValueError(f"Hiperparâmetros desconhecidos: {sorted(unknown)} (válidos: {sorted(resolved)})")
+    resolved.update(config or {})
+    return resolved
+
+
+def as_training_frame(data):
+    """
+    DataFrame (ou dict coluna -> array) no formato lido pelo ambiente. As colunas numéricas do ambiente
+    (real_value, price, clima, ...) passam a float64, p.ex. quando vêm da base de dados como Decimal.
+    Sem coluna 'prediction', a previsão de procura é a média das vendas dos 7 dias anteriores (previsão ingénua,
+    sem olhar para o próprio dia).
+    """
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(dict(data))
+    if 'real_value' not in df.columns:
+        raise ValueError("O dataset de treino precisa da coluna 'real_value' (vendas diárias)")
+    numeric = [name for name in StockEnvironment.DATA_COLUMNS if name in df.columns and df[name].dtype != np.float64]
+    if numeric:
+        df = df.assign(**{name: pd.to_numeric(df[name], errors='coerce').astype(np.float64) for name in numeric})
+    if 'prediction' not in df.columns:
+        sales = df['real_value']
+        df = df.assign(prediction=sales.shift(1).rolling(7, min_periods=1).mean().fillna(sales))
+    return df
+
+
+def collect_rollout(vec_env, actor, rollout, lo, states_matrix, generator=None):
+    """
+    Recolhe uma ronda de rollout.horizon passos com o ator dado e escreve-a nas colunas [lo, lo + num_envs)
+    de rollout. Devolve (estados finais, lucro total da ronda). As ações são amostradas com `generator`
+    (no dispositivo do ator) ou, sem ele, com o RNG global do PyTorch.
+    """
+    device = next(actor.parameters()).device
+    max_order_limit = vec_env.max_order_limit
+    total_profit = 0.0
+
+    for step in range(rollout.horizon):
+        with torch.no_grad():
+            st_t = torch.FloatTensor(states_matrix).to(device)
+            action_mean, log_std = actor(st_t)
+            dist = torch.distributions.Normal(action_mean, torch.exp(torch.clamp(log_std, -2.3, 1.5)))
+            action_percent = torch.normal(dist.loc, dist.scale.expand_as(dist.loc), generator=generator)
+            action_logprob = dist.log_prob(action_percent)
+            # Escalar com base no limite máximo e não na capacidade total do armazém!
+            physical_actions = torch.round(torch.clamp(action_percent * max_order_limit, 0, max_order_limit)).cpu().numpy().flatten()
+
+        # Um único passo para todos os ambientes (com reset automático dos que terminam)
+        next_states, rewards, dones, info = vec_env.step(physical_actions)
+
+        rollout.write_step(step, lo, st_t.cpu(), action_percent.cpu(), action_logprob.cpu(), rewards, dones, info['profit'])
+        total_profit += info['profit'].sum()
+        states_matrix = next_states
+
+    rollout.write_final_states(lo, torch.FloatTensor(states_matrix))
+    return states_matrix, total_profit
+
+
+def make_eval_env(dataset_name, frame, max_capacity):
+    """ Ambiente de avaliação: um único ambiente sobre o split de teste, com o limite de encomenda do treino """
+    return VecStockEnvironment(dataset_name, 1, is_training=False, train_split=0.6, max_capacity=max_capacity,
+                               data_frame=frame)
+
+
+def evaluate_policy(actor, eval_env):
+    """
+    Lucro médio por ambiente de um episódio completo em eval_env com a ação determinística (média da política).
+    O ambiente é determinístico, por isso uma passagem chega; as estatísticas de recompensa não são atualizadas.
+    """
+    device = next(actor.parameters()).device
+    max_order_limit = eval_env.max_order_limit
+    states_matrix = eval_env.reset()
+    total_profit = 0.0
+    for _ in range(eval_env.max_steps):
+        with torch.no_grad():
+            action_mean, _ = actor(torch.FloatTensor(states_matrix).to(device))
+            physical_actions = torch.round(torch.clamp(action_mean * max_order_limit, 0, max_order_limit)).cpu().numpy().flatten()
+        states_matrix, _, _, info = eval_env.step(physical_actions, update_stats=False)
+        total_profit += info['profit'].sum()
+    return float(total_profit / eval_env.num_envs)
+
+
+def running_stat_state(stat):
+    return {'n': stat.n, 'mean': stat.mean, 'S': stat.S}
+
+
+def load_running_stat(stat, state):
+    """ Repõe em `stat` (RunningStat/EnvRunningStat) o estado devolvido por running_stat_state """
+    stat.n, stat.mean, stat.S = state['n'], state['mean'], state['S']
+    return stat
+
+
+def merge_running_stats(states):
+    """ EnvRunningStat que junta os estados (running_stat_state) de vários workers """
+    merged = EnvRunningStat()
+    for state in states:
+        merged.merge(load_running_stat(EnvRunningStat(), state))
+    return merged
+
+
+def seed_parameters(module, generator):
+    """
+    Reinicializa as camadas nn.Linear de `module` com a inicialização por omissão do PyTorch, mas tirando os
+    números de `generator` (CPU) em vez do RNG global do processo.
+    """
+    for layer in module.modules():
+        if isinstance(layer, torch.nn.Linear):
+            weight = torch.nn.init.kaiming_uniform_(torch.empty(layer.weight.shape), a=math.sqrt(5),
+                                                    generator=generator)
+            with torch.no_grad():
+                layer.weight.copy_(weight)
+                if layer.bias is not None:
+                    bound = 1 / math.sqrt(layer.in_features) if layer.in_features > 0 else 0
+                    layer.bias.copy_(torch.empty(layer.bias.shape).uniform_(-bound, bound, generator=generator))
+    return module
+
+
+def snapshot_agent(agent, econ_stat):
+    """ Cópia em CPU dos pesos e estatísticas do agente, no formato de resultado de train_buyer_agent """
+    return {
+        'actor': {k: v.detach().cpu().clone() for k, v in agent.policy_old_actor.state_dict().items()},
+        'critic': {k: v.detach().cpu().clone() for k, v in agent.policy_old_critic.state_dict().items()},
+        'scaler': running_stat_state(agent.reward_scaler),
+        'econ_stat': running_stat_state(econ_stat),
+    }
+
+
+def checkpoint_files(result):
+    """ {sufixo: objeto} com os nomes de ParallelPPOAgent.save (+ _econ_stat.pth) """
+    return {
+        '_actor.pth': result['actor'],
+        '_critic.pth': result['critic'],
+        '_scaler.pth': result['scaler'],
+        '_econ_stat.pth': result['econ_stat'],
+    }
+
+
+def train_buyer_agent(data, seed=1337, config=None, progress=None, dataset_name="in_memory", stop_event=None):
+    """
+    Treina o Buyer Agent no processo atual e devolve os pesos em memória:
+
+        {'actor': state_dict, 'critic': state_dict, 'scaler': {n, mean, S}, 'econ_stat': {n, mean, S},
+         'max_action': limite de encomenda do treino, 'config': hiperparâmetros usados, 'summary': {...}}
+
+    `data` é um DataFrame ou dict coluna -> array (ver as_training_frame); `config` sobrepõe DEFAULT_CONFIG.
+    Com avaliação (eval_every > 0) os pesos devolvidos são os da iteração com maior lucro no split de teste.
+    `progress(info)` é chamado no fim de cada iteração com episodes, max_episodes, iteration, avg_profit,
+    loss_total, loss_actor, loss_critic e elapsed_s (e eval_profit nas iterações avaliadas). `dataset_name` escolhe o preset biológico pelo nome do
+    SKU (ex.: 'm5_foods_3_252'), como o caminho do Excel nos scripts.
+    `seed` alimenta geradores locais (pesos iniciais, amostragem das ações e ordem dos mini-lotes): o treino
+    corre dentro do servidor Django e não volta a semear os RNG globais do processo.
+    `stop_event` (ex.: threading.Event) interrompe o treino no fim da iteração em que fica ativo; o resultado é o
+    das iterações já feitas.
+    """
+    config = resolve_config(config)
+    frame = as_training_frame(data)
+
+    shared_stats = {
+        'econ': EnvRunningStat(), 'eco': EnvRunningStat(), 'risk': EnvRunningStat()
+    }
+    num_envs = config['num_envs']
+    vec_env = VecStockEnvironment(dataset_name, num_envs, is_training=True, train_split=0.6,
+                                  max_capacity=config['max_capacity'], shared_stats=shared_stats, data_frame=frame)
+    agent = ParallelPPOAgent(state_dim=17, action_dim=1, max_action=vec_env.max_order_limit,
+                             lr_actor=config['lr_actor'], lr_critic=config['lr_critic'], gamma=config['gamma'],
+                             K_epochs=config['k_epochs'], eps_clip=config['eps_clip'], batch_size=config['batch_size'],
+                             advantage_mode=config['advantage_mode'], gae_lambda=config['gae_lambda'])
+    agent.generator = torch.Generator().manual_seed(seed)
+    for network, old_network in ((agent.policy_actor, agent.policy_old_actor),
+                                 (agent.policy_critic, agent.policy_old_critic)):
+        old_network.load_state_dict(seed_parameters(network, agent.generator).state_dict())
+    action_generator = torch.Generator(device=agent.device).manual_seed(seed)
+    rollout = SharedRollout(config['horizon'], num_envs, state_dim=17, action_dim=1)
+    eval_every = config['eval_every']
+    eval_env = make_eval_env(dataset_name, frame, config['max_capacity']) if eval_every > 0 else None
+    stopper = PlateauStopper(config['patience'], config['min_delta'])
+    best = None
+
+    states_matrix = vec_env.reset()
+    episodes_played = 0
+    profits = []
+    losses = []
+    start_time = time.perf_counter()
+    while episodes_played < config['max_episodes']:
+        states_matrix, total_profit = collect_rollout(vec_env, agent.policy_old_actor, rollout, 0, states_matrix,
+                                                      generator=action_generator)
+        rollout.fill_buffer(agent.buffer, agent.device)
+        loss_t, loss_a, loss_c = agent.update()
+
+        episodes_played += num_envs
+        profits.append(float(total_profit / num_envs))
+        losses.append(loss_t)
+        info = {
+            'episodes': episodes_played, 'max_episodes': config['max_episodes'], 'iteration': len(profits),
+            'avg_profit': profits[-1], 'loss_total': loss_t, 'loss_actor': loss_a, 'loss_critic': loss_c,
+        }
+        last_iteration = episodes_played >= config['max_episodes']
+        if eval_env is not None and (len(profits) % eval_every == 0 or last_iteration):
+            info['eval_profit'] = evaluate_policy(agent.policy_old_actor, eval_env)
+            if best is None or info['eval_profit'] > best['eval_profit']:
+                best = {**snapshot_agent(agent, shared_stats['econ']), 'eval_profit': info['eval_profit'],
+                        'iteration': len(profits)}
+            stopper.update(info['eval_profit'], len(profits))
+        if progress is not None:
+            progress({**info, 'elapsed_s': time.perf_counter() - start_time})
+        if stopper.should_stop or (stop_event is not None and stop_event.is_set()):
+            break
+    elapsed = time.perf_counter() - start_time
+
+    weights = best if best is not None else snapshot_agent(agent, shared_stats['econ'])
+    return {
+        **{key: weights[key] for key in ('actor', 'critic', 'scaler', 'econ_stat')},
+        'max_action': vec_env.max_order_limit,
+        'config': config,
+        'summary': {
+            'episodes': episodes_played,
+            'iterations': len(profits),
+            'elapsed_s': elapsed,
+            'episodes_per_sec': episodes_played / max(elapsed, 1e-9),
+            'final_avg_profit': profits[-1] if profits else None,
+            'best_avg_profit': max(profits) if profits else None,
+            'final_loss': losses[-1] if losses else None,
+            'best_eval_profit': best['eval_profit'] if best is not None else None,
+            'best_eval_iteration': best['iteration'] if best is not None else None,
+            'stopped_early': stopper.should_stop,
+        },
+    }
+
+
+def save_result(result, checkpoint_path):
+    """ Grava o resultado de train_buyer_agent com os nomes de ParallelPPOAgent.save (+ _econ_stat.pth) """
+    os.makedirs(os.path.dirname(checkpoint_path) or '.', exist_ok=True)
+    for suffix, obj in checkpoint_files(result).items():
+        torch.save(obj, checkpoint_path + suffix)
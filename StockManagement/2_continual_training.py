@@ -12,6 +12,7 @@ sys.path.append(current_dir)
 
 from agent.ppo_agent import ParallelPPOAgent
 from environment_pricing import PricingStockEnvironment
+from orchestration.checkpoints import TRAINING_STATE_SUFFIX, load_training_state, save_training_state
 
 # Config
 MODEL_DIR = os.path.join(current_dir, "models")
@@ -67,7 +68,12 @@ def get_next_version_name(sku_name):
     next_v = max(versions) + 1 if versions else 1
     return os.path.join(MODEL_DIR, f"{sku_name}_v{next_v}")
 
-def run_continual_training(sku_name="3_080"):
+def run_continual_training(sku_name="3_080", resume=False):
+    """
+    Online fine-tuning on the logged real experience. Every saved version also gets the full learner state
+    (<version>_training_state.pt: Adam moments and reward scaler); with resume=True fine-tuning continues from
+    that state instead of restarting the optimizer from zero.
+    """
     print("======================================================")
     print(f" INICIANDO RETREINO CONTINUO (STOCK AGENT: {sku_name}) ")
     print("======================================================")
@@ -106,12 +112,19 @@ def run_continual_training(sku_name="3_080"):
     
     # Load model
     model_path = get_latest_model(sku_name)
-    try:
-        agent.load(model_path)
-        print(f"[OK] Modelo base carregado de: {model_path}")
-    except Exception as e:
-        print(f"[ERRO] Falha ao carregar o modelo base: {e}")
-        return
+    state_path = model_path + TRAINING_STATE_SUFFIX
+    if resume and os.path.exists(state_path):
+        agent.load_training_state(load_training_state(state_path)['agent'])
+        print(f"[OK] Estado completo de treino retomado de: {state_path}")
+    else:
+        if resume:
+            print(f"[AVISO] Sem estado de treino em {state_path}. A carregar só os pesos do modelo.")
+        try:
+            agent.load(model_path)
+            print(f"[OK] Modelo base carregado de: {model_path}")
+        except Exception as e:
+            print(f"[ERRO] Falha ao carregar o modelo base: {e}")
+            return
         
     # Lower learning rates for online fine-tuning
     for param_group in agent.optimizer_actor.param_groups:
@@ -177,6 +190,8 @@ def run_continual_training(sku_name="3_080"):
     # Also overwrite the active production weights
     active_path = os.path.join(MODEL_DIR, sku_name)
     agent.save(active_path)
+    for path in (next_version, active_path):
+        save_training_state(path + TRAINING_STATE_SUFFIX, {'agent': agent.training_state()})
     print(f"[OK] Modelo atualizado e salvo em: {next_version} e {active_path}")
     
     # Clear logs
@@ -188,6 +203,8 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--sku", type=str, default="3_080", choices=["3_080", "911753", "3_252", "3_090", "3_586"])
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from the full training state saved with the model (Adam moments, reward scaler)")
     args = parser.parse_args()
     
-    run_continual_training(args.sku)
+    run_continual_training(args.sku, resume=args.resume)
@@ -84,31 +84,18 @@ def run_fine_tuning(agent, new_experiences, env_train):
     # 3. Update agent weights
     agent.update()
 
+# Oracle search grid: 11 price multipliers x 5 shelf exposures, in the order of the former nested loops
+ORACLE_ACTION_GRID = np.array([[p, q] for p in np.linspace(0.5, 1.5, 11) for q in np.linspace(0.1, 1.0, 5)])
+
 def run_oracle_lookahead(env_oracle):
     """
     Looks ahead 1 step and selects optimal price multiplier and shelf exposure
-    using a brute-force checkpoint search grid.
+    over the ORACLE_ACTION_GRID, evaluated as one vectorized step (env.evaluate_actions)
+    without touching the environment state.
     """
-    ckpt = env_oracle.get_checkpoint()
-    
-    # 2D search grid
-    p_grid = np.linspace(0.5, 1.5, 11)
-    q_grid = np.linspace(0.1, 1.0, 5)
-    
-    best_profit = -float('inf')
-    best_action = [1.0, 1.0]
-    
-    for p in p_grid:
-        for q in q_grid:
-            env_oracle.load_checkpoint(ckpt)
-            _, _, _, info = env_oracle.step([p, q])
-            if info['profit'] > best_profit:
-                best_profit = info['profit']
-                best_action = [p, q]
-                
-    # Restore final
-    env_oracle.load_checkpoint(ckpt)
-    return best_action
+    profits = env_oracle.evaluate_actions(ORACLE_ACTION_GRID)['profit']
+    # First best candidate in grid order, as with the strict comparison of the brute-force loop
+    return ORACLE_ACTION_GRID[int(np.argmax(profits))].tolist()
 
 def run_orchestrated_evaluation(sku_name="3_080", generate_plots=True):
     print("======================================================")
@@ -1,3 +1,4 @@
+import math
 import torch
 import torch.nn as nn
 import torch.optim as optim
@@ -24,26 +25,157 @@ class RunningStat:
             self.mean = old_mean + (x_arr - old_mean) / self.n
             self.S = self.S + (x_arr - old_mean) * (x_arr - self.mean)
 
+    def push_batch(self, x):
+        """
+        Merges a batch of observations (axis 0) in one go with the parallel-variance combination of Chan et al.
+        Equivalent, up to rounding, to calling push() on every element in order.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        k = x.shape[0]
+        if k == 0:
+            return
+        batch_mean = x.mean(axis=0)
+        batch_S = np.square(x - batch_mean).sum(axis=0)
+        if self.n == 0:
+            self.mean = batch_mean
+            self.S = batch_S
+        else:
+            delta = batch_mean - self.mean
+            total = self.n + k
+            self.mean = self.mean + delta * k / total
+            self.S = self.S + batch_S + np.square(delta) * self.n * k / total
+        self.n += k
+
     @property
     def std(self):
         variance = self.S / (self.n - 1) if self.n > 1 else np.square(self.mean)
         return np.sqrt(np.maximum(variance, 1e-8))
 
+class StepColumn:
+    """
+    One buffer field stored in a preallocated [capacity, N, ...] tensor and filled step by step with append().
+    Memory is reused across rounds (clear() only rewinds the cursor) and capacity doubles when a round is
+    longer than previous ones. view() returns the written steps without torch.stack.
+    """
+    def __init__(self, dtype=None, capacity=128):
+        self.dtype = dtype
+        self.capacity = capacity
+        self.data = None
+        self.size = 0
+
+    def _reserve(self, template, n_steps):
+        if self.data is not None and self.size > 0 and self.data.shape[1:] != template.shape[1:]:
+            raise ValueError(f"Step of shape {tuple(template.shape[1:])} in a buffer of {tuple(self.data.shape[1:])} steps")
+        needed = self.size + n_steps
+        if self.data is None or (self.size == 0 and (self.data.shape[1:] != template.shape[1:] or
+                                                     self.data.device != template.device)):
+            self.data = torch.empty((max(self.capacity, needed),) + tuple(template.shape[1:]),
+                                    dtype=template.dtype, device=template.device)
+        elif needed > self.data.shape[0]:
+            grown = torch.empty((max(2 * self.data.shape[0], needed),) + tuple(self.data.shape[1:]),
+                                dtype=self.data.dtype, device=self.data.device)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+
+    def append(self, step):
+        step = torch.as_tensor(step, dtype=self.dtype).detach()
+        data = self.data
+        if data is None or self.size >= data.shape[0] or step.shape != data.shape[1:] or step.device != data.device:
+            self._reserve(step.unsqueeze(0), 1)
+            data = self.data
+        data[self.size] = step
+        self.size += 1
+
+    def extend(self, steps):
+        """ Appends several steps at once (a [T, N, ...] tensor) """
+        steps = torch.as_tensor(steps, dtype=self.dtype).detach()
+        self._reserve(steps, steps.shape[0])
+        self.data[self.size:self.size + steps.shape[0]] = steps
+        self.size += steps.shape[0]
+
+    def view(self):
+        return self.data[:self.size]
+
+    def clear(self):
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        return self.view()[i]
+
 class ParallelRolloutBuffer:
-    """ Buffer adapted for parallel N-environments or sequential episodes. """
+    """
+    Buffer adapted for parallel N-environments or sequential episodes.
+    Every field is a StepColumn (a preallocated tensor reused across rounds); append() keeps the list interface.
+    """
     def __init__(self):
-        self.states = []
-        self.actions = []
-        self.logprobs = []
-        self.rewards = []
-        self.is_terminals = []
+        self.states = StepColumn()
+        self.actions = StepColumn()
+        self.logprobs = StepColumn()
+        self.rewards = StepColumn(dtype=torch.float64)
+        self.is_terminals = StepColumn(dtype=torch.bool)
+
+    def load(self, states, actions, logprobs, rewards, is_terminals):
+        """ Loads a whole round at once ([T, N, ...] tensors; states may hold T + 1 steps) """
+        self.clear()
+        self.states.extend(states)
+        self.actions.extend(actions)
+        self.logprobs.extend(logprobs)
+        self.rewards.extend(rewards)
+        self.is_terminals.extend(is_terminals)
     
     def clear(self):
-        del self.states[:]
-        del self.actions[:]
-        del self.logprobs[:]
-        del self.rewards[:]
-        del self.is_terminals[:]
+        self.states.clear()
+        self.actions.clear()
+        self.logprobs.clear()
+        self.rewards.clear()
+        self.is_terminals.clear()
+
+    def discounted_returns(self, gamma, bootstrap=None):
+        """
+        Discounted Monte Carlo returns [T, N] (float64), with the discount reset at terminal steps.
+        `bootstrap` is the value of the final state (V(s_T)) when the round is cut by the horizon.
+        Computed over the whole round by segmented_discounted_sum (no Python loop over the steps).
+        """
+        tail = None if bootstrap is None else torch.as_tensor(bootstrap, dtype=torch.float64)
+        returns = segmented_discounted_sum(self.rewards.view().cpu(), self.is_terminals.view().cpu(), gamma, tail=tail)
+        return returns.numpy()
+
+def segmented_discounted_sum(values, dones, discount, tail=None):
+    """
+    Backward discounted sum per environment, y_t = x_t + discount * (1 - done_t) * y_{t+1}, over a whole
+    [T, N] rollout with tensor operations (no Python loop over timesteps): y_t = discount^-t * (R_t - R_e),
+    where R is the reversed cumulative sum of discount^k * x_k and e is the step after the first terminal >= t.
+    `tail` [N] is the value after the last step (bootstrap); it only reaches steps with no terminal until the end.
+    Long rollouts are processed in chunks so that discount^k stays within float64 range.
+    """
+    values = values.to(torch.float64)
+    dones = dones.to(torch.bool)
+    T = values.shape[0]
+    chunk = max(1, int(600.0 / -math.log(discount))) if 0.0 < discount < 1.0 else (1 if discount <= 0.0 else T)
+    if T > chunk:
+        # Chunks from the end backwards: the first value of each chunk is the `tail` of the previous one
+        parts = []
+        for lo in reversed(range(0, T, chunk)):
+            part = segmented_discounted_sum(values[lo:lo + chunk], dones[lo:lo + chunk], discount, tail)
+            parts.append(part)
+            tail = part[0]
+        return torch.cat(parts[::-1])
+
+    steps = torch.arange(T, device=values.device)
+    powers = torch.pow(discount, steps.to(torch.float64)).unsqueeze(-1)
+    suffix = torch.flip(torch.cumsum(torch.flip(values * powers, [0]), dim=0), [0])
+    suffix = torch.cat([suffix, torch.zeros_like(suffix[:1])])
+    # First terminal step in [t, T) (T if there is none)
+    terminal_at = torch.where(dones, steps.unsqueeze(-1), T)
+    segment_end = torch.flip(torch.cummin(torch.flip(terminal_at, [0]), dim=0).values, [0])
+    out = (suffix[:-1] - torch.gather(suffix, 0, (segment_end + 1).clamp(max=T))) / powers
+    if tail is not None:
+        tail_decay = torch.pow(discount, (T - steps).to(torch.float64)).unsqueeze(-1)
+        out = out + (segment_end == T) * tail_decay * tail.to(torch.float64)
+    return out
 
 class ParallelPPOAgent:
     """
@@ -52,13 +184,19 @@ class ParallelPPOAgent:
       Action 1: Expose Quantity Percent -> Mapped from [0, 1] to [0.0, 1.0]
     Supports parallel environments rollout and value baseline estimation.
     """
-    def __init__(self, state_dim=17, action_dim=2, lr_actor=0.0003, lr_critic=0.001, gamma=0.99, K_epochs=30, eps_clip=0.2, batch_size=1024):
+    def __init__(self, state_dim=17, action_dim=2, lr_actor=0.0003, lr_critic=0.001, gamma=0.99, K_epochs=30, eps_clip=0.2, batch_size=1024,
+                 advantage_mode='mc', gae_lambda=0.95):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
         self.gamma = gamma
         self.eps_clip = eps_clip
         self.K_epochs = K_epochs
         self.batch_size = batch_size
+        # Advantage estimation: 'mc' (normalised Monte Carlo returns, the default) or 'gae' (GAE(lambda))
+        if advantage_mode not in ('mc', 'gae'):
+            raise ValueError(f"Unknown advantage_mode: {advantage_mode!r} (expected 'mc' or 'gae')")
+        self.advantage_mode = advantage_mode
+        self.gae_lambda = gae_lambda
         self.action_dim = action_dim
         
         self.buffer = ParallelRolloutBuffer()
@@ -136,48 +274,75 @@ class ParallelPPOAgent:
         
         return action_logprobs, state_values, dist_entropy
 
+    def _gae_targets(self, all_state_values):
+        """
+        GAE(lambda) over the whole [T, N] round using tensor operations only. Rewards are scaled by the
+        reward_scaler standard deviation (fed the discounted returns, as in 'mc' mode); advantages are the
+        gamma * lambda discounted sum of TD errors and the critic target is advantage + V(s).
+        Returns (targets, advantages), both [T, N] float32.
+        """
+        rewards = self.buffer.rewards.view().to(self.device)
+        dones = self.buffer.is_terminals.view().to(self.device)
+        T = rewards.shape[0]
+        values = all_state_values[:T].to(torch.float64)
+        bootstrap = all_state_values[T].to(torch.float64) if len(self.buffer.states) == T + 1 else None
+
+        returns = segmented_discounted_sum(rewards, dones, self.gamma, tail=bootstrap)
+        self.reward_scaler.push_batch(returns.flip(0).reshape(-1).cpu().numpy())
+        scaled_rewards = rewards.to(torch.float64) / float(self.reward_scaler.std + 1e-8)
+
+        # V(s_{t+1}): the final state of the round bootstraps the last step, zero after a terminal step
+        next_values = torch.zeros_like(values)
+        next_values[:-1] = values[1:]
+        if bootstrap is not None:
+            next_values[-1] = bootstrap
+        deltas = scaled_rewards + self.gamma * next_values * (~dones) - values
+        advantages = segmented_discounted_sum(deltas, dones, self.gamma * self.gae_lambda)
+        return (advantages + values).float(), advantages.float()
+
     def update(self):
         # Stack all states over the rollout
-        all_states_tensor = torch.stack(self.buffer.states, dim=0).to(self.device)
+        all_states_tensor = self.buffer.states.view().to(self.device)
         
         with torch.no_grad():
             all_state_values = self.policy_old_critic(all_states_tensor).squeeze(-1) 
             
-        # Discounted returns
-        rewards = []
-        discounted_reward = np.zeros(len(self.buffer.rewards[0]))
-        
-        # Check if we have bootstrapping state
-        if len(self.buffer.states) == len(self.buffer.rewards) + 1:
-            discounted_reward = all_state_values[-1].detach().cpu().numpy()
+        # Critic targets: normalised Monte Carlo returns ('mc' mode, the default) or GAE(lambda)
+        gae_advantages = None
+        if self.advantage_mode == 'gae':
+            rewards_tensor, gae_advantages = self._gae_targets(all_state_values)
+        else:
+            # Discounted returns (bootstrapped from the extra final state when there is one)
+            bootstrap = None
+            if len(self.buffer.states) == len(self.buffer.rewards) + 1:
+                bootstrap = all_state_values[-1].detach().cpu().numpy()
+            returns = self.buffer.discounted_returns(self.gamma, bootstrap)
         
-        for step_t in reversed(range(len(self.buffer.rewards))):
-            reward_t = np.array(self.buffer.rewards[step_t])
-            is_terminal_t = np.array(self.buffer.is_terminals[step_t])
-            
-            discounted_reward[is_terminal_t] = 0.0
-            discounted_reward = reward_t + (self.gamma * discounted_reward)
-            
-            for val in discounted_reward:
-                self.reward_scaler.push(val)
+            # Normalise with the Welford scaler, which is fed the returns from the last step to the first
+            # (one batch of NUM_ENVS values per step)
+            rewards = np.empty_like(returns)
+            for step_t in reversed(range(returns.shape[0])):
+                discounted_reward = returns[step_t]
+                self.reward_scaler.push_batch(discounted_reward)
                 
-            normalized_r = (discounted_reward - self.reward_scaler.mean) / (self.reward_scaler.std + 1e-8)
-            clipped_r = np.clip(normalized_r, -3.0, 3.0)
-            
-            rewards.insert(0, clipped_r)
+                normalized_r = (discounted_reward - self.reward_scaler.mean) / (self.reward_scaler.std + 1e-8)
+                rewards[step_t] = np.clip(normalized_r, -3.0, 3.0)
             
-        rewards_tensor = torch.tensor(np.array(rewards), dtype=torch.float32).to(self.device)
+            rewards_tensor = torch.tensor(rewards, dtype=torch.float32).to(self.device)
 
         T = len(self.buffer.rewards)
-        old_states = all_states_tensor[:T].view(-1, all_states_tensor.size(-1)).detach()
-        old_actions = torch.stack(self.buffer.actions, dim=0).view(-1, self.action_dim).detach()
-        old_logprobs = torch.stack(self.buffer.logprobs, dim=0).view(-1, 1).detach()
+        old_states = all_states_tensor[:T].reshape(-1, all_states_tensor.size(-1)).detach()
+        old_actions = self.buffer.actions.view().to(self.device).reshape(-1, self.action_dim).detach()
+        old_logprobs = self.buffer.logprobs.view().to(self.device).reshape(-1, 1).detach()
         
         rewards_flat = rewards_tensor.view(-1, 1)
         old_state_values_flat = all_state_values[:T].view(-1, 1).detach()
 
         # Advantage computation
-        advantages = rewards_flat - old_state_values_flat
+        if gae_advantages is None:
+            advantages = rewards_flat - old_state_values_flat
+        else:
+            advantages = gae_advantages.view(-1, 1)
         advantages = (advantages - advantages.mean()) / (advantages.std() + 1e-5)
 
         buffer_size = len(old_states)
@@ -236,6 +401,30 @@ class ParallelPPOAgent:
         mean_critic = epoch_critic_loss / num_updates if num_updates > 0 else 0.0
         return mean_total, mean_actor, mean_critic
         
+    def training_state(self):
+        """ Full learner state to resume training: current and old networks, Adam moments and the reward_scaler """
+        return {
+            'policy_actor': self.policy_actor.state_dict(),
+            'policy_critic': self.policy_critic.state_dict(),
+            'policy_old_actor': self.policy_old_actor.state_dict(),
+            'policy_old_critic': self.policy_old_critic.state_dict(),
+            'optimizer_actor': self.optimizer_actor.state_dict(),
+            'optimizer_critic': self.optimizer_critic.state_dict(),
+            'reward_scaler': {'n': self.reward_scaler.n, 'mean': self.reward_scaler.mean, 'S': self.reward_scaler.S},
+        }
+
+    def load_training_state(self, state):
+        """ Restores a state returned by training_state() (networks and optimizers stay on the agent device) """
+        self.policy_actor.load_state_dict(state['policy_actor'])
+        self.policy_critic.load_state_dict(state['policy_critic'])
+        self.policy_old_actor.load_state_dict(state['policy_old_actor'])
+        self.policy_old_critic.load_state_dict(state['policy_old_critic'])
+        self.optimizer_actor.load_state_dict(state['optimizer_actor'])
+        self.optimizer_critic.load_state_dict(state['optimizer_critic'])
+        self.reward_scaler.n = state['reward_scaler']['n']
+        self.reward_scaler.mean = state['reward_scaler']['mean']
+        self.reward_scaler.S = state['reward_scaler']['S']
+
     def save(self, checkpoint_path):
         torch.save(self.policy_old_actor.state_dict(), checkpoint_path + '_actor.pth')
         torch.save(self.policy_old_critic.state_dict(), checkpoint_path + '_critic.pth')
@@ -1,9 +1,32 @@
 import pandas as pd
 import numpy as np
+import copy
 import math
 import os
+import sys
 from sklearn.preprocessing import MinMaxScaler
 
+# Add repository root to path so the shared biology module can be imported
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from biology.maturation import (batches_to_columns, advance_columns, advance_batch,
+                                day_coefficient_cache, QUALITY_SPOILED)
+from biology.batch_store import BatchStore
+from orchestration.dataset_cache import load_dataset
+from biology.rsl_cache import SHARED_RSL_CACHE
+from biology.presets import FRUIT_PRESETS
+
+# Price elasticity of demand per fruit preset
+PRICE_ELASTICITY = {
+    "kiwi_hayward": 1.5,
+    "maca_golden": 1.4,
+    "maca_reineta": 1.3,
+    "maca_gala": 1.6,
+    "maca_fuji": 1.5,
+}
+
 class PricingStockEnvironment:
     """
     OpenAI Gym-style Environment for Pricing and Stock Depletion.
@@ -14,67 +37,13 @@ class PricingStockEnvironment:
       - Quantity Percent to Put on Shelf (0.0 to 1.0 of the current warehouse stock)
     """
     
-    PRESETS = {
-        "kiwi_hayward": {
-            "label": "Kiwi (Hayward)",
-            "Tref_C": 5.0, "Ea_J": 60000.0, "k_firm_ref": 0.06, "alpha_E": 1.8,
-            "beta_RH": 1.2, "RH_ref": 90.0,
-            "dureza_min": 3.0, "dureza_0_default": 45.0,
-            "brix_min": 11.0, "brix_max": 17.0, "brix_g": 0.35, "brix_0_default": 11.0,
-            "qual_firm_threshold": 8.0, "qual_brix_target": 15.0,
-            "E0_int": 0.02, "Eref_prod": 0.12, "E_t0": 10.0, "E_g": 0.9, "E_auto": 0.35,
-            "E_decay": 0.7, "Ea_E_J": 52000.0, "E_ext_shift": 2.0,
-            "elasticity": 1.5
-        },
-        "maca_golden": {
-            "label": "Maçã (Golden)",
-            "Tref_C": 5.0, "Ea_J": 50000.0, "k_firm_ref": 0.025, "alpha_E": 0.8,
-            "beta_RH": 0.8, "RH_ref": 90.0,
-            "dureza_min": 12.0, "dureza_0_default": 72.0,
-            "brix_min": 11.5, "brix_max": 15.5, "brix_g": 0.18, "brix_0_default": 12.0,
-            "qual_firm_threshold": 35.0, "qual_brix_target": 13.5,
-            "E0_int": 0.01, "Eref_prod": 0.1, "E_t0": 18.0, "E_g": 0.6, "E_auto": 0.35,
-            "E_decay": 0.55, "Ea_E_J": 52000.0, "E_ext_shift": 1.8,
-            "elasticity": 1.4
-        },
-        "maca_reineta": {
-            "label": "Maçã (Reineta)",
-            "Tref_C": 5.0, "Ea_J": 52000.0, "k_firm_ref": 0.035, "alpha_E": 1.1,
-            "beta_RH": 1.0, "RH_ref": 90.0,
-            "dureza_min": 10.0, "dureza_0_default": 65.0,
-            "brix_min": 11.0, "brix_max": 14.0, "brix_g": 0.16, "brix_0_default": 11.5,
-            "qual_firm_threshold": 30.0, "qual_brix_target": 12.5,
-            "E0_int": 0.01, "Eref_prod": 0.13, "E_t0": 14.0, "E_g": 0.7, "E_auto": 0.40,
-            "E_decay": 0.6, "Ea_E_J": 52000.0, "E_ext_shift": 2.0,
-            "elasticity": 1.3
-        },
-        "maca_gala": {
-            "label": "Maçã (Gala)",
-            "Tref_C": 5.0, "Ea_J": 48000.0, "k_firm_ref": 0.04, "alpha_E": 1.3,
-            "beta_RH": 0.9, "RH_ref": 90.0,
-            "dureza_min": 9.0, "dureza_0_default": 60.0,
-            "brix_min": 12.5, "brix_max": 17.0, "brix_g": 0.25, "brix_0_default": 13.0,
-            "qual_firm_threshold": 28.0, "qual_brix_target": 14.5,
-            "E0_int": 0.015, "Eref_prod": 0.18, "E_t0": 10.0, "E_g": 0.9, "E_auto": 0.5,
-            "E_decay": 0.65, "Ea_E_J": 52000.0, "E_ext_shift": 2.2,
-            "elasticity": 1.6
-        },
-        "maca_fuji": {
-            "label": "Maçã (Fuji)",
-            "Tref_C": 5.0, "Ea_J": 47000.0, "k_firm_ref": 0.018, "alpha_E": 0.6,
-            "beta_RH": 0.7, "RH_ref": 90.0,
-            "dureza_min": 15.0, "dureza_0_default": 80.0,
-            "brix_min": 13.0, "brix_max": 19.0, "brix_g": 0.15, "brix_0_default": 14.0,
-            "qual_firm_threshold": 40.0, "qual_brix_target": 16.0,
-            "E0_int": 0.008, "Eref_prod": 0.06, "E_t0": 25.0, "E_g": 0.5, "E_auto": 0.25,
-            "E_decay": 0.45, "Ea_E_J": 52000.0, "E_ext_shift": 1.4,
-            "elasticity": 1.5
-        }
-    }
+    # Biological presets shared with the Buyer Agent (biology.presets) plus price elasticity of demand
+    PRESETS = {key: dict(preset, elasticity=PRICE_ELASTICITY[key]) for key, preset in FRUIT_PRESETS.items()}
 
-    def __init__(self, excel_path, is_training=True, train_split=0.6, max_capacity=500):
-        # 1. Load Data
-        self.df = pd.read_excel(excel_path)
+    def __init__(self, excel_path, is_training=True, train_split=0.6, max_capacity=500, data_frame=None):
+        # 1. Load Data (data_frame: an already loaded dataset, e.g. the SharedDataset attached by a PPO
+        # worker; excel_path still identifies the SKU)
+        self.df = data_frame if data_frame is not None else load_dataset(excel_path)
         
         # 2. Train/Test Split
         split_index = int(len(self.df) * train_split)
@@ -86,6 +55,7 @@ class PricingStockEnvironment:
         self.max_steps = len(self.data) - 1
         self.current_step = 0
         self.max_capacity = max_capacity
+        self.refresh_columns()
         
         # Determine SKU key
         excel_name = os.path.basename(excel_path).lower()
@@ -136,9 +106,11 @@ class PricingStockEnvironment:
         self.CUSTO_ARMAZEM_POR_M3 = 0.70  # Cost per m3 of stock per day
         
         # Tracking variables
-        self.active_batches = []
+        self.batches = BatchStore()               # Active batches as columns: quantity, biological state and RSL
         self.stock_profile = [0.0, 0.0, 0.0, 0.0] # [G0, G1, G2, G3]
         self.sales_history = []
+        self.rsl_cache = SHARED_RSL_CACHE         # RSL cache shared by every environment in the process
+        self._coeffs = None                       # Daily kinetic coefficients of the preset (see _day_coeffs)
         
         # MinMaxScaler for normalizing the first 9 absolute dimensions of the state vector
         self.scaler = MinMaxScaler()
@@ -151,149 +123,134 @@ class PricingStockEnvironment:
         self.current_step = 0
         self.sales_history = []
         # Initialize warehouse with 100 boxes of quality 100.0 at day 0
-        self.active_batches = [{
-            'quantity': 100.0,
+        self.batches.clear()
+        self.batches.add(100.0, self._fresh_batch_state())
+        self._refresh_batch_rsls()
+        self._update_stock_profile()
+        return self._get_state()
+
+    @property
+    def active_batches(self):
+        """ Active batches as a list of dicts (FEFO order); the state lives in self.batches """
+        return self.batches.to_dicts()
+
+    @active_batches.setter
+    def active_batches(self, batches):
+        self.batches = BatchStore.from_dicts(batches)
+
+    def _fresh_batch_state(self):
+        return {
             'dureza': float(self.p["dureza_0_default"]),
             'brix': float(self.p["brix_0_default"]),
             'mold': 0.0,
             'E_int': float(self.p.get("E0_int", 0.01)),
             'age': 0.0,
             'quality': 100.0
-        }]
-        self._refresh_batch_rsls()
-        self._update_stock_profile()
-        return self._get_state()
+        }
 
     def advance_batch_one_day(self, batch, T_c, RH_pct, E_ext_ppm):
         """ Maturation model matching standard decay physics """
-        R = 8.314
-        dt = 0.1
-        steps = int(1.0 / dt)
-        
-        T_K = T_c + 273.15
-        Tref_K = self.p["Tref_C"] + 273.15
-        
-        def k_temp_scaling(Ea, T, Tref):
-            return math.exp((-Ea / R) * (1.0 / T - 1.0 / Tref))
-            
-        def sigmoid(x):
-            return 1.0 / (1.0 + math.exp(-x))
-            
-        kT_firm = self.p["k_firm_ref"] * k_temp_scaling(self.p["Ea_J"], T_K, Tref_K)
-        
-        RH_ref = self.p["RH_ref"]
-        RH_deficit = max(0.0, (RH_ref - RH_pct) / 100.0)
-        kRH = 1.0 + self.p["beta_RH"] * RH_deficit
-        
-        Ea_E_J = 52000.0
-        Eref_prod = self.p.get("Eref_prod", 0.08)
-        E_decay = self.p.get("E_decay", 0.7)
-        E_t0 = self.p.get("E_t0", 10.0)
-        E_g = self.p.get("E_g", 0.9)
-        E_auto = self.p.get("E_auto", 0.35)
-        E_ext_shift = self.p.get("E_ext_shift", 2.0)
-        
-        t0_eff = E_t0 - E_ext_shift * math.log1p(max(0.0, E_ext_ppm))
-        prod_T = k_temp_scaling(Ea_E_J, T_K, Tref_K)
-        
-        dureza_min = float(self.p["dureza_min"])
-        alpha_E = float(self.p["alpha_E"])
-        
-        brix_min = float(self.p["brix_min"])
-        brix_max = float(self.p["brix_max"])
-        r0 = float(self.p["brix_g"])
-        alpha_bE = 0.25
-        bRH = max(0.0, (RH_ref - RH_pct) / 100.0)
-        rRH = 1.0 - 0.6 * bRH
-        rT = k_temp_scaling(Ea_E_J, T_K, Tref_K)
-        
-        dureza = batch['dureza']
-        brix = batch['brix']
-        mold = batch['mold']
-        E_int = batch.get('E_int', float(self.p.get("E0_int", 0.01)))
-        age = batch.get('age', 0.0)
-        
-        for _ in range(steps):
-            current_age = age + (_ * dt)
-            ramp = sigmoid(E_g * (current_age - t0_eff))
-            prod = Eref_prod * prod_T * ramp
-            dE = (prod * (1.0 + E_auto * E_int) - E_decay * E_int) * dt
-            E_int = max(0.0, E_int + dE)
-            
-            E_total = E_ext_ppm + E_int
-            kE = 1.0 + alpha_E * E_total
-            k = kT_firm * kRH * kE
-            dD = (-k * (dureza - dureza_min)) * dt
-            dureza = max(dureza_min, dureza + dD)
-            
-            r = r0 * rT * rRH * (1.0 + alpha_bE * E_total)
-            x = max(0.0, brix - brix_min)
-            K = max(1e-6, brix_max - brix_min)
-            db = (r * x * (1.0 - x / K)) * dt
-            brix = min(brix_max, max(brix_min, brix + db))
-            
-        firm_score = 1.0 / (1.0 + math.exp(-0.35 * (dureza - float(self.p["qual_firm_threshold"]))))
-        brix_score = math.exp(-((brix - float(self.p["qual_brix_target"]))**2) / 2.0)
-        quality = 100.0 * (0.65 * firm_score + 0.35 * brix_score)
-        
-        return {
-            'quantity': batch['quantity'],
-            'dureza': dureza,
-            'brix': brix,
-            'mold': mold,
-            'E_int': E_int,
-            'age': age + 1.0,
-            'quality': quality
-        }
+        return advance_batch(self._kinetic_params(), batch, T_c, RH_pct, E_ext_ppm, dt=0.1, with_mold=False,
+                             coeffs=self._day_coeffs())
 
     def project_batch_rsl(self, batch):
-        b = dict(batch)
-        row = self.data.iloc[self.current_step]
-        T_c = row['temperature'] if 'temperature' in row else 18.0
-        RH_pct = row['humidity'] if 'humidity' in row else 72.0
-        E_ext_ppm = row['ethylene'] if 'ethylene' in row else 0.15
-        
-        days_remaining = 0
-        max_projection_days = 60
-        
-        while days_remaining < max_projection_days:
-            if b['quality'] < 30.0:
-                break
-            b = self.advance_batch_one_day(b, T_c, RH_pct, E_ext_ppm)
-            days_remaining += 1
-            
-        return days_remaining
+        return int(self.project_batches_rsl([batch])[0])
+
+    @staticmethod
+    def kinetic_preset(preset):
+        """ Preset as seen by advance_batch_one_day (fixed ethylene Ea, pricing-side defaults) """
+        p = dict(preset)
+        p["Ea_E_J"] = 52000.0
+        p["E_t0"] = preset.get("E_t0", 10.0)
+        p["E_g"] = preset.get("E_g", 0.9)
+        return p
+
+    def _day_coeffs(self):
+        """ Daily coefficients of the kinetic preset, computed once per climate and shared across environments """
+        if self._coeffs is None or self._coeffs_preset is not self.p:
+            self._coeffs = day_coefficient_cache(self.kinetic_preset(self.p), dt=0.1, with_mold=False)
+            self._coeffs_preset = self.p
+        return self._coeffs
+
+    def _kinetic_params(self):
+        return self._day_coeffs().p
+
+    # Dataset columns read during the simulation, with the value used when an optional column is missing
+    DATA_COLUMNS = {
+        'prediction': None,
+        'price': 2.0,
+        'temperature': 18.0,
+        'humidity': 72.0,
+        'ethylene': 0.15,
+    }
+
+    def refresh_columns(self):
+        """
+        Copies the train/test split into contiguous float64 NumPy arrays that the simulation reads
+        instead of self.data.iloc[...]. Must be called again if self.data is modified after construction.
+        """
+        n = len(self.data)
+        self.columns = {}
+        for name, default in self.DATA_COLUMNS.items():
+            if name in self.data.columns:
+                self.columns[name] = np.ascontiguousarray(self.data[name].to_numpy(dtype=np.float64))
+            elif default is not None:
+                self.columns[name] = np.full(n, default, dtype=np.float64)
+
+        # Rolling 15-day price mean and std (window clamped at the start of the split), precomputed
+        # for the state's price z-score so that _get_state runs in constant time
+        window = self.columns['price'][np.maximum(0, np.arange(n)[:, None] - np.arange(15))]
+        self.price_mean_15 = window.mean(axis=1)
+        self.price_std_15 = window.std(axis=1)
+
+    def _current_climate(self):
+        i = self.current_step
+        cols = self.columns
+        return cols['temperature'][i], cols['humidity'][i], cols['ethylene'][i]
+
+    def project_batches_rsl(self, batches):
+        """ Vectorized project_batch_rsl: projects every batch in a single pass """
+        if not batches:
+            return np.zeros(0, dtype=np.int64)
+        return self._project_columns(batches_to_columns(batches, self._kinetic_params()))
+
+    def _project_columns(self, cols):
+        """ RSL of batches already laid out as columns (e.g. slots of self.batches) under today's climate """
+        if len(cols['quality']) == 0:
+            return np.zeros(0, dtype=np.int64)
+        p = self._kinetic_params()
+        T_c, RH_pct, E_ext_ppm = self._current_climate()
+        preset_key = self.rsl_cache.preset_key(self.fruit_key, p, dt=0.1, with_mold=False,
+                                               fingerprint=self._day_coeffs().fingerprint)
+        return self.rsl_cache.project(preset_key, p, cols, T_c, RH_pct, E_ext_ppm, dt=0.1, with_mold=False,
+                                      coeffs=self._day_coeffs())
 
     def _refresh_batch_rsls(self):
-        for b in self.active_batches:
-            if b['quantity'] > 0:
-                b['rsl'] = self.project_batch_rsl(b)
-            else:
-                b['rsl'] = 0
+        slots = self.batches.slots()
+        live = slots[self.batches.cols['quantity'][slots] > 0]
+        self.batches.rsl[slots] = 0
+        self.batches.rsl[live] = self._project_columns(self.batches.columns(live))
 
     def _update_stock_profile(self):
-        self.stock_profile = [0.0, 0.0, 0.0, 0.0]
-        for b in self.active_batches:
-            if b['quantity'] <= 0:
-                continue
-            rsl = b.get('rsl', 0)
-            if rsl >= 4:
-                self.stock_profile[0] += b['quantity']
-            elif rsl == 3:
-                self.stock_profile[1] += b['quantity']
-            elif rsl == 2:
-                self.stock_profile[2] += b['quantity']
-            elif rsl == 1:
-                self.stock_profile[3] += b['quantity']
+        slots = self.batches.live_slots()
+        qty = self.batches.cols['quantity'][slots]
+        rsls = self.batches.rsl[slots]
+        self.stock_profile = [
+            float(qty[rsls >= 4].sum()),
+            float(qty[rsls == 3].sum()),
+            float(qty[rsls == 2].sum()),
+            float(qty[rsls == 1].sum())
+        ]
 
     def _get_state(self):
         """ Returns the 17-dimensional observation state vector """
-        row = self.data.iloc[self.current_step]
-        prediction_today = row['prediction']
-        price_today = row['price'] if 'price' in row else 2.0
+        prediction = self.columns['prediction']
+        prices = self.columns['price']
+        prediction_today = prediction[self.current_step]
+        price_today = prices[self.current_step]
         
         if self.current_step < self.max_steps:
-            prediction_tomorrow = self.data.iloc[self.current_step + 1]['prediction']
+            prediction_tomorrow = prediction[self.current_step + 1]
         else:
             prediction_tomorrow = prediction_today
             
@@ -315,16 +272,12 @@ class PricingStockEnvironment:
             real_t_minus_1,
             real_t_minus_2
         ]
-        scaled_via1 = self.scaler.transform([via1_absolutes])[0]
+        # Same arithmetic as self.scaler.transform (X * scale_ + min_) without sklearn's per-call validation
+        scaled_via1 = np.array(via1_absolutes, dtype=np.float64) * self.scaler.scale_ + self.scaler.min_
         
         # Relative price Z-score over the last 15 days baseline
-        window_prices = []
-        for i in range(15):
-            idx = max(0, self.current_step - i)
-            p = self.data.iloc[idx]['price'] if 'price' in self.data.columns else 2.0
-            window_prices.append(p)
-        media_15dias = np.mean(window_prices)
-        std_15dias = np.std(window_prices)
+        media_15dias = self.price_mean_15[self.current_step]
+        std_15dias = self.price_std_15[self.current_step]
         preco_relativo = (price_today - media_15dias) / (std_15dias + 1e-8)
         preco_relativo_safe = np.clip(preco_relativo, -3.0, 3.0)
         
@@ -346,7 +299,7 @@ class PricingStockEnvironment:
         
         # Forecast error lag
         if self.current_step >= 1:
-            prediction_yesterday = self.data.iloc[self.current_step - 1]['prediction']
+            prediction_yesterday = prediction[self.current_step - 1]
             erro_previsao = (real_t_minus_1 - prediction_yesterday) / (prediction_yesterday + 1e-8)
         else:
             erro_previsao = 0.0
@@ -375,9 +328,8 @@ class PricingStockEnvironment:
         price_mult = np.clip(price_mult, 0.5, 1.5)
         qty_pct = np.clip(qty_pct, 0.0, 1.0)
         
-        row = self.data.iloc[self.current_step]
-        base_price = row['price'] if 'price' in row else 2.0
-        base_demand = row['prediction']
+        base_price = self.columns['price'][self.current_step]
+        base_demand = self.columns['prediction'][self.current_step]
         
         # Refresh RSL cache at step start
         self._refresh_batch_rsls()
@@ -386,25 +338,15 @@ class PricingStockEnvironment:
         elastic_demand = base_demand * (price_mult ** (-self.elasticity))
         
         # 2. Limit sales by shelf-exposure and warehouse stock
-        total_stock_before = sum(b['quantity'] for b in self.active_batches if b['quantity'] > 0)
+        total_stock_before = self.batches.total_quantity()
         max_exposed_qty = total_stock_before * qty_pct
         
         target_sales = min(elastic_demand, max_exposed_qty)
         
         # 3. FEFO Stock consumption
-        self.active_batches.sort(key=lambda b: b.get('rsl', 0))
-        remaining_sales_to_satisfy = target_sales
-        sales_realized = 0.0
-        
-        for b in self.active_batches:
-            if b['quantity'] <= 0:
-                continue
-            take = min(b['quantity'], remaining_sales_to_satisfy)
-            b['quantity'] -= take
-            sales_realized += take
-            remaining_sales_to_satisfy -= take
-            if remaining_sales_to_satisfy <= 0:
-                break
+        slots = self.batches.slots()
+        order = self.batches.sort_fefo(slots, self.batches.rsl[slots])
+        sales_realized, _ = self.batches.consume(order, target_sales)
                 
         # Record sales history
         self.sales_history.append(sales_realized)
@@ -412,37 +354,32 @@ class PricingStockEnvironment:
         # 4. Supply Inflow (Replenishment)
         # Steady supply stream arriving fresh daily
         inflow_qty = base_demand
-        total_stock_after_sales = sum(b['quantity'] for b in self.active_batches if b['quantity'] > 0)
+        total_stock_after_sales = self.batches.total_quantity()
         
         accepted_inflow = min(inflow_qty, self.max_capacity - total_stock_after_sales)
         if accepted_inflow > 0:
-            self.active_batches.append({
-                'quantity': float(accepted_inflow),
-                'dureza': float(self.p["dureza_0_default"]),
-                'brix': float(self.p["brix_0_default"]),
-                'mold': 0.0,
-                'E_int': float(self.p.get("E0_int", 0.01)),
-                'age': 0.0,
-                'quality': 100.0
-            })
+            self.batches.add(float(accepted_inflow), self._fresh_batch_state())
             
         # 5. Biological Aging and Spoilage for all active batches
-        T_c = row['temperature'] if 'temperature' in row else 18.0
-        RH_pct = row['humidity'] if 'humidity' in row else 72.0
-        E_ext_ppm = row['ethylene'] if 'ethylene' in row else 0.15
+        T_c, RH_pct, E_ext_ppm = self._current_climate()
         
         spoilage = 0.0
-        updated_batches = []
-        for b in self.active_batches:
-            if b['quantity'] <= 0:
-                continue
-            b_next = self.advance_batch_one_day(b, T_c, RH_pct, E_ext_ppm)
-            if b_next['quality'] < 30.0:
-                spoilage += b_next['quantity']
-            else:
-                updated_batches.append(b_next)
-                
-        self.active_batches = updated_batches
+        # Sold-out batches free their slot; the rest age together in the vectorized engine (biology.maturation)
+        slots = self.batches.slots()
+        qty = self.batches.cols['quantity']
+        sold_out = qty[slots] <= 0
+        self.batches.remove(slots[sold_out])
+        live = slots[~sold_out]
+        if live.size:
+            p = self._kinetic_params()
+            cols = advance_columns(p, self.batches.columns(live), T_c, RH_pct, E_ext_ppm,
+                                   dt=0.1, with_mold=False, coeffs=self._day_coeffs())
+            self.batches.write(live, cols)
+            spoiled = live[cols['quality'] < QUALITY_SPOILED]
+            spoilage = float(qty[spoiled].sum())
+            self.batches.remove(spoiled)
+            # Aged batches carry no RSL until _refresh_batch_rsls runs at the start of the next step
+            self.batches.rsl[live] = 0
         self._update_stock_profile()
         
         # 6. Financial Calculations & Rewards
@@ -452,7 +389,7 @@ class PricingStockEnvironment:
         revenue = sales_realized * actual_price
         cost_of_sales = sales_realized * cogs
         
-        final_stock = sum(b['quantity'] for b in self.active_batches)
+        final_stock = self.batches.total_quantity()
         volume_stock_final = final_stock * self.product_volume_m3
         storage_cost = volume_stock_final * self.CUSTO_ARMAZEM_POR_M3
         
@@ -486,13 +423,91 @@ class PricingStockEnvironment:
         
         return next_state, reward, done, info
 
+    def evaluate_actions(self, actions):
+        """
+        One-step lookahead for K candidate actions ([K, 2] array of [price_multiplier, quantity_percent]) from
+        the current state, as a single vectorized step and without advancing the environment. Returns a dict of
+        [K] arrays with the 'reward', 'profit', 'sales', 'spoilage' and 'final_stock' that step(action) would
+        report for each candidate (the same arithmetic, up to floating-point rounding).
+
+        Every candidate sells from the same FEFO-ordered batches and all batches age the same way whatever their
+        quantity, so the batches (plus one fresh inflow batch) are aged once and each candidate only differs in
+        how much of every batch is left after its sales.
+        """
+        actions = np.asarray(actions, dtype=np.float64).reshape(-1, 2)
+        price_mult = np.clip(actions[:, 0], 0.5, 1.5)
+        qty_pct = np.clip(actions[:, 1], 0.0, 1.0)
+        
+        base_price = self.columns['price'][self.current_step]
+        base_demand = self.columns['prediction'][self.current_step]
+        
+        # Same RSL refresh as the start of step (it only depends on the current state)
+        self._refresh_batch_rsls()
+        
+        # 1-2. Elastic demand limited by shelf exposure
+        elastic_demand = base_demand * (price_mult ** (-self.elasticity))
+        total_stock_before = self.batches.total_quantity()
+        target_sales = np.minimum(elastic_demand, total_stock_before * qty_pct)
+        
+        # 3. FEFO consumption per candidate: batch i sells min(q_i, demand left after the batches before it)
+        slots = self.batches.slots()
+        order = slots[np.lexsort((self.batches.rank[slots], self.batches.rsl[slots]))]
+        q = np.maximum(self.batches.cols['quantity'][order], 0.0)
+        before = np.cumsum(q) - q
+        take = np.clip(target_sales[:, None] - before[None, :], 0.0, q[None, :])
+        sales = take.sum(axis=1)
+        left = q[None, :] - take
+        stock_after_sales = left.sum(axis=1)
+        
+        # 4. Replenishment
+        accepted_inflow = np.minimum(base_demand, self.max_capacity - stock_after_sales)
+        inflow = np.where(accepted_inflow > 0, accepted_inflow, 0.0)
+        
+        # 5. One day of ageing for the existing batches and a fresh inflow batch
+        T_c, RH_pct, E_ext_ppm = self._current_climate()
+        fresh = self._fresh_batch_state()
+        cols = {name: np.append(col, fresh[name]) for name, col in self.batches.columns(order).items()}
+        aged = advance_columns(self._kinetic_params(), cols, T_c, RH_pct, E_ext_ppm,
+                               dt=0.1, with_mold=False, coeffs=self._day_coeffs())
+        spoiled = aged['quality'] < QUALITY_SPOILED
+        spoilage = left @ spoiled[:-1].astype(np.float64) + inflow * float(spoiled[-1])
+        final_stock = stock_after_sales + inflow - spoilage
+        
+        # 6. Financials and reward, as in step
+        cogs = base_price * 0.60
+        revenue = sales * (base_price * price_mult)
+        cost_of_sales = sales * cogs
+        storage_cost = final_stock * self.product_volume_m3 * self.CUSTO_ARMAZEM_POR_M3
+        daily_profit = revenue - cost_of_sales - storage_cost - spoilage * cogs
+        reward = (daily_profit / 100.0) - 5.0 * ((price_mult - 1.0) ** 2) - 5.0 * ((1.0 - qty_pct) ** 2)
+        
+        return {
+            'reward': reward,
+            'profit': daily_profit,
+            'sales': sales,
+            'spoilage': spoilage,
+            'final_stock': final_stock,
+        }
+
+    def fork(self):
+        """
+        Independent copy of the environment at its current state for lookahead simulations: the dataset columns,
+        presets and caches are shared (read-only during a step) and only the mutable state (batches, stock
+        profile, sales history) is copied, which is much cheaper than a deep copy or rebuilding from the dataset.
+        """
+        env = copy.copy(self)
+        env.batches = self.batches.copy()
+        env.stock_profile = list(self.stock_profile)
+        env.sales_history = list(self.sales_history)
+        return env
+
     def get_checkpoint(self):
         """ Returns a copy of the current state variables to allow for lookahead simulations """
         return {
             'current_step': self.current_step,
             'stock_profile': list(self.stock_profile),
             'sales_history': list(self.sales_history),
-            'active_batches': [dict(b) for b in self.active_batches]
+            'batches': self.batches.snapshot()
         }
 
     def load_checkpoint(self, checkpoint):
@@ -500,4 +515,7 @@ class PricingStockEnvironment:
         self.current_step = checkpoint['current_step']
         self.stock_profile = list(checkpoint['stock_profile'])
         self.sales_history = list(checkpoint['sales_history'])
-        self.active_batches = [dict(b) for b in checkpoint['active_batches']]
+        if 'batches' in checkpoint:
+            self.batches.restore(checkpoint['batches'])
+        else:
+            self.active_batches = checkpoint['active_batches']
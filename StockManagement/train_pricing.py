@@ -1,5 +1,7 @@
 import os
 import sys
+import time
+import argparse
 import torch
 import numpy as np
 import random
@@ -13,6 +15,9 @@ sys.path.append(parent_dir)
 sys.path.append(current_dir)
 
 from environment_pricing import PricingStockEnvironment
+from orchestration.shared_dataset import SharedDataset
+from orchestration.shared_rollout import SharedRollout, SharedWeights
+from orchestration.checkpoints import TRAINING_STATE_SUFFIX, load_training_state, rng_state, save_training_state, set_rng_state
 from agent.ppo_agent import ParallelPPOAgent
 
 # =====================================================================
@@ -35,14 +40,69 @@ GAMMA = 0.8
 K_EPOCHS = 30                
 EPS_CLIP = 0.2               
 BATCH_SIZE = 2048
+ADVANTAGE_MODE = "mc"        # "mc" (Monte Carlo returns) or "gae" (vectorised GAE(lambda))
+GAE_LAMBDA = 0.95            # Only used when ADVANTAGE_MODE = "gae"
 
 SAVE_MODEL_FREQ = 1
 
-def pricing_ppo_worker(worker_id, excel_path, num_envs, capacity, weights_queue, results_queue):
-    """ Worker managing a batch of pricing environments in parallel """
-    # Create sub-environments
+def collect_rollout(envs, actor, rollout, lo, states_matrix):
+    """
+    Collects one round of rollout.horizon steps with the given actor and writes it into the
+    [lo, lo + len(envs)) columns of rollout. Returns (final states, total profit of the round).
+    """
+    device = next(actor.parameters()).device
+    total_profit = 0.0
+    
+    for step in range(rollout.horizon):
+        with torch.no_grad():
+            st_t = torch.FloatTensor(states_matrix).to(device)
+            action_mean, log_std = actor(st_t)
+            dist = torch.distributions.Normal(action_mean, torch.exp(torch.clamp(log_std, -2.3, 1.5)))
+            action_percent = dist.sample()
+            action_logprob = dist.log_prob(action_percent).sum(dim=-1, keepdim=True)
+            
+            # Physical actions mapping
+            # Action 0 (Price): sigmoid maps to [0,1] -> scaled [0.5, 1.5]
+            price_mult = 0.5 + 1.0 * torch.clamp(action_percent[:, 0:1], 0.0, 1.0)
+            # Action 1 (Expose Qty %): clamp [0,1]
+            qty_pct = torch.clamp(action_percent[:, 1:2], 0.0, 1.0)
+            
+            physical_actions = torch.cat([price_mult, qty_pct], dim=-1).cpu().numpy()
+
+        next_states_list = []
+        rewards_list = []
+        dones_list = []
+        profits_list = []
+        
+        for i in range(len(envs)):
+            ns, r, d, info = envs[i].step(physical_actions[i])
+            if d:
+                ns = envs[i].reset()
+            next_states_list.append(ns)
+            rewards_list.append(r)
+            dones_list.append(d)
+            profits_list.append(info['profit'])
+        
+        rollout.write_step(step, lo, st_t.cpu(), action_percent.cpu(), action_logprob.cpu(), rewards_list, dones_list, profits_list)
+        total_profit += np.sum(profits_list)
+        
+        states_matrix = np.array(next_states_list)
+        
+    rollout.write_final_states(lo, torch.FloatTensor(states_matrix))
+    return states_matrix, total_profit
+
+def pricing_ppo_worker(worker_id, excel_path, dataset_spec, num_envs, capacity, weights_queue, results_queue,
+                       rollout, shared_weights):
+    """
+    Worker managing a batch of pricing environments in parallel.
+    Reads the actor weights from shared_weights and writes its rollout in place into the
+    [worker_id * num_envs, ...) columns of rollout; only signals and a summary go through the queues.
+    """
+    lo = worker_id * num_envs
+    # Create sub-environments on top of the dataset published in shared memory by the main process
+    dataset = SharedDataset.attach(dataset_spec)
     envs = [PricingStockEnvironment(excel_path=excel_path, is_training=True, train_split=0.6, 
-                                   max_capacity=capacity) for _ in range(num_envs)]
+                                   max_capacity=capacity, data_frame=dataset.frame) for _ in range(num_envs)]
     
     agent = ParallelPPOAgent(state_dim=17, action_dim=2)
     agent.device = torch.device('cpu') 
@@ -53,66 +113,29 @@ def pricing_ppo_worker(worker_id, excel_path, num_envs, capacity, weights_queue,
     states_matrix = np.array(states)
     
     while True:
-        weights = weights_queue.get()
-        if weights is None: 
+        signal = weights_queue.get()
+        if signal is None: 
             break
         
-        agent.policy_old_actor.load_state_dict(weights['actor'])
-        worker_memory = {
-            'states': [], 'actions': [], 'logprobs': [], 'rewards': [], 'dones': [], 'profits': []
-        }
-        
-        for step in range(HORIZON):
-            with torch.no_grad():
-                st_t = torch.FloatTensor(states_matrix).to('cpu')
-                action_mean, log_std = agent.policy_old_actor(st_t)
-                dist = torch.distributions.Normal(action_mean, torch.exp(torch.clamp(log_std, -2.3, 1.5)))
-                action_percent = dist.sample()
-                action_logprob = dist.log_prob(action_percent).sum(dim=-1, keepdim=True)
-                
-                # Physical actions mapping
-                # Action 0 (Price): sigmoid maps to [0,1] -> scaled [0.5, 1.5]
-                price_mult = 0.5 + 1.0 * torch.clamp(action_percent[:, 0:1], 0.0, 1.0)
-                # Action 1 (Expose Qty %): clamp [0,1]
-                qty_pct = torch.clamp(action_percent[:, 1:2], 0.0, 1.0)
-                
-                physical_actions = torch.cat([price_mult, qty_pct], dim=-1).numpy()
-
-            worker_memory['states'].append(st_t)
-            worker_memory['actions'].append(action_percent)
-            worker_memory['logprobs'].append(action_logprob)
-            
-            next_states_list = []
-            rewards_list = []
-            dones_list = []
-            profits_list = []
-            
-            for i in range(num_envs):
-                ns, r, d, info = envs[i].step(physical_actions[i])
-                if d:
-                    ns = envs[i].reset()
-                next_states_list.append(ns)
-                rewards_list.append(r)
-                dones_list.append(d)
-                profits_list.append(info['profit'])
-            
-            worker_memory['rewards'].append(rewards_list)
-            worker_memory['dones'].append(dones_list)
-            worker_memory['profits'].append(profits_list)
-            
-            states_matrix = np.array(next_states_list)
-            
-        with torch.no_grad():
-            st_final = torch.FloatTensor(states_matrix).to('cpu')
-            worker_memory['states'].append(st_final)
+        shared_weights.load_into(agent.policy_old_actor)
+        states_matrix, total_profit = collect_rollout(envs, agent.policy_old_actor, rollout, lo, states_matrix)
         
         results_queue.put({
             'worker_id': worker_id,
-            'memory': worker_memory,
-            'total_profit': np.sum(worker_memory['profits'])
+            'total_profit': total_profit,
+            'rsl_cache': envs[0].rsl_cache.stats()
         })
 
-def train_sku_seed(sku_name, dataset_path, seed, save_dir="models"):
+    envs = None
+    dataset.close()
+
+def train_sku_seed(sku_name, dataset_path, seed, save_dir="models", resume=False):
+    """
+    Multi-core pricing PPO training of one SKU and seed. After every iteration the full learner state (networks,
+    Adam moments, reward scaler, counters and RNG states) is written to <sku>_seed<seed>_training_state.pt;
+    with resume=True training continues from that file when it exists, losing at most the iteration that was
+    in progress. Episodes that were halfway through are restarted by the workers.
+    """
     # Enforce exact reproducibility seeds
     random.seed(seed)
     np.random.seed(seed)
@@ -132,70 +155,77 @@ def train_sku_seed(sku_name, dataset_path, seed, save_dir="models"):
         gamma=GAMMA,
         K_epochs=K_EPOCHS,
         eps_clip=EPS_CLIP,
-        batch_size=BATCH_SIZE
+        batch_size=BATCH_SIZE,
+        advantage_mode=ADVANTAGE_MODE,
+        gae_lambda=GAE_LAMBDA
     )
     
     checkpoint_dir = os.path.join(current_dir, save_dir)
     os.makedirs(checkpoint_dir, exist_ok=True)
     checkpoint_path = os.path.join(checkpoint_dir, f"{sku_name}_seed{seed}")
+    state_path = checkpoint_path + TRAINING_STATE_SUFFIX
+    resume_state = None
+    if resume and os.path.exists(state_path):
+        resume_state = load_training_state(state_path)
+        # max_episodes may change (extending a run); the other hyperparameters should match
+        changed = {k: v for k, v in resume_state['config'].items() if k != 'max_episodes' and training_config().get(k) != v}
+        if changed:
+            print(f"[AVISO] Hiperparâmetros diferentes dos do treino interrompido: {changed}")
+        agent.load_training_state(resume_state['agent'])
+        print(f"[OK] A retomar o treino de {state_path}: {resume_state['episodes_played']} episódios já jogados")
+    elif resume:
+        print(f"[AVISO] Sem estado de treino em {state_path}: a começar do zero")
+    
+    # Publish the dataset once in shared memory; workers attach to it instead of re-reading the Excel file
+    dataset = SharedDataset.publish(dataset_path)
     
     # Establish multiprocessing queues
     weights_queues = [mp.Queue() for _ in range(NUM_WORKERS)]
     results_queue = mp.Queue()
     
+    # Rollouts and actor weights live in shared memory; the queues only carry signals
+    rollout = SharedRollout(HORIZON, ENVS_PER_WORKER * NUM_WORKERS, state_dim=17, action_dim=2)
+    shared_weights = SharedWeights(agent.policy_old_actor)
+    
     processes = []
     for i in range(NUM_WORKERS):
         p = mp.Process(
             target=pricing_ppo_worker, 
-            args=(i, dataset_path, ENVS_PER_WORKER, MAX_CAPACITY, weights_queues[i], results_queue)
+            args=(i, dataset_path, dataset.spec, ENVS_PER_WORKER, MAX_CAPACITY, weights_queues[i], results_queue,
+                  rollout, shared_weights)
         )
         p.start()
         processes.append(p)
         
     episodes_played = 0
     iteration = 0
+    if resume_state is not None:
+        iteration = resume_state['iteration']
+        episodes_played = resume_state['episodes_played']
+        set_rng_state(resume_state['rng'])
     
     try:
         while episodes_played < MAX_EPISODES_TOTAL:
             iteration += 1
-            current_weights = {
-                'actor': {k: v.cpu() for k, v in agent.policy_old_actor.state_dict().items()}
-            }
+            version = shared_weights.publish(agent.policy_old_actor)
             for q in weights_queues:
-                q.put(current_weights)
+                q.put(version)
             
             all_worker_data = []
             for _ in range(NUM_WORKERS):
                 all_worker_data.append(results_queue.get())
             
-            T = len(all_worker_data[0]['memory']['rewards'])
-            
-            for t in range(T):
-                step_states = torch.cat([res['memory']['states'][t] for res in all_worker_data], dim=0).to(agent.device)
-                step_actions = torch.cat([res['memory']['actions'][t] for res in all_worker_data], dim=0).to(agent.device)
-                step_logprobs = torch.cat([res['memory']['logprobs'][t] for res in all_worker_data], dim=0).to(agent.device)
-                step_rewards = []
-                step_dones = []
-                for res in all_worker_data:
-                    step_rewards.extend(res['memory']['rewards'][t])
-                    step_dones.extend(res['memory']['dones'][t])
-                
-                agent.buffer.states.append(step_states)
-                agent.buffer.actions.append(step_actions)
-                agent.buffer.logprobs.append(step_logprobs)
-                agent.buffer.rewards.append(step_rewards)
-                agent.buffer.is_terminals.append(step_dones)
-                
-            if len(all_worker_data[0]['memory']['states']) > T:
-                final_states = torch.cat([res['memory']['states'][T] for res in all_worker_data], dim=0).to(agent.device)
-                agent.buffer.states.append(final_states)
+            rollout.fill_buffer(agent.buffer, agent.device)
             
             loss_t, loss_a, loss_c = agent.update()
             episodes_played += NUM_ENVS
             
             # Imprime e salva os pesos a cada iteração (corresponde a cada 64 episódios)
             avg_profit = np.mean([res['total_profit'] / ENVS_PER_WORKER for res in all_worker_data])
-            print(f"Episódios: {episodes_played}/{MAX_EPISODES_TOTAL} | Média Lucro Batch: {avg_profit:.2f}€ | Loss Total: {loss_t:.4f}")
+            cache_hits = sum(res['rsl_cache']['hits'] for res in all_worker_data)
+            cache_misses = sum(res['rsl_cache']['misses'] for res in all_worker_data)
+            cache_hit_rate = cache_hits / max(1, cache_hits + cache_misses)
+            print(f"Episódios: {episodes_played}/{MAX_EPISODES_TOTAL} | Média Lucro Batch: {avg_profit:.2f}€ | Loss Total: {loss_t:.4f} | RSL cache hit rate: {cache_hit_rate:.1%}")
             
             # Guardar checkpoint histórico individual (ex: 3_080_seed42_ep64)
             checkpoint_path_ep = f"{checkpoint_path}_ep{episodes_played}"
@@ -203,6 +233,15 @@ def train_sku_seed(sku_name, dataset_path, seed, save_dir="models"):
             
             # Atualizar também o modelo mais recente sob o nome padrão para o Django
             agent.save(checkpoint_path)
+            
+            # Full learner state for --resume
+            save_training_state(state_path, {
+                'iteration': iteration,
+                'episodes_played': episodes_played,
+                'config': training_config(),
+                'agent': agent.training_state(),
+                'rng': rng_state(),
+            })
                 
     except KeyboardInterrupt:
         print("[AVISO] Treino interrompido pelo utilizador.")
@@ -212,11 +251,90 @@ def train_sku_seed(sku_name, dataset_path, seed, save_dir="models"):
             q.put(None)
         for p in processes: 
             p.join()
+        dataset.close()
+        dataset.unlink()
             
         agent.save(checkpoint_path)
         print(f"[OK] Modelo do SKU {sku_name} com seed {seed} salvo em: {checkpoint_path}")
 
+def training_config(overrides=None):
+    """ Training hyperparameters (the module constants) with `overrides` applied on top """
+    config = {
+        'num_envs': NUM_ENVS, 'max_episodes': MAX_EPISODES_TOTAL, 'horizon': HORIZON, 'max_capacity': MAX_CAPACITY,
+        'lr_actor': LR_ACTOR, 'lr_critic': LR_CRITIC, 'gamma': GAMMA, 'k_epochs': K_EPOCHS, 'eps_clip': EPS_CLIP,
+        'batch_size': BATCH_SIZE, 'advantage_mode': ADVANTAGE_MODE, 'gae_lambda': GAE_LAMBDA,
+    }
+    unknown = set(overrides or {}) - set(config)
+    if unknown:
+        raise ValueError(f"Unknown hyperparameters: {sorted(unknown)} (valid: {sorted(config)})")
+    config.update(overrides or {})
+    return config
+
+def train_single_process(seed, dataset_path, save_dir, data_frame=None, hparams=None, log=print, sku_name="custom_sku"):
+    """
+    Full pricing PPO training in a single process (learner and all environments), used by the training
+    scheduler (orchestration/training_scheduler.py) to run several trainings side by side, one per core, instead
+    of a worker pool per training. `hparams` overrides the module constants (see training_config).
+    Saves the final model as <save_dir>/<sku_name>_seed<seed> and returns a training summary.
+    """
+    config = training_config(hparams)
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    
+    num_envs = config['num_envs']
+    envs = [PricingStockEnvironment(excel_path=dataset_path, is_training=True, train_split=0.6,
+                                    max_capacity=config['max_capacity'], data_frame=data_frame) for _ in range(num_envs)]
+    agent = ParallelPPOAgent(
+        state_dim=17,
+        action_dim=2,
+        lr_actor=config['lr_actor'],
+        lr_critic=config['lr_critic'],
+        gamma=config['gamma'],
+        K_epochs=config['k_epochs'],
+        eps_clip=config['eps_clip'],
+        batch_size=config['batch_size'],
+        advantage_mode=config['advantage_mode'],
+        gae_lambda=config['gae_lambda']
+    )
+    rollout = SharedRollout(config['horizon'], num_envs, state_dim=17, action_dim=2)
+    os.makedirs(save_dir, exist_ok=True)
+    checkpoint_path = os.path.join(save_dir, f"{sku_name}_seed{seed}")
+    
+    states_matrix = np.array([env.reset() for env in envs])
+    episodes_played = 0
+    profits = []
+    losses = []
+    start_time = time.perf_counter()
+    while episodes_played < config['max_episodes']:
+        states_matrix, total_profit = collect_rollout(envs, agent.policy_old_actor, rollout, 0, states_matrix)
+        rollout.fill_buffer(agent.buffer, agent.device)
+        losses.append(agent.update())
+        
+        episodes_played += num_envs
+        profits.append(float(total_profit / num_envs))
+        log(f"Episódios: {episodes_played}/{config['max_episodes']} | Média Lucro Batch: {profits[-1]:.2f}€ | Loss Total: {losses[-1][0]:.4f}")
+    elapsed = time.perf_counter() - start_time
+    
+    agent.save(checkpoint_path)
+    return {
+        'episodes': episodes_played,
+        'iterations': len(profits),
+        'elapsed_s': elapsed,
+        'episodes_per_sec': episodes_played / max(elapsed, 1e-9),
+        'final_avg_profit': profits[-1] if profits else None,
+        'best_avg_profit': max(profits) if profits else None,
+        'final_loss': losses[-1][0] if losses else None,
+        'model_path': checkpoint_path,
+        'config': config,
+    }
+
 def main():
+    parser = argparse.ArgumentParser(description="Multi-core pricing PPO training (seeds 42 and 1337) for the dataset in EXCEL_PATH")
+    parser.add_argument('--resume', action='store_true',
+                        help="resume every seed from its last training state in the models folder")
+    args = parser.parse_args()
+    
     # Enforce spawn start method for safe PyTorch CUDA/CPU multiprocessing on Windows
     try:
         mp.set_start_method('spawn', force=True)
@@ -244,7 +362,7 @@ def main():
         
     seeds = [42, 1337]
     for seed in seeds:
-        train_sku_seed(sku_name, EXCEL_PATH, seed)
+        train_sku_seed(sku_name, EXCEL_PATH, seed, resume=args.resume)
 
 if __name__ == "__main__":
     main()
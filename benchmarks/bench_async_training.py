@@ -0,0 +1,66 @@
+"""
+Benchmark: episódios por segundo do treino PPO (BuyerAgent/0_training_constrained.py) no modo síncrono
+(MAX_POLICY_LAG = 0) e com sobreposição atores/learner (MAX_POLICY_LAG > 0).
+
+Corre train_multi_core numa configuração reduzida, dentro de uma pasta temporária (modelos e logs do
+TensorBoard não ficam no repositório), e mostra o débito de cada modo face ao síncrono.
+
+    python benchmarks/bench_async_training.py [--lags 0 1 2] [--workers 4] [--envs-per-worker 8]
+                                              [--horizon 90] [--iterations 6] [--k-epochs 30]
+"""
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, 'BuyerAgent'), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+training = importlib.import_module('0_training_constrained')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dataset', default=os.path.join(ROOT, 'BuyerAgent', 'datasets', '911753_151dias_com_real.xlsx'))
+    parser.add_argument('--lags', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--envs-per-worker', type=int, default=8)
+    parser.add_argument('--horizon', type=int, default=90)
+    parser.add_argument('--iterations', type=int, default=6)
+    parser.add_argument('--k-epochs', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1337)
+    args = parser.parse_args()
+
+    # Os workers (spawn) reimportam o módulo de treino: só as constantes lidas pelo learner podem ser alteradas aqui
+    training.EXCEL_PATH = os.path.abspath(args.dataset)
+    training.NUM_WORKERS = args.workers
+    training.ENVS_PER_WORKER = args.envs_per_worker
+    training.NUM_ENVS = args.workers * args.envs_per_worker
+    training.HORIZON = args.horizon
+    training.K_EPOCHS = args.k_epochs
+    training.MAX_EPISODES_TOTAL = args.iterations * training.NUM_ENVS
+
+    results = {}
+    cwd = os.getcwd()
+    for lag in args.lags:
+        training.MAX_POLICY_LAG = lag
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                results[lag] = training.train_multi_core(seed=args.seed)
+            finally:
+                os.chdir(cwd)
+
+    baseline = results.get(0)
+    print(f"{training.NUM_ENVS} ambientes em {args.workers} workers | {args.iterations} iterações de {args.horizon} passos | K_EPOCHS={args.k_epochs}")
+    for lag, eps in results.items():
+        mode = "síncrono" if lag == 0 else f"assíncrono (lag máx. {lag})"
+        ratio = f"  ({eps / baseline:.2f}x)" if baseline else ""
+        print(f"  {mode:<26} {eps:8.2f} episódios/s{ratio}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Microbenchmark: tempo médio de _get_state() e step() dos dois ambientes no dataset 3_252.
+
+Mede também o VecStockEnvironment: tempo por ambiente-passo ao avançar N ambientes numa só chamada.
+
+    python benchmarks/bench_env_step.py [--states 2000] [--steps 1500] [--vec-envs 16]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for sub in ('BuyerAgent', 'StockManagement'):
+    path = os.path.join(ROOT, sub)
+    if path not in sys.path:
+        sys.path.append(path)
+
+from environment_constrained import StockEnvironment, VecStockEnvironment
+from environment_pricing import PricingStockEnvironment
+
+
+def bench(env, sample_action, n_states, n_steps):
+    """ Devolve (µs por _get_state, µs por step) """
+    env.reset()
+    start = time.perf_counter()
+    for _ in range(n_states):
+        env._get_state()
+    t_state = (time.perf_counter() - start) / n_states
+
+    rng = np.random.default_rng(0)
+    env.reset()
+    steps = 0
+    start = time.perf_counter()
+    while steps < n_steps:
+        _, _, done, _ = env.step(sample_action(rng))
+        steps += 1
+        if done:
+            env.reset()
+    t_step = (time.perf_counter() - start) / steps
+    return t_state * 1e6, t_step * 1e6
+
+
+def bench_vec(vec_env, n_steps):
+    """ Devolve µs por ambiente-passo """
+    rng = np.random.default_rng(0)
+    vec_env.reset()
+    n_calls = max(1, n_steps // vec_env.num_envs)
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        vec_env.step(rng.uniform(0, vec_env.max_order_limit, size=vec_env.num_envs))
+    return (time.perf_counter() - start) / (n_calls * vec_env.num_envs) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--states', type=int, default=2000)
+    parser.add_argument('--steps', type=int, default=1500)
+    parser.add_argument('--vec-envs', type=int, default=16)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        buyer = StockEnvironment(os.path.join(ROOT, 'BuyerAgent', 'datasets', 'm5_foods_3_252.xlsx'))
+        pricing = PricingStockEnvironment(os.path.join(ROOT, 'StockManagement', 'datasets', 'm5_foods_3_252.xlsx'))
+        vec = VecStockEnvironment(os.path.join(ROOT, 'BuyerAgent', 'datasets', 'm5_foods_3_252.xlsx'), args.vec_envs)
+
+    t_state, t_step = bench(buyer, lambda rng: rng.uniform(0, buyer.max_order_limit), args.states, args.steps)
+    print(f"StockEnvironment        _get_state {t_state:7.1f} µs   step {t_step:7.1f} µs")
+    t_state, t_step = bench(pricing, lambda rng: [rng.uniform(0.5, 1.5), rng.uniform(0.1, 1.0)],
+                            args.states, args.steps)
+    print(f"PricingStockEnvironment _get_state {t_state:7.1f} µs   step {t_step:7.1f} µs")
+    t_vec = bench_vec(vec, args.steps * args.vec_envs)
+    print(f"VecStockEnvironment x{args.vec_envs:<3} step {t_vec:7.1f} µs por ambiente")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Microbenchmark: RunningStat.push() elemento a elemento vs push_batch() (combinação de Chan et al.).
+
+Reproduz a normalização dos retornos em ParallelPPOAgent.update() (um lote de NUM_ENVS retornos por passo,
+do último para o primeiro) e a estatística de lucro do VecStockEnvironment (EnvRunningStat com as médias e
+desvios-padrão intermédios). Mostra o tempo de cada caminho e a maior diferença entre os dois.
+
+    python benchmarks/bench_running_stat.py [--steps 90] [--envs 64] [--rounds 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'BuyerAgent'))
+
+from agent.ppo_agent import RunningStat
+from environment_constrained import EnvRunningStat
+
+
+def rel_diff(a, b):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    return float(np.max(np.abs(a - b) / np.maximum(np.abs(b), 1e-12)))
+
+
+def normalize_returns(returns, stat, batched):
+    """ Mesmo ciclo que ParallelPPOAgent.update(); devolve (segundos, retornos normalizados) """
+    out = np.empty_like(returns)
+    start = time.perf_counter()
+    for t in reversed(range(returns.shape[0])):
+        if batched:
+            stat.push_batch(returns[t])
+        else:
+            for val in returns[t]:
+                stat.push(val)
+        out[t] = np.clip((returns[t] - stat.mean) / (stat.std + 1e-8), -3.0, 3.0)
+    return time.perf_counter() - start, out
+
+
+def running_profit_stats(profits, stat, batched):
+    """ Média/desvio-padrão vistos por cada ambiente, como no passo do VecStockEnvironment """
+    means, stds = np.empty_like(profits), np.empty_like(profits)
+    start = time.perf_counter()
+    for t in range(profits.shape[0]):
+        if batched:
+            means[t], stds[t] = stat.push_batch(profits[t], return_running=True)
+        else:
+            for i, profit in enumerate(profits[t].tolist()):
+                stat.push(profit)
+                means[t, i], stds[t, i] = stat.mean, stat.std
+    return time.perf_counter() - start, means, stds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--steps', type=int, default=90)
+    parser.add_argument('--envs', type=int, default=64)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    seq_stat, batch_stat = RunningStat(), RunningStat()
+    t_seq = t_batch = 0.0
+    worst = 0.0
+    for _ in range(args.rounds):
+        returns = rng.normal(2.0, 5.0, size=(args.steps, args.envs)).cumsum(axis=0)
+        dt, out_seq = normalize_returns(returns, seq_stat, batched=False)
+        t_seq += dt
+        dt, out_batch = normalize_returns(returns, batch_stat, batched=True)
+        t_batch += dt
+        worst = max(worst, float(np.max(np.abs(out_batch - out_seq))))
+    print(f"RunningStat    ({args.rounds} x {args.steps} x {args.envs} retornos)")
+    print(f"  push:       {t_seq * 1e3 / args.rounds:8.2f} ms por update")
+    print(f"  push_batch: {t_batch * 1e3 / args.rounds:8.2f} ms por update  (speed-up {t_seq / t_batch:.1f}x)")
+    print(f"  maior diferença: retornos normalizados {worst:.1e} (absoluta), "
+          f"média {rel_diff(batch_stat.mean, seq_stat.mean):.1e}, desvio-padrão {rel_diff(batch_stat.std, seq_stat.std):.1e} (relativas)")
+
+    profits = rng.normal(150.0, 80.0, size=(args.rounds * args.steps, args.envs))
+    seq_env, batch_env = EnvRunningStat(), EnvRunningStat()
+    t_seq, m_seq, s_seq = running_profit_stats(profits, seq_env, batched=False)
+    t_batch, m_batch, s_batch = running_profit_stats(profits, batch_env, batched=True)
+    print(f"EnvRunningStat ({profits.shape[0]} passos x {args.envs} ambientes)")
+    print(f"  push:       {t_seq * 1e6 / profits.shape[0]:8.1f} µs por passo")
+    print(f"  push_batch: {t_batch * 1e6 / profits.shape[0]:8.1f} µs por passo  (speed-up {t_seq / t_batch:.1f}x)")
+    print(f"  maior diferença relativa: médias {rel_diff(m_batch, m_seq):.1e}, desvios-padrão {rel_diff(s_batch, s_seq):.1e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+# Shared fruit maturation kinetics (BuyerAgent, StockManagement, dashboard)
+from biology.maturation import (advance_batch, advance_columns, batch_quality, project_batch_rsl,
+                                project_rsl_columns, MAX_PROJECTION_DAYS, QUALITY_SPOILED)
+from biology.presets import FRUIT_PRESETS, preset_key_for_name
@@ -0,0 +1,219 @@
+import numpy as np
+
+from biology.maturation import STATE_FIELDS
+
+# Colunas guardadas por lote: quantidade + estado biológico
+FIELDS = ('quantity',) + STATE_FIELDS
+
+
+class BatchStore:
+    """
+    Lotes ativos de um armazém em colunas NumPy pré-alocadas (struct-of-arrays).
+    Cada lote ocupa um slot; os slots livres ficam marcados na máscara `used` e são reutilizados
+    por novas chegadas. `rank` guarda a posição FEFO de cada lote no último dia, servindo de desempate
+    estável entre lotes com o mesmo RSL (a mesma ordem que a antiga lista ordenada de dicts).
+    `owner` indica o ambiente a que o lote pertence quando vários armazéns partilham o mesmo store
+    (VecStockEnvironment); num ambiente simples é sempre 0.
+    """
+
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self.cols = {name: np.zeros(capacity, dtype=np.float64) for name in FIELDS}
+        self.rsl = np.zeros(capacity, dtype=np.int64)
+        self.rank = np.zeros(capacity, dtype=np.int64)
+        self.owner = np.zeros(capacity, dtype=np.int64)
+        self.used = np.zeros(capacity, dtype=bool)
+        self._free = list(range(capacity - 1, -1, -1))
+        self._next_rank = 0
+
+    def __len__(self):
+        return self.capacity - len(self._free)
+
+    def clear(self):
+        self.used[:] = False
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self._next_rank = 0
+
+    def _grow(self):
+        old = self.capacity
+        self.capacity = old * 2
+        for name in FIELDS:
+            self.cols[name] = np.concatenate([self.cols[name], np.zeros(old)])
+        self.rsl = np.concatenate([self.rsl, np.zeros(old, dtype=np.int64)])
+        self.rank = np.concatenate([self.rank, np.zeros(old, dtype=np.int64)])
+        self.owner = np.concatenate([self.owner, np.zeros(old, dtype=np.int64)])
+        self.used = np.concatenate([self.used, np.zeros(old, dtype=bool)])
+        self._free = list(range(self.capacity - 1, old - 1, -1)) + self._free
+
+    def add(self, quantity, state, owner=0):
+        """ Insere um lote (quantidade + dict de estado) no fim da ordem FEFO atual e devolve o slot """
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self.cols['quantity'][slot] = quantity
+        for name in STATE_FIELDS:
+            self.cols[name][slot] = state[name]
+        self.rsl[slot] = 0
+        self.rank[slot] = self._next_rank
+        self._next_rank += 1
+        self.owner[slot] = owner
+        self.used[slot] = True
+        return slot
+
+    def add_many(self, quantities, state, owners):
+        """ Versão vetorizada de add: um lote com o mesmo estado inicial por cada owner, pela ordem dada """
+        owners = np.asarray(owners, dtype=np.int64)
+        n = owners.size
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        while len(self._free) < n:
+            self._grow()
+        slots = np.array(self._free[-n:][::-1], dtype=np.int64)
+        del self._free[-n:]
+        self.cols['quantity'][slots] = quantities
+        for name in STATE_FIELDS:
+            self.cols[name][slots] = state[name]
+        self.rsl[slots] = 0
+        self.rank[slots] = self._next_rank + np.arange(n)
+        self._next_rank += n
+        self.owner[slots] = owners
+        self.used[slots] = True
+        return slots
+
+    def remove(self, slots):
+        """ Liberta os slots indicados (vendidos na totalidade ou deteriorados) """
+        slots = np.asarray(slots, dtype=np.int64)
+        if slots.size:
+            self.used[slots] = False
+            self._free.extend(slots.tolist())
+
+    def slots(self):
+        """ Slots ocupados, pela ordem FEFO do último dia (novas chegadas no fim) """
+        idx = np.flatnonzero(self.used)
+        return idx[np.argsort(self.rank[idx], kind='stable')]
+
+    def live_slots(self):
+        """ Slots ocupados com quantidade positiva, pela ordem FEFO """
+        idx = self.slots()
+        return idx[self.cols['quantity'][idx] > 0]
+
+    def columns(self, slots):
+        """ Colunas de estado (cópias) dos slots indicados, no formato de biology.maturation """
+        return {name: self.cols[name][slots] for name in STATE_FIELDS}
+
+    def write(self, slots, cols):
+        for name in STATE_FIELDS:
+            self.cols[name][slots] = cols[name]
+
+    def total_quantity(self):
+        q = self.cols['quantity'][self.used]
+        return float(q[q > 0].sum())
+
+    def total_quantity_by_owner(self, n_owners):
+        """ Quantidade em stock (lotes com quantidade positiva) de cada owner """
+        idx = np.flatnonzero(self.used)
+        q = self.cols['quantity'][idx]
+        return np.bincount(self.owner[idx], weights=np.where(q > 0, q, 0.0), minlength=n_owners)
+
+    def sort_fefo(self, slots, rsls):
+        """
+        Ordena os slots por RSL crescente (desempate pela ordem anterior), guarda o RSL de cada lote
+        e atualiza `rank` para que a ordem persista até ao próximo dia. Devolve os slots ordenados,
+        agrupados por owner quando o store tem lotes de vários ambientes.
+        """
+        rsls = np.asarray(rsls, dtype=np.int64)
+        order = np.lexsort((self.rank[slots], rsls, self.owner[slots]))
+        ordered = slots[order]
+        self.rsl[ordered] = rsls[order]
+        self.rank[ordered] = np.arange(ordered.size)
+        self._next_rank = ordered.size
+        return ordered
+
+    def consume(self, ordered_slots, demand):
+        """
+        Vende `demand` unidades pelos slots indicados (já em ordem FEFO).
+        Só percorre os lotes efetivamente consumidos. Devolve (vendido, procura por satisfazer).
+        """
+        qty = self.cols['quantity']
+        remaining = demand
+        sold = 0
+        for slot in ordered_slots.tolist():
+            q = float(qty[slot])
+            if q <= 0:
+                continue
+            take = min(q, remaining)
+            qty[slot] = q - take
+            sold += take
+            remaining -= take
+            if remaining <= 0:
+                break
+        return sold, remaining
+
+    def consume_by_owner(self, ordered_slots, demand):
+        """
+        Versão vetorizada de consume para vários owners de uma vez: `ordered_slots` vem de sort_fefo
+        (agrupado por owner) e `demand` tem a procura de cada owner. Cada lote vende
+        min(quantidade, procura ainda por satisfazer antes dele), o mesmo que o ciclo sequencial
+        (idêntico bit a bit com quantidades inteiras). Devolve (vendido, procura por satisfazer) por owner.
+        """
+        demand = np.asarray(demand, dtype=np.float64)
+        sold = np.zeros(demand.size)
+        if ordered_slots.size:
+            qty = self.cols['quantity']
+            q = np.maximum(qty[ordered_slots], 0.0)
+            owners = self.owner[ordered_slots]
+            before = np.cumsum(q) - q
+            first = np.r_[True, owners[1:] != owners[:-1]]
+            before -= before[first][np.cumsum(first) - 1]
+            take = np.clip(demand[owners] - before, 0.0, q)
+            qty[ordered_slots] -= take
+            sold = np.bincount(owners, weights=take, minlength=demand.size)
+        return sold, demand - sold
+
+    def to_dicts(self):
+        """ Lotes como lista de dicts (ordem FEFO), para leitura e compatibilidade """
+        slots = self.slots()
+        fields = {name: self.cols[name][slots].tolist() for name in FIELDS}
+        return [{name: fields[name][i] for name in FIELDS} for i in range(slots.size)]
+
+    @classmethod
+    def from_dicts(cls, batches, capacity=32):
+        store = cls(max(capacity, len(batches)))
+        for b in batches:
+            slot = store.add(b['quantity'], b)
+            store.rsl[slot] = b.get('rsl', 0)
+        return store
+
+    def copy(self):
+        """ Store independente com o mesmo conteúdo (uma cópia de cada array), para bifurcar um ambiente """
+        store = BatchStore.__new__(BatchStore)
+        store.capacity = self.capacity
+        store.cols = {name: col.copy() for name, col in self.cols.items()}
+        store.rsl = self.rsl.copy()
+        store.rank = self.rank.copy()
+        store.owner = self.owner.copy()
+        store.used = self.used.copy()
+        store._free = list(self._free)
+        store._next_rank = self._next_rank
+        return store
+
+    def snapshot(self):
+        """ Cópia do estado (arrays) para checkpoints """
+        return {
+            'cols': {name: col.copy() for name, col in self.cols.items()},
+            'rsl': self.rsl.copy(),
+            'rank': self.rank.copy(),
+            'owner': self.owner.copy(),
+            'used': self.used.copy(),
+            'next_rank': self._next_rank,
+        }
+
+    def restore(self, snapshot):
+        self.cols = {name: col.copy() for name, col in snapshot['cols'].items()}
+        self.rsl = snapshot['rsl'].copy()
+        self.rank = snapshot['rank'].copy()
+        self.used = snapshot['used'].copy()
+        self.capacity = self.used.size
+        self.owner = snapshot['owner'].copy() if 'owner' in snapshot else np.zeros(self.capacity, dtype=np.int64)
+        self._free = np.flatnonzero(~self.used)[::-1].tolist()
+        self._next_rank = snapshot['next_rank']
@@ -0,0 +1,424 @@
+import hashlib
+import json
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+R_GAS = 8.314
+QUALITY_SPOILED = 30.0
+MAX_PROJECTION_DAYS = 60
+
+# Campos de estado biológico de um lote (a quantidade não entra na cinética)
+STATE_FIELDS = ('dureza', 'brix', 'mold', 'E_int', 'age', 'quality')
+
+
+def _k_temp_scaling(Ea, T_K, Tref_K):
+    return math.exp((-Ea / R_GAS) * (1.0 / T_K - 1.0 / Tref_K))
+
+
+def preset_fingerprint(p):
+    """ Impressão digital estável dos coeficientes de um preset (muda quando o lifecycle_presets muda) """
+    payload = json.dumps(p, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def batches_to_columns(batches, p):
+    """ Converte uma lista de lotes (dicts) em colunas NumPy, uma por campo de estado """
+    E0_int = float(p.get("E0_int", 0.01))
+    return {
+        'dureza': np.array([b['dureza'] for b in batches], dtype=np.float64),
+        'brix': np.array([b['brix'] for b in batches], dtype=np.float64),
+        'mold': np.array([b['mold'] for b in batches], dtype=np.float64),
+        'E_int': np.array([b.get('E_int', E0_int) for b in batches], dtype=np.float64),
+        'age': np.array([b.get('age', 0.0) for b in batches], dtype=np.float64),
+        'quality': np.array([b.get('quality', 100.0) for b in batches], dtype=np.float64),
+    }
+
+
+def _day_coefficients(p, T_c, RH_pct, E_ext_ppm, dt, with_mold):
+    """ Coeficientes escalares de um dia de clima constante (iguais para todos os lotes) """
+    T_K = T_c + 273.15
+    Tref_K = p["Tref_C"] + 273.15
+
+    kT_firm = p["k_firm_ref"] * _k_temp_scaling(p["Ea_J"], T_K, Tref_K)
+
+    RH_ref = p["RH_ref"]
+    RH_deficit = max(0.0, (RH_ref - RH_pct) / 100.0)
+    kRH = 1.0 + p["beta_RH"] * RH_deficit
+
+    Ea_E_J = float(p.get("Ea_E_J", 52000.0))
+    Eref_prod = float(p.get("Eref_prod", 0.08))
+    E_t0 = float(p.get("E_t0", 15.0))
+    E_ext_shift = float(p.get("E_ext_shift", 2.0))
+
+    t0_eff = E_t0 - E_ext_shift * math.log1p(max(0.0, E_ext_ppm))
+    prod_T = _k_temp_scaling(Ea_E_J, T_K, Tref_K)
+
+    brix_min = float(p["brix_min"])
+    brix_max = float(p["brix_max"])
+    bRH = max(0.0, (RH_ref - RH_pct) / 100.0)
+    rRH = 1.0 - 0.6 * bRH
+    rT = _k_temp_scaling(Ea_E_J, T_K, Tref_K)
+
+    mold_rate = 0.0
+    if with_mold:
+        mold_T = _k_temp_scaling(float(p["Ea_mold_J"]), T_K, Tref_K)
+        RH_excess = max(0.0, (RH_pct - float(p["RH_mold_thr"])) / 100.0)
+        RH_factor = 1.0 - math.exp(-float(p["mold_sens_RH"]) * RH_excess)
+        mold_rate = float(p["mold_rate_ref"]) * mold_T * RH_factor
+
+    steps = int(1.0 / dt)
+    k_scale = kT_firm * kRH
+    r_scale = float(p["brix_g"]) * rT * rRH
+    alpha_E = float(p["alpha_E"])
+    alpha_bE = 0.25
+    K = max(1e-6, brix_max - brix_min)
+    return {
+        'dt': dt,
+        'steps': steps,
+        'offsets': np.arange(steps, dtype=np.float64)[:, None] * dt,
+        'E_ext': E_ext_ppm,
+        't0_eff': t0_eff,
+        'E_g': float(p.get("E_g", 0.8)),
+        'E_auto': float(p.get("E_auto", 0.35)),
+        'E_decay': float(p.get("E_decay", 0.7)),
+        # Produtos agrupados pela mesma ordem de avaliação da versão escalar
+        'prod_scale': Eref_prod * prod_T,
+        'k_scale': k_scale,
+        'r_scale': r_scale,
+        'alpha_E': alpha_E,
+        'alpha_bE': alpha_bE,
+        # Taxas lineares no etileno total (E_ext + E_int), já multiplicadas por dt (núcleo NumPy)
+        'kc0': k_scale * (1.0 + alpha_E * E_ext_ppm) * dt,
+        'kc1': k_scale * alpha_E * dt,
+        'rc0': r_scale * (1.0 + alpha_bE * E_ext_ppm) * dt,
+        'rc1': r_scale * alpha_bE * dt,
+        'dureza_min': float(p["dureza_min"]),
+        'brix_min': brix_min,
+        'brix_max': brix_max,
+        'K': K,
+        'inv_K': 1.0 / K,
+        'with_mold': with_mold,
+        'mold_rate': mold_rate,
+        'mold_max_penalty': float(p["mold_max_penalty"]) if with_mold else 0.0,
+        'qual_firm_threshold': float(p["qual_firm_threshold"]),
+        'qual_brix_target': float(p["qual_brix_target"]),
+        # Produção de etileno por sub-passo (prod_scale * rampa) por idade inteira, preenchida a pedido
+        'prod_by_age': {},
+    }
+
+
+def _prod_ramp(c, age):
+    """
+    prod_scale * rampa de produção de etileno em cada sub-passo do dia, para um lote com esta idade.
+    As idades dos lotes avançam de 1 em 1 dia, pelo que o resultado é guardado nos coeficientes do dia
+    e reutilizado por todos os lotes (e dias de projeção) com a mesma idade.
+    """
+    prod = c['prod_by_age'].get(age)
+    if prod is None:
+        dt = c['dt']
+        E_g = c['E_g']
+        t0_eff = c['t0_eff']
+        prod_scale = c['prod_scale']
+        exp = math.exp
+        prod = [prod_scale * (1.0 / (1.0 + exp(-(E_g * ((age + i * dt) - t0_eff))))) for i in range(c['steps'])]
+        if age == int(age):
+            c['prod_by_age'][age] = prod
+    return prod
+
+
+class DayCoefficientCache:
+    """
+    Coeficientes diários de um preset (fatores de Arrhenius, humidade e leituras do preset),
+    calculados uma vez por clima (T, HR, etileno externo) e reutilizados por todos os lotes,
+    por todos os dias de projeção de RSL e por todos os ambientes do processo que usam o mesmo preset.
+    """
+
+    def __init__(self, p, dt=0.05, with_mold=True, max_entries=4096):
+        self.p = p
+        self.dt = dt
+        self.with_mold = with_mold
+        self.fingerprint = preset_fingerprint(p)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, T_c, RH_pct, E_ext_ppm):
+        key = (float(T_c), float(RH_pct), float(E_ext_ppm))
+        c = self._entries.get(key)
+        if c is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return c
+
+        self.misses += 1
+        c = _day_coefficients(self.p, key[0], key[1], key[2], self.dt, self.with_mold)
+        self._entries[key] = c
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return c
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._entries),
+        }
+
+
+_COEFFICIENT_CACHES = {}
+
+
+def day_coefficient_cache(p, dt=0.05, with_mold=True):
+    """ Cache de coeficientes diários partilhada por todos os utilizadores do mesmo preset no processo """
+    key = (preset_fingerprint(p), dt, with_mold)
+    cache = _COEFFICIENT_CACHES.get(key)
+    if cache is None:
+        cache = DayCoefficientCache(dict(p), dt=dt, with_mold=with_mold)
+        _COEFFICIENT_CACHES[key] = cache
+    return cache
+
+
+def _coefficients_for(p, T_c, RH_pct, E_ext_ppm, dt, with_mold, coeffs):
+    if coeffs is not None:
+        return coeffs.get(T_c, RH_pct, E_ext_ppm)
+    return _day_coefficients(p, T_c, RH_pct, E_ext_ppm, dt, with_mold)
+
+
+# Abaixo deste número de lotes o custo fixo de cada operação NumPy domina e o laço escalar é mais rápido
+VECTOR_MIN_BATCHES = 16
+
+
+def _quality_py(c, dureza, brix, mold):
+    firm_score = 1.0 / (1.0 + math.exp(-0.35 * (dureza - c['qual_firm_threshold'])))
+    brix_score = math.exp(-((brix - c['qual_brix_target']) ** 2) / 2.0)
+    quality = 100.0 * (0.65 * firm_score + 0.35 * brix_score)
+    if c['with_mold']:
+        quality = quality * (1.0 - c['mold_max_penalty'] * mold)
+    return quality
+
+
+def _integrate_one_py(c, dureza, brix, mold, E_int, age):
+    """ Integrador de Euler para um único lote (floats); mesma ordem de operações do código original """
+    dt = c['dt']
+    E_auto = c['E_auto']
+    E_decay = c['E_decay']
+    E_ext = c['E_ext']
+    k_scale = c['k_scale']
+    alpha_E = c['alpha_E']
+    r_scale = c['r_scale']
+    alpha_bE = c['alpha_bE']
+    dureza_min = c['dureza_min']
+    brix_min = c['brix_min']
+    brix_max = c['brix_max']
+    K = c['K']
+    mold_rate = c['mold_rate']
+
+    for prod in _prod_ramp(c, age):
+        dE = (prod * (1.0 + E_auto * E_int) - E_decay * E_int) * dt
+        E_int = max(0.0, E_int + dE)
+
+        E_total = E_ext + E_int
+
+        k = k_scale * (1.0 + alpha_E * E_total)
+        dD = (-k * (dureza - dureza_min)) * dt
+        dureza = max(dureza_min, dureza + dD)
+
+        r = r_scale * (1.0 + alpha_bE * E_total)
+        x = max(0.0, brix - brix_min)
+        db = (r * x * (1.0 - x / K)) * dt
+        brix = min(brix_max, max(brix_min, brix + db))
+
+        if mold_rate != 0.0:
+            dm = (mold_rate * (1.0 - mold)) * dt
+            mold = min(1.0, max(0.0, mold + dm))
+
+    return dureza, brix, mold, E_int, age + 1.0, _quality_py(c, dureza, brix, mold)
+
+
+def _integrate_day_np(c, dureza, brix, mold, E_int, age):
+    """
+    Integrador de Euler vetorizado sobre arrays de lotes.
+    As equações estão rearranjadas para reduzir o número de operações por sub-passo
+    (ex.: E' = A*E + B, com A e B pré-calculados para todos os sub-passos),
+    pelo que os resultados diferem da versão escalar apenas por arredondamento (< 1e-9 relativo).
+    """
+    dt = c['dt']
+    E_ext = c['E_ext']
+    dureza_min = c['dureza_min']
+    brix_min = c['brix_min']
+    K = c['K']
+    inv_K = c['inv_K']
+    mold_rate = c['mold_rate']
+
+    # A rampa de produção de etileno só depende da idade: calculada para todos os sub-passos de uma vez
+    ramp = 1.0 / (1.0 + np.exp(-(c['E_g'] * ((age + c['offsets']) - c['t0_eff']))))
+    prod = c['prod_scale'] * ramp
+    A = 1.0 + (prod * c['E_auto'] - c['E_decay']) * dt
+    B = prod * dt
+
+    kc0 = c['kc0']
+    kc1 = c['kc1']
+    rc0 = c['rc0']
+    rc1 = c['rc1']
+
+    # Trabalha-se com as distâncias aos mínimos (u = dureza - min, x = brix - min)
+    u = np.maximum(0.0, dureza - dureza_min)
+    x = np.minimum(K, np.maximum(0.0, brix - brix_min))
+
+    for i in range(c['steps']):
+        E_int = np.maximum(0.0, A[i] * E_int + B[i])
+        u = np.maximum(0.0, u * (1.0 - kc0 - kc1 * E_int))
+        x = np.minimum(K, np.maximum(0.0, x + (rc0 + rc1 * E_int) * x * (1.0 - x * inv_K)))
+
+        # Com taxa nula (HR abaixo do limiar) o bolor não se altera
+        if mold_rate != 0.0:
+            mold = np.minimum(1.0, np.maximum(0.0, mold + (mold_rate * (1.0 - mold)) * dt))
+
+    dureza = u + dureza_min
+    brix = x + brix_min
+
+    firm_score = 1.0 / (1.0 + np.exp(-0.35 * (dureza - c['qual_firm_threshold'])))
+    brix_score = np.exp(-((brix - c['qual_brix_target']) ** 2) / 2.0)
+    quality = 100.0 * (0.65 * firm_score + 0.35 * brix_score)
+
+    if c['with_mold']:
+        quality = quality * (1.0 - c['mold_max_penalty'] * mold)
+
+    return dureza, brix, mold, E_int, age + 1.0, quality
+
+
+def _integrate_day(c, dureza, brix, mold, E_int, age):
+    """ Avança 1 dia um conjunto de lotes (arrays), escolhendo o núcleo adequado ao tamanho """
+    n = len(dureza)
+    if n >= VECTOR_MIN_BATCHES:
+        return _integrate_day_np(c, dureza, brix, mold, E_int, age)
+
+    out = [_integrate_one_py(c, *s) for s in zip(dureza.tolist(), brix.tolist(), mold.tolist(),
+                                                  E_int.tolist(), age.tolist())]
+    if not out:
+        empty = np.zeros(0, dtype=np.float64)
+        return empty, empty, empty, empty, empty, empty
+    cols = np.array(out, dtype=np.float64).T
+    return cols[0], cols[1], cols[2], cols[3], cols[4], cols[5]
+
+
+def advance_columns(p, cols, T_c, RH_pct, E_ext_ppm, dt=0.05, with_mold=True, coeffs=None):
+    """
+    Avança 1 dia a maturação de todos os lotes em simultâneo.
+    `cols` contém arrays do mesmo tamanho (um elemento por lote). Devolve um novo dict de colunas.
+    Com poucos lotes usa o laço escalar (idêntico a `advance_batch_one_day`); a partir de
+    VECTOR_MIN_BATCHES usa o núcleo NumPy, cujas diferenças ficam abaixo de 1e-9 em termos relativos.
+    `coeffs` (DayCoefficientCache do preset) evita recalcular os coeficientes de um clima já visto.
+    """
+    c = _coefficients_for(p, T_c, RH_pct, E_ext_ppm, dt, with_mold, coeffs)
+    dureza, brix, mold, E_int, age, quality = _integrate_day(
+        c, cols['dureza'], cols['brix'], cols['mold'], cols['E_int'], cols['age'])
+    return {
+        'dureza': dureza,
+        'brix': brix,
+        'mold': mold,
+        'E_int': E_int,
+        'age': age,
+        'quality': quality
+    }
+
+
+def project_rsl_columns(p, cols, T_c, RH_pct, E_ext_ppm, dt=0.05, with_mold=True,
+                        max_days=MAX_PROJECTION_DAYS, threshold=QUALITY_SPOILED, coeffs=None):
+    """
+    Projeta o RSL (dias até a qualidade cair abaixo do limiar) de todos os lotes de uma vez,
+    com clima constante. Os lotes já expirados saem do cálculo em cada dia.
+    """
+    n = len(cols['quality'])
+    days = np.zeros(n, dtype=np.int64)
+    idx = np.flatnonzero(cols['quality'] >= threshold)
+    if idx.size == 0:
+        return days
+
+    c = _coefficients_for(p, T_c, RH_pct, E_ext_ppm, dt, with_mold, coeffs)
+
+    if idx.size < VECTOR_MIN_BATCHES:
+        for j in idx.tolist():
+            state = (float(cols['dureza'][j]), float(cols['brix'][j]), float(cols['mold'][j]),
+                     float(cols['E_int'][j]), float(cols['age'][j]))
+            d = 0
+            while d < max_days:
+                *state, quality = _integrate_one_py(c, *state)
+                d += 1
+                if quality < threshold:
+                    break
+            days[j] = d
+        return days
+
+    dureza = cols['dureza'][idx]
+    brix = cols['brix'][idx]
+    mold = cols['mold'][idx]
+    E_int = cols['E_int'][idx]
+    age = cols['age'][idx]
+
+    for _ in range(max_days):
+        dureza, brix, mold, E_int, age, quality = _integrate_day_np(c, dureza, brix, mold, E_int, age)
+        days[idx] += 1
+        alive = quality >= threshold
+        if not alive.all():
+            idx = idx[alive]
+            if idx.size == 0:
+                break
+            dureza, brix, mold, E_int, age = dureza[alive], brix[alive], mold[alive], E_int[alive], age[alive]
+
+    return days
+
+
+def columns_to_batches(cols, quantities):
+    """ Inverso de batches_to_columns: reconstrói os dicts de lote (com a quantidade de cada um) """
+    fields = [cols[name].tolist() for name in STATE_FIELDS]
+    return [
+        {'quantity': qty, 'dureza': d, 'brix': b, 'mold': m, 'E_int': e, 'age': a, 'quality': q}
+        for qty, d, b, m, e, a, q in zip(quantities, *fields)
+    ]
+
+
+# --- API escalar (um lote de cada vez), usada pelos ambientes e pelo serviço LC do dashboard ---
+
+def batch_quality(p, dureza, brix, mold=0.0, with_mold=True):
+    """ Qualidade (0-100) de um estado de maturação """
+    firm_score = 1.0 / (1.0 + math.exp(-0.35 * (dureza - float(p["qual_firm_threshold"]))))
+    brix_score = math.exp(-((brix - float(p["qual_brix_target"])) ** 2) / 2.0)
+    quality = 100.0 * (0.65 * firm_score + 0.35 * brix_score)
+    if with_mold:
+        quality = quality * (1.0 - float(p["mold_max_penalty"]) * mold)
+    return quality
+
+
+def advance_batch(p, batch, T_c, RH_pct, E_ext_ppm, dt=0.05, with_mold=True, coeffs=None):
+    """ Avança 1 dia a maturação de um único lote (dict) e devolve o lote resultante """
+    c = _coefficients_for(p, T_c, RH_pct, E_ext_ppm, dt, with_mold, coeffs)
+    dureza, brix, mold, E_int, age, quality = _integrate_one_py(
+        c, float(batch['dureza']), float(batch['brix']), float(batch['mold']),
+        float(batch.get('E_int', p.get("E0_int", 0.01))), float(batch.get('age', 0.0)))
+    new_batch = {'quantity': batch['quantity']} if 'quantity' in batch else {}
+    new_batch.update({
+        'dureza': dureza,
+        'brix': brix,
+        'mold': mold,
+        'E_int': E_int,
+        'age': age,
+        'quality': quality
+    })
+    return new_batch
+
+
+def project_batch_rsl(p, batch, T_c, RH_pct, E_ext_ppm, dt=0.05, with_mold=True,
+                      max_days=MAX_PROJECTION_DAYS, threshold=QUALITY_SPOILED, coeffs=None):
+    """ RSL (dias) de um único lote com clima constante """
+    cols = batches_to_columns([batch], p)
+    return int(project_rsl_columns(p, cols, T_c, RH_pct, E_ext_ppm, dt=dt, with_mold=with_mold,
+                                   max_days=max_days, threshold=threshold, coeffs=coeffs)[0])
@@ -0,0 +1,83 @@
+# Presets biológicos por fruta retirados de FruitModel2.ipynb
+# Fonte única para os ambientes de RL (BuyerAgent, StockManagement) e para o serviço LC do dashboard
+FRUIT_PRESETS = {
+    "kiwi_hayward": {
+        "label": "Kiwi (Hayward)",
+        "Tref_C": 5.0, "Ea_J": 60000.0, "k_firm_ref": 0.06, "alpha_E": 1.8,
+        "beta_RH": 1.2, "RH_ref": 90.0,
+        "dureza_min": 3.0, "dureza_0_default": 45.0,
+        "brix_min": 11.0, "brix_max": 17.0, "brix_g": 0.35, "brix_0_default": 11.0,
+        "qual_firm_threshold": 8.0, "qual_brix_target": 15.0,
+        "E0_int": 0.02, "Eref_prod": 0.12, "E_t0": 10.0, "E_g": 0.9, "E_auto": 0.35,
+        "E_decay": 0.7, "Ea_E_J": 52000.0, "E_ext_shift": 2.0,
+        "RH_mold_thr": 95.0, "mold_rate_ref": 0.05, "mold_sens_RH": 9.0,
+        "mold_max_penalty": 0.65, "Ea_mold_J": 43000.0
+    },
+    "maca_golden": {
+        "label": "Maçã (Golden)",
+        "Tref_C": 5.0, "Ea_J": 50000.0, "k_firm_ref": 0.025, "alpha_E": 0.8,
+        "beta_RH": 0.8, "RH_ref": 90.0,
+        "dureza_min": 12.0, "dureza_0_default": 72.0,
+        "brix_min": 11.5, "brix_max": 15.5, "brix_g": 0.18, "brix_0_default": 12.0,
+        "qual_firm_threshold": 35.0, "qual_brix_target": 13.5,
+        "E0_int": 0.01, "Eref_prod": 0.1, "E_t0": 18.0, "E_g": 0.6, "E_auto": 0.35,
+        "E_decay": 0.55, "Ea_E_J": 52000.0, "E_ext_shift": 1.8,
+        "RH_mold_thr": 95.0, "mold_rate_ref": 0.04, "mold_sens_RH": 8.0,
+        "mold_max_penalty": 0.60, "Ea_mold_J": 42000.0
+    },
+    "maca_reineta": {
+        "label": "Maçã (Reineta)",
+        "Tref_C": 5.0, "Ea_J": 52000.0, "k_firm_ref": 0.035, "alpha_E": 1.1,
+        "beta_RH": 1.0, "RH_ref": 90.0,
+        "dureza_min": 10.0, "dureza_0_default": 65.0,
+        "brix_min": 11.0, "brix_max": 14.0, "brix_g": 0.16, "brix_0_default": 11.5,
+        "qual_firm_threshold": 30.0, "qual_brix_target": 12.5,
+        "E0_int": 0.01, "Eref_prod": 0.13, "E_t0": 14.0, "E_g": 0.7, "E_auto": 0.40,
+        "E_decay": 0.6, "Ea_E_J": 52000.0, "E_ext_shift": 2.0,
+        "RH_mold_thr": 95.0, "mold_rate_ref": 0.05, "mold_sens_RH": 9.0,
+        "mold_max_penalty": 0.65, "Ea_mold_J": 43000.0
+    },
+    "maca_gala": {
+        "label": "Maçã (Gala)",
+        "Tref_C": 5.0, "Ea_J": 48000.0, "k_firm_ref": 0.04, "alpha_E": 1.3,
+        "beta_RH": 0.9, "RH_ref": 90.0,
+        "dureza_min": 9.0, "dureza_0_default": 60.0,
+        "brix_min": 12.5, "brix_max": 17.0, "brix_g": 0.25, "brix_0_default": 13.0,
+        "qual_firm_threshold": 28.0, "qual_brix_target": 14.5,
+        "E0_int": 0.015, "Eref_prod": 0.18, "E_t0": 10.0, "E_g": 0.9, "E_auto": 0.5,
+        "E_decay": 0.65, "Ea_E_J": 52000.0, "E_ext_shift": 2.2,
+        "RH_mold_thr": 95.0, "mold_rate_ref": 0.05, "mold_sens_RH": 9.0,
+        "mold_max_penalty": 0.65, "Ea_mold_J": 43000.0
+    },
+    "maca_fuji": {
+        "label": "Maçã (Fuji)",
+        "Tref_C": 5.0, "Ea_J": 47000.0, "k_firm_ref": 0.018, "alpha_E": 0.6,
+        "beta_RH": 0.7, "RH_ref": 90.0,
+        "dureza_min": 15.0, "dureza_0_default": 80.0,
+        "brix_min": 13.0, "brix_max": 19.0, "brix_g": 0.15, "brix_0_default": 14.0,
+        "qual_firm_threshold": 40.0, "qual_brix_target": 16.0,
+        "E0_int": 0.008, "Eref_prod": 0.06, "E_t0": 25.0, "E_g": 0.5, "E_auto": 0.25,
+        "E_decay": 0.45, "Ea_E_J": 52000.0, "E_ext_shift": 1.4,
+        "RH_mold_thr": 95.0, "mold_rate_ref": 0.035, "mold_sens_RH": 8.0,
+        "mold_max_penalty": 0.55, "Ea_mold_J": 42000.0
+    }
+}
+
+
+# Termos (PT/EN) que identificam cada preset no nome de uma cultura/subfamília
+_NAME_TERMS = (
+    ("kiwi_hayward", ("kiwi", "hayward")),
+    ("maca_golden", ("golden", "gold")),
+    ("maca_fuji", ("fuji",)),
+    ("maca_reineta", ("reineta",)),
+    ("maca_gala", ("gala", "maca", "maçã", "maça", "apple")),
+)
+
+
+def preset_key_for_name(name):
+    """ Devolve a chave do preset a partir do nome de uma cultura (ex.: "Gala (Maçã)"), ou None """
+    name_lower = (name or "").lower()
+    for key, terms in _NAME_TERMS:
+        if any(term in name_lower for term in terms):
+            return key
+    return None
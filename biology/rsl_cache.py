@@ -0,0 +1,111 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from biology.maturation import preset_fingerprint, project_rsl_columns, MAX_PROJECTION_DAYS
+
+# Passo de quantização por campo: estados que caem na mesma célula partilham o RSL projetado.
+# Os passos estão muito abaixo da variação diária de cada variável, pelo que não alteram o RSL inteiro.
+DEFAULT_QUANTA = {
+    'dureza': 1e-4,
+    'brix': 1e-4,
+    'mold': 1e-5,
+    'E_int': 1e-5,
+    'age': 1e-3,
+    'climate': 1e-3,
+}
+
+
+class RSLCache:
+    """
+    Cache LRU de RSL projetado, indexada por (preset, estado quantizado do lote, clima do dia).
+    Partilhada por todos os ambientes do mesmo processo: como o estado de um lote só depende do
+    dia de chegada e do clima, os ambientes de um worker PPO acabam por projetar os mesmos lotes.
+    """
+
+    def __init__(self, max_entries=100000, quanta=None):
+        self.max_entries = max_entries
+        self.quanta = dict(DEFAULT_QUANTA)
+        if quanta:
+            self.quanta.update(quanta)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def preset_key(self, fruit_key, p, dt, with_mold, fingerprint=None):
+        return (fruit_key, fingerprint or preset_fingerprint(p), dt, with_mold)
+
+    def make_keys(self, preset_key, cols, T_c, RH_pct, E_ext_ppm):
+        q = self.quanta
+        qc = q['climate']
+        climate = (round(float(T_c) / qc), round(float(RH_pct) / qc), round(float(E_ext_ppm) / qc))
+        fields = [np.rint(cols[name] / q[name]).astype(np.int64).tolist()
+                  for name in ('dureza', 'brix', 'mold', 'E_int', 'age')]
+        return [(preset_key, state, climate) for state in zip(*fields)]
+
+    def get(self, key):
+        rsl = self._entries.get(key)
+        if rsl is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return rsl
+
+    def put(self, key, rsl):
+        self._entries[key] = int(rsl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def project(self, preset_key, p, cols, T_c, RH_pct, E_ext_ppm, dt=0.05, with_mold=True,
+                max_days=MAX_PROJECTION_DAYS, coeffs=None):
+        """ Igual a project_rsl_columns, mas só projeta os lotes que ainda não estão em cache """
+        keys = self.make_keys(preset_key, cols, T_c, RH_pct, E_ext_ppm)
+        rsls = np.zeros(len(keys), dtype=np.int64)
+        missing = []
+        for i, key in enumerate(keys):
+            rsl = self.get(key)
+            if rsl is None:
+                missing.append(i)
+            else:
+                rsls[i] = rsl
+
+        if missing:
+            idx = np.array(missing, dtype=np.int64)
+            sub_cols = {name: col[idx] for name, col in cols.items()}
+            projected = project_rsl_columns(p, sub_cols, T_c, RH_pct, E_ext_ppm, dt=dt,
+                                            with_mold=with_mold, max_days=max_days, coeffs=coeffs)
+            rsls[idx] = projected
+            for i, rsl in zip(missing, projected.tolist()):
+                self.put(keys[i], rsl)
+
+        return rsls
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._entries),
+            'evictions': self.evictions,
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        self._entries.clear()
+        self.reset_stats()
+
+
+# Instância partilhada por todos os ambientes do processo (um por worker PPO)
+SHARED_RSL_CACHE = RSLCache()
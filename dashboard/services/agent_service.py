@@ -8,7 +8,7 @@ import numpy as np
 import pandas as pd
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Sum, Avg, Max
+from django.db.models import Sum, Avg, Max, Count, StdDev
 from django.contrib.auth.models import User
 from dashboard.models import ProductSubFamily, HistoricalSalesData, DemandForecast, MarketplaceOrder, ConsolidatedStock, Warehouse, TrainedModel
 from sklearn.neural_network import MLPRegressor
@@ -166,7 +166,19 @@ def get_buyer_agent_state(user, subfamily, max_capacity=500):
             default_price = 2.5
         price_today = default_price
         
-    preco_relativo_safe = 0.0 # Sem variância no live
+    # Z-score do preço face à janela de 15 dias do histórico de vendas (mesma feature do ambiente),
+    # calculado com uma única agregação em vez de ler os dias um a um
+    price_window = HistoricalSalesData.objects.filter(
+        owner=user,
+        culture=subfamily,
+        date__gt=today - datetime.timedelta(days=15),
+        date__lte=today
+    ).aggregate(mean=Avg('price_per_kg'), std=StdDev('price_per_kg'), days=Count('id'))
+    
+    preco_relativo_safe = 0.0 # Sem histórico de preços no live
+    if price_window['days'] and price_window['std'] is not None:
+        preco_relativo = (price_today - float(price_window['mean'])) / (float(price_window['std']) + 1e-8)
+        preco_relativo_safe = float(np.clip(preco_relativo, -3.0, 3.0))
     
     # Componentes de Calendário
     day_of_week = today.weekday() + 1
@@ -346,134 +358,98 @@ def run_sales_inference(user, subfamily, horizon_days=30):
 
 def train_buyer_agent_optimizer_generator(user, subfamily, df_market_data, max_episodes="640"):
     """
-    Treina o PPO chamando o script '0_training_constrained.py' como um subprocesso
-    e fazendo yield de cada linha de log em tempo real.
+    Treina o PPO no próprio processo (BuyerAgent/training.py) a partir do DataFrame em memória,
+    fazendo yield de cada linha de progresso em tempo real, e guarda os pesos na base de dados como BLOB.
     """
-    import subprocess
-    
-    # 1. Salvar os dados de treino num ficheiro Excel temporário dentro de BuyerAgent/Dados
-    buyer_agent_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'BuyerAgent')
-    dados_dir = os.path.join(buyer_agent_dir, 'Dados')
-    os.makedirs(dados_dir, exist_ok=True)
+    import queue
+    import threading
+    from django.db import connection
+    
+    # training.py importa o `agent` de topo: garantir que é o do BuyerAgent e não o do StockManagement
+    # (get_stock_recommendations e a simulação de preços recarregam-no a partir de StockManagement/agent)
+    if buyer_agent_dir in sys.path:
+        sys.path.remove(buyer_agent_dir)
+    sys.path.insert(0, buyer_agent_dir)
+    for mod in ['BuyerAgent.training', 'agent.ppo_agent', 'agent.actor_critic', 'agent']:
+        if mod in sys.modules:
+            del sys.modules[mod]
     
-    temp_filename = f"temp_market_user_{user.id}_cult_{subfamily.pk}.xlsx"
-    temp_excel_path = os.path.join(dados_dir, temp_filename)
+    from BuyerAgent.training import train_buyer_agent
     
-    # Renomear as colunas para o formato esperado pelo ambiente
-    df_save = df_market_data.copy()
+    # 1. Renomear as colunas para o formato esperado pelo ambiente
     rename_dict = {
         'sales_quantity_kg': 'real_value',
         'price_per_kg': 'price',
         'date': 'day'
     }
-    df_save = df_save.rename(columns=rename_dict)
+    df_train = df_market_data.rename(columns=rename_dict)
     
     # Adicionar colunas default se estiverem em falta
-    if 'real_value' not in df_save.columns:
-        df_save['real_value'] = 100.0
-    if 'price' not in df_save.columns:
-        df_save['price'] = 2.0
-    if 'volume' not in df_save.columns:
-        df_save['volume'] = 0.002
-        
-    df_save.to_excel(temp_excel_path, index=False)
+    if 'real_value' not in df_train.columns:
+        df_train['real_value'] = 100.0
+    if 'price' not in df_train.columns:
+        df_train['price'] = 2.0
+    if 'volume' not in df_train.columns:
+        df_train['volume'] = 0.002
+    
+    # 2. Treinar numa thread: o callback de progresso passa as linhas para este generator
+    lines = queue.Queue()
+    outcome = {}
+    # Ativado quando o cliente desliga (o generator é fechado): a thread pára no fim da iteração em curso
+    stop_training = threading.Event()
+    
+    def progress(info):
+        lines.put(f"Episodes: {info['episodes']}/{info['max_episodes']} | Batch Profit Avg: {info['avg_profit']:.2f}€ | "
+                  f"Loss Total: {info['loss_total']:.4f} | {info['elapsed_s']:.0f}s")
+    
+    def run():
+        try:
+            outcome['result'] = train_buyer_agent(df_train, seed=1337, config={'max_episodes': int(max_episodes)},
+                                                  progress=progress, stop_event=stop_training)
+        except Exception as train_err:
+            outcome['error'] = train_err
+        finally:
+            # O ambiente pode consultar a base de dados (presets da cultura) a partir desta thread
+            connection.close()
+            lines.put(None)
+    
+    yield "[Django] A iniciar treino PPO no processo do servidor (BuyerAgent/training.py)...\n"
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
     
-    # 2. Configurar variáveis de ambiente para rodar o subprocesso
-    env = os.environ.copy()
-    env["EXCEL_PATH"] = os.path.join('Dados', temp_filename)
-    env["MAX_EPISODES_TOTAL"] = str(max_episodes) 
-    env["SINGLE_SEED"] = "1337"
-    env["NUM_WORKERS"] = "4" # Configurado para usar 4 cores físicos do CPU do servidor
-    
-    # 3. Invocar o script 0_training_constrained.py
-    cmd = [sys.executable, '0_training_constrained.py']
-    
-    yield "[Django] A iniciar subprocesso de treino (0_training_constrained.py)...\n"
-    
-    logs = []
     try:
-        process = subprocess.Popen(
-            cmd,
-            cwd=buyer_agent_dir,
-            env=env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
-        
-        # Capturar o stdout em tempo real
-        for line in process.stdout:
-            clean_line = line.strip()
-            if clean_line:
-                logs.append(clean_line)
-                yield clean_line + "\n"
-                    
-        process.wait()
-    except Exception as run_err:
-        yield f"[ERRO] Falha ao executar 0_training_constrained.py: {run_err}\n"
-        return
-        
-    # 4. Carregar os pesos gerados para a base de dados como BLOB
-    final_actor_path = os.path.join(buyer_agent_dir, 'modelos_producao_constrained', 'ppo_constrained_final_actor.pth')
-    final_critic_path = os.path.join(buyer_agent_dir, 'modelos_producao_constrained', 'ppo_constrained_final_critic.pth')
-    final_scaler_path = os.path.join(buyer_agent_dir, 'modelos_producao_constrained', 'ppo_constrained_final_scaler.pth')
-    
-    if os.path.exists(final_actor_path) and os.path.exists(final_critic_path):
-        with open(final_actor_path, 'rb') as f:
-            actor_data = f.read()
-        TrainedModel.objects.update_or_create(
-            owner=user,
-            culture=subfamily,
-            model_type='buyer_agent',
-            file_name='buyer_agent_actor.pth',
-            defaults={'file_data': actor_data}
-        )
-        
-        with open(final_critic_path, 'rb') as f:
-            critic_data = f.read()
+        while True:
+            line = lines.get()
+            if line is None:
+                break
+            yield line + "\n"
+    finally:
+        stop_training.set()
+        worker.join()
+    
+    if 'error' in outcome:
+        error_msg = f"[Django] [ERRO] O treino PPO falhou: {outcome['error']}"
+        yield error_msg + "\n"
+        raise RuntimeError(error_msg) from outcome['error']
+    
+    # 3. Guardar os pesos na base de dados como BLOB (sem passar pelo disco)
+    result = outcome['result']
+    for file_name, state in (('buyer_agent_actor.pth', result['actor']),
+                             ('buyer_agent_critic.pth', result['critic']),
+                             ('buyer_agent_scaler.pth', result['scaler'])):
+        buffer = io.BytesIO()
+        torch.save(state, buffer)
         TrainedModel.objects.update_or_create(
             owner=user,
             culture=subfamily,
             model_type='buyer_agent',
-            file_name='buyer_agent_critic.pth',
-            defaults={'file_data': critic_data}
+            file_name=file_name,
+            defaults={'file_data': buffer.getvalue()}
         )
-        
-        if os.path.exists(final_scaler_path):
-            with open(final_scaler_path, 'rb') as f:
-                scaler_data = f.read()
-            TrainedModel.objects.update_or_create(
-                owner=user,
-                culture=subfamily,
-                model_type='buyer_agent',
-                file_name='buyer_agent_scaler.pth',
-                defaults={'file_data': scaler_data}
-            )
-            
-        yield "[Django] [Sucesso] Modelos e pesos PPO carregados para a base de dados com segurança.\n"
-    else:
-        error_msg = "[Django] [ERRO] O script de treino PPO falhou a criar os ficheiros finais de pesos."
-        if logs:
-            error_msg += "\n\nLogs do subprocesso:\n" + "\n".join(logs)
-        yield error_msg + "\n"
-        raise FileNotFoundError(error_msg)
-        
-    # 5. Limpar os ficheiros do disco para manter o servidor limpo
-    try:
-        if os.path.exists(temp_excel_path):
-            os.remove(temp_excel_path)
-        if os.path.exists(final_actor_path):
-            os.remove(final_actor_path)
-        if os.path.exists(final_critic_path):
-            os.remove(final_critic_path)
-        if os.path.exists(final_scaler_path):
-            os.remove(final_scaler_path)
-        final_econ_stat = os.path.join(buyer_agent_dir, 'modelos_producao_constrained', 'ppo_constrained_final_econ_stat.pth')
-        if os.path.exists(final_econ_stat):
-            os.remove(final_econ_stat)
-    except Exception as cleanup_err:
-        yield f"[Django] [Aviso] Falha na limpeza de ficheiros locais: {cleanup_err}\n"
+    
+    summary = result['summary']
+    yield (f"[Django] [Sucesso] Modelos e pesos PPO carregados para a base de dados com segurança "
+           f"({summary['episodes']} episódios em {summary['elapsed_s']:.0f}s).\n")
 
 def train_buyer_agent_optimizer(user, subfamily, df_market_data, max_episodes="640"):
     """
@@ -541,3 +517,33 @@ def compute_daily_agent_decision(user, subfamily, max_capacity=500):
     # Calcular quantidade em Kg
     recommended_qty_kg = round(action_percent * max_demand, 2)
     return recommended_qty_kg
+
+
+def compute_min_required_shelf_life(user, subfamily, order_quantity):
+    """
+    Shelf-life mínimo (dias) que uma encomenda de order_quantity kg deve ter para ser escoada sob FEFO:
+    dias até que a procura prevista a partir de amanhã cubra o stock atual mais a encomenda. Usa as previsões
+    gravadas por run_sales_inference (prolongadas com o último valor) e, sem previsões, a média das últimas
+    7 vendas reais. Mesma lógica que StockEnvironment.get_min_required_order_shelf_life.
+    """
+    from environment_constrained import MAX_COVERAGE_DAYS, forecast_prefix_sums, min_required_shelf_lives
+
+    if order_quantity <= 0:
+        return 0
+
+    today = timezone.now().date()
+    forecasts = DemandForecast.objects.filter(
+        owner=user,
+        culture=subfamily,
+        date__gt=today
+    ).order_by('date').values_list('predicted_quantity_kg', flat=True)[:MAX_COVERAGE_DAYS + 1]
+    prediction = [float(x) for x in forecasts]
+
+    if not prediction:
+        last_sales = HistoricalSalesData.objects.filter(owner=user, culture=subfamily).order_by('-date')[:7]
+        sales = [float(x.sales_quantity_kg) for x in last_sales]
+        prediction = [float(np.mean(sales)) if sales else 10.0]
+
+    total_stock = sum(get_user_stock_profile(user, subfamily))
+    cum_demand = forecast_prefix_sums(prediction)
+    return int(min_required_shelf_lives(cum_demand, 0, [total_stock + float(order_quantity)])[0])
@@ -71,6 +71,53 @@ def continual_training_step(agent, new_experiences, env_train, max_action_val):
 
 
 
+def buyer_excel_path(product_sku):
+    """ Dataset Excel do SKU na pasta BuyerAgent/datasets (o do 3_080 se não existir) """
+    excel_name = f"m5_foods_{product_sku}.xlsx"
+    if product_sku == "911753":
+        excel_name = "911753_151dias_com_real.xlsx"
+    excel_path = os.path.join(buyer_agent_path, 'datasets', excel_name)
+    if not os.path.exists(excel_path):
+        excel_path = os.path.join(buyer_agent_path, 'datasets', 'm5_foods_3_080.xlsx')
+    return excel_path
+
+
+def suggest_minmax_thresholds(product_sku, max_capacity=500, num_days=150, s_values=range(5, 155, 5),
+                              S_values=range(50, 410, 10)):
+    """
+    Sugere o par Min-Max (s, S) com maior lucro nos primeiros num_days dias do split de teste, avaliando toda a
+    grelha (por omissão a dos sliders do dashboard) de uma só vez com evaluation.sweep_minmax.
+    Devolve a superfície de lucro e o ótimo em formato JSON (None nas células com S <= s).
+    """
+    if buyer_agent_path in sys.path:
+        sys.path.remove(buyer_agent_path)
+    sys.path.insert(0, buyer_agent_path)
+    from evaluation import sweep_minmax
+
+    result = sweep_minmax(buyer_excel_path(product_sku), s_values, S_values, max_capacity=max_capacity,
+                          num_days=num_days)
+
+    def as_json(grid):
+        return [[None if np.isnan(v) else float(v) for v in row] for row in grid]
+
+    return {
+        's_values': result['s_values'].tolist(),
+        'S_values': result['S_values'].tolist(),
+        'lucro': as_json(result['profit']),
+        'fill_rate': as_json(result['fill_rate']),
+        'descarte': as_json(result['waste']),
+        'melhor': {
+            'min_threshold': int(result['best']['s']),
+            'max_threshold': int(result['best']['S']),
+            'lucro': result['best']['profit'],
+            'fill_rate': result['best']['fill_rate'],
+            'descarte': result['best']['waste'],
+        },
+        'pares_avaliados': result['pairs'],
+        'dias': result['days'],
+    }
+
+
 def run_buyer_agent_simulation(product_sku, max_capacity=500, update_interval_days=15, num_days=150, min_threshold=35, max_threshold=130):
     """
     Executa a simulação completa de 150 dias do BuyerAgent em CPU.
@@ -90,21 +137,13 @@ def run_buyer_agent_simulation(product_sku, max_capacity=500, update_interval_da
             
     from environment_constrained import StockEnvironment
     from agent.ppo_agent import ParallelPPOAgent
+    from evaluation import evaluate, run_agent
 
     # 1. Definir caminho do dataset excel
-    excel_name = f"m5_foods_{product_sku}.xlsx"
-    if product_sku == "911753":
-        excel_name = "911753_151dias_com_real.xlsx"
-    excel_path = os.path.join(buyer_agent_path, 'datasets', excel_name)
-    if not os.path.exists(excel_path):
-        excel_path = os.path.join(buyer_agent_path, 'datasets', 'm5_foods_3_080.xlsx')
+    excel_path = buyer_excel_path(product_sku)
 
     # 2. Inicializar os ambientes
     env_test = StockEnvironment(excel_path=excel_path, is_training=False, train_split=0.6, max_capacity=max_capacity)
-    env_minmax = StockEnvironment(excel_path=excel_path, is_training=False, train_split=0.6, max_capacity=max_capacity)
-    env_minmax.max_order_limit = float('inf') # Sem limite de encomenda para Min-Max
-    env_oracle = StockEnvironment(excel_path=excel_path, is_training=False, train_split=0.6, max_capacity=max_capacity)
-    env_oracle.max_order_limit = float('inf') # Sem limite de encomenda para o Oráculo
     env_train = StockEnvironment(excel_path=excel_path, is_training=True, train_split=0.6, max_capacity=max_capacity)
 
     # 3. Instanciar o Agente
@@ -133,192 +172,63 @@ def run_buyer_agent_simulation(product_sku, max_capacity=500, update_interval_da
     econ_stat_path = checkpoint_path + '_econ_stat.pth'
     if os.path.exists(econ_stat_path):
         econ_state = torch.load(econ_stat_path, map_location='cpu', weights_only=False)
-        for env in [env_test, env_minmax, env_oracle, env_train]:
+        for env in [env_test, env_train]:
             env.stat_profit.n = econ_state['n']
             env.stat_profit.mean = econ_state['mean']
             env.stat_profit.S = econ_state['S']
 
     agent.policy_old_actor.eval()
 
-    # 5. Iniciar variáveis de log
-    state = env_test.reset()
-    env_minmax.reset()
-    env_oracle.reset()
-
-    done = False
-    dias_simulados = 0
-
-    log_dias = []
-    log_procura_real = []
-    
-    # Acumuladores de Lucros
-    profits_agent = []
-    profits_minmax = []
-    profits_oracle = []
-    
-    # Ações diárias
-    actions_agent = []
-    actions_minmax = []
-    actions_oracle = []
-
-    # Telemetria do Agente
-    log_stock_inicial = []
-    log_stock_final = []
-    log_vendas = []
-    log_vendas_perdidas = []
-    log_apodrecimento = []
-    log_excesso = []
-
-    # Flags de Penalidades
-    flag_stockout = []
-    flag_clientes_perdidos = []
-    flag_excesso_armazem = []
-    flag_apodrecimento_urgente = []
-
-    update_days = []
-    current_15d_buffer = []
-
-    cum_profit_agent = 0
-    cum_profit_minmax = 0
-    cum_profit_oracle = 0
-
+    # 5. Baselines (Min-Max e Oráculo Perfeito) no pool de processos e agente PPO neste processo, em paralelo
     # Limitar o número máximo de passos ao dataset ou num_days
     max_steps_to_run = min(env_test.max_steps, num_days)
+    baselines = {
+        'minmax': ('minmax', {'s': min_threshold, 'S': max_threshold, 'max_capacity': max_capacity}),
+        'oracle': ('oracle', {'max_capacity': max_capacity}),
+    }
 
-    cum_waste_minmax = 0
-    cum_lost_sales_minmax = 0
-
-    # 6. Loop de Inferência Diária
-    while not done and dias_simulados < max_steps_to_run:
-        day = env_test.current_step
-
-        # --- BASELINE: MIN-MAX ---
-        stock_hoje_minmax = sum(env_minmax.stock_profile) + env_minmax.in_transit.get(env_minmax.current_step, 0)
-        vendas_hoje_minmax = env_minmax.data.iloc[env_minmax.current_step]['real_value']
-        stock_amanha_minmax = max(0, stock_hoje_minmax - vendas_hoje_minmax) + env_minmax.in_transit.get(env_minmax.current_step + 1, 0)
-        
-        action_minmax = 0
-        if stock_amanha_minmax <= min_threshold:
-            action_minmax = max(0, max_threshold - stock_amanha_minmax)
-            action_minmax = min(action_minmax, max_capacity)
-            
-        _, _, _, info_minmax = env_minmax.step(action_minmax)
-        cum_profit_minmax += info_minmax['profit']
-        cum_waste_minmax += float(info_minmax['overflow_waste'])
-        cum_lost_sales_minmax += float(max(0, vendas_hoje_minmax - info_minmax['sales']))
-
-        # --- BASELINE: ORÁCULO PERFEITO ---
-        stock_hoje_oracle = sum(env_oracle.stock_profile) + env_oracle.in_transit.get(env_oracle.current_step, 0)
-        vendas_hoje_oracle = env_oracle.data.iloc[env_oracle.current_step]['real_value']
-        stock_amanha_oracle = max(0, stock_hoje_oracle - vendas_hoje_oracle) + env_oracle.in_transit.get(env_oracle.current_step + 1, 0)
-        
-        action_oracle = 0
-        demand_tomorrow = env_oracle.data.iloc[env_oracle.current_step + 1]['real_value'] if env_oracle.current_step + 1 <= env_oracle.max_steps else 0
-        
-        if stock_amanha_oracle < demand_tomorrow:
-            future_demand = 0
-            for i in range(1, 5):
-                idx = env_oracle.current_step + i
-                if idx <= env_oracle.max_steps:
-                    future_demand += env_oracle.data.iloc[idx]['real_value']
-            
-            action_oracle = max(0, future_demand - stock_amanha_oracle)
-            action_oracle = min(action_oracle, max_capacity)
-            
-        _, _, _, info_oracle = env_oracle.step(action_oracle)
-        cum_profit_oracle += info_oracle['profit']
-
-        state_tensor = torch.FloatTensor(state).unsqueeze(0).to(agent.device)
-        with torch.no_grad():
-            action_mean, log_std = agent.policy_old_actor(state_tensor)
-            dist = torch.distributions.Normal(action_mean, torch.exp(torch.clamp(log_std, -2.3, 1.5)))
-            action_percent = dist.sample()
-            action_logprob = dist.log_prob(action_percent)
-            physical_action = float(torch.round(torch.clamp(action_percent * max_order_limit, 0, max_order_limit)).cpu().numpy().flatten()[0])
-
-        stock_inicial_hoje = float(sum(env_test.stock_profile))
-
-        # Passo real do ambiente de teste
-        next_state, reward, done_env, info = env_test.step(physical_action)
-        done = done_env
-
-        # Guardar experiências recentes para fine-tuning
-        current_15d_buffer.append({
-            'state': state_tensor.squeeze(0).cpu().numpy(),
-            'action': action_percent.squeeze(0).cpu().numpy(),
-            'logprob': action_logprob.squeeze(0).cpu().numpy(),
-            'reward': reward,
-            'is_terminal': done
-        })
-
-        # Acumular lucros do agente
-        cum_profit_agent += info['profit']
+    def fine_tune(cycle_buffer):
+        continual_training_step(agent, cycle_buffer, env_train, max_order_limit)
 
-        # Guardar dados nos logs diários
-        log_dias.append(day)
-        log_procura_real.append(float(info['real_demand']))
-        
-        profits_agent.append(float(cum_profit_agent))
-        profits_minmax.append(float(cum_profit_minmax))
-        profits_oracle.append(float(cum_profit_oracle))
-        
-        actions_agent.append(float(physical_action))
-        actions_minmax.append(float(action_minmax))
-        actions_oracle.append(float(action_oracle))
-
-        # Telemetria do Armazém
-        stock_final_hoje = float(sum(env_test.stock_profile))
-        sales = float(info['sales'])
-        lost_sales = float(max(0, info['real_demand'] - sales))
-        overcapacity_waste = float(max(0, info['overflow_waste'] - info['spoilage']))
-        spoilage = float(info['spoilage'])
-
-        log_stock_inicial.append(stock_inicial_hoje)
-        log_stock_final.append(stock_final_hoje)
-        log_vendas.append(sales)
-        log_vendas_perdidas.append(lost_sales)
-        log_apodrecimento.append(spoilage)
-        log_excesso.append(overcapacity_waste)
-
-        # Flags de Penalidades
-        flag_stockout.append(1 if stock_final_hoje <= 0 else 0)
-        flag_clientes_perdidos.append(1 if lost_sales > 0 else 0)
-        flag_excesso_armazem.append(1 if overcapacity_waste > 0 else 0)
-        flag_apodrecimento_urgente.append(1 if spoilage > 0 else 0)
+    logs, (log_agent, _, update_days) = evaluate(
+        excel_path, baselines, max_capacity=max_capacity, num_days=max_steps_to_run,
+        agent_rollout=lambda: run_agent(env_test, agent, num_days=max_steps_to_run,
+                                        update_interval_days=update_interval_days, fine_tune=fine_tune))
+    log_minmax = logs['minmax']
+    log_oracle = logs['oracle']
 
-        state = next_state
-        dias_simulados += 1
+    log_procura_real = log_agent['Procura_Real']
+    log_vendas = log_agent['Vendas']
+    log_vendas_perdidas = log_agent['Vendas_Perdidas']
+    log_apodrecimento = log_agent['Apodrecimento']
+    log_excesso = log_agent['Excesso_Armazem']
 
-        # --- TRIGGER FINE-TUNING ONLINE ---
-        # Apenas executa se não for o último dia e se passarem os dias do intervalo de update
-        if dias_simulados % update_interval_days == 0 and not done:
-            update_days.append(dias_simulados)
-            continual_training_step(agent, current_15d_buffer, env_train, max_order_limit)
-            current_15d_buffer = []
-            agent.policy_old_actor.eval()
+    cum_profit_agent = log_agent['Lucro_Acumulado'][-1]
+    cum_profit_minmax = log_minmax['Lucro_Acumulado'][-1]
+    cum_profit_oracle = log_oracle['Lucro_Acumulado'][-1]
 
-    # 7. Formatar payload de resposta JSON consolidada
+    # 6. Formatar payload de resposta JSON consolidada
     payload = {
-        'dias': log_dias,
+        'dias': log_agent['Dia'],
         'procura_real': log_procura_real,
-        'lucros_agente': profits_agent,
-        'lucros_minmax': profits_minmax,
-        'lucros_oracle': profits_oracle,
-        'acoes_agente': actions_agent,
-        'acoes_minmax': actions_minmax,
-        'acoes_oracle': actions_oracle,
-        'stock_inicial': log_stock_inicial,
-        'stock_final': log_stock_final,
+        'lucros_agente': log_agent['Lucro_Acumulado'],
+        'lucros_minmax': log_minmax['Lucro_Acumulado'],
+        'lucros_oracle': log_oracle['Lucro_Acumulado'],
+        'acoes_agente': log_agent['Acao'],
+        'acoes_minmax': log_minmax['Acao'],
+        'acoes_oracle': log_oracle['Acao'],
+        'stock_inicial': log_agent['Stock_Inicial'],
+        'stock_final': log_agent['Stock_Final'],
         'vendas_efetivas': log_vendas,
         'vendas_perdidas': log_vendas_perdidas,
         'apodrecimento': log_apodrecimento,
         'excesso_descarte': log_excesso,
         'update_days': update_days,
         'flags': {
-            'stockout': flag_stockout,
-            'clientes_perdidos': flag_clientes_perdidos,
-            'excesso_armazem': flag_excesso_armazem,
-            'apodrecimento': flag_apodrecimento_urgente
+            'stockout': [1 if stock <= 0 else 0 for stock in log_agent['Stock_Final']],
+            'clientes_perdidos': [1 if lost > 0 else 0 for lost in log_vendas_perdidas],
+            'excesso_armazem': [1 if waste > 0 else 0 for waste in log_excesso],
+            'apodrecimento': [1 if spoilage > 0 else 0 for spoilage in log_apodrecimento]
         },
         'kpis': {
             'lucro_final_agente': float(cum_profit_agent),
@@ -326,9 +236,9 @@ def run_buyer_agent_simulation(product_sku, max_capacity=500, update_interval_da
             'lucro_final_oracle': float(cum_profit_oracle),
             'ganho_versus_minmax': float(((cum_profit_agent - cum_profit_minmax) / (abs(cum_profit_minmax) + 1e-8)) * 100),
             'total_descarte_kg': float(sum(log_apodrecimento) + sum(log_excesso)),
-            'total_descarte_minmax': float(cum_waste_minmax),
+            'total_descarte_minmax': float(sum(log_minmax['Descarte_Total'])),
             'total_clientes_perdidos_un': float(sum(log_vendas_perdidas)),
-            'total_clientes_perdidos_minmax': float(cum_lost_sales_minmax),
+            'total_clientes_perdidos_minmax': float(sum(log_minmax['Vendas_Perdidas'])),
             'total_procura_un': float(sum(log_procura_real)),
             'ciclos_treino_run': len(update_days),
             'eficiencia_fill_rate': float((sum(log_vendas) / (sum(log_procura_real) + 1e-8)) * 100)
@@ -439,21 +349,12 @@ def run_pricing_agent_simulation(product_sku, max_capacity=500, update_interval_
     update_days = []
 
     # Oracle daily search function (lookahead helper)
+    # The 55 grid candidates are evaluated as one vectorized step, without touching the environment state
+    oracle_grid = np.array([[p, q] for p in np.linspace(0.5, 1.5, 11) for q in np.linspace(0.1, 1.0, 5)])
+
     def run_oracle_lookahead_local(env_o):
-        ckpt = env_o.get_checkpoint()
-        p_grid = np.linspace(0.5, 1.5, 11)
-        q_grid = np.linspace(0.1, 1.0, 5)
-        best_prof = -float('inf')
-        best_act = [1.0, 1.0]
-        for p in p_grid:
-            for q in q_grid:
-                env_o.load_checkpoint(ckpt)
-                _, _, _, info = env_o.step([p, q])
-                if info['profit'] > best_prof:
-                    best_prof = info['profit']
-                    best_act = [p, q]
-        env_o.load_checkpoint(ckpt)
-        return best_act
+        profits = env_o.evaluate_actions(oracle_grid)['profit']
+        return oracle_grid[int(np.argmax(profits))].tolist()
 
     # Fine-tuning step adapted for 2-D continuous actions
     def continual_training_step_pricing(ppo_agent, new_experiences, train_env):
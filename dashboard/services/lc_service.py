@@ -1,6 +1,9 @@
 import datetime
 import math
 
+from biology.maturation import advance_batch, batch_quality, QUALITY_SPOILED
+from biology.presets import FRUIT_PRESETS, preset_key_for_name
+
 # Parâmetros padrão de degradação biológica para cada família de produtos
 CULTURE_DECAY_PARAMS = {
     "morango": {
@@ -59,10 +62,12 @@ def get_culture_params(culture_name):
         "default_rsl": 7
     }
 
-def calculate_quality_decay_curve(culture_name, initial_score=10.0, sensor_readings=None):
+def calculate_quality_decay_curve(culture_name, initial_score=10.0, sensor_readings=None, brix=None, lifecycle_presets=None):
     """
     Calcula a projeção da curva de degradação da qualidade (% de 0 a 100)
     ao longo dos próximos 15 dias com base nos sensores.
+    Para culturas com preset biológico (kiwi e maçãs) usa a cinética partilhada com os agentes de RL
+    (biology.maturation); para as restantes mantém o modelo empírico de decaimento diário.
     Retorna a lista de pontos do gráfico e o RSL (Remaining Shelf Life) previsto em dias.
     """
     params = get_culture_params(culture_name)
@@ -73,6 +78,25 @@ def calculate_quality_decay_curve(culture_name, initial_score=10.0, sensor_readi
     # Iniciar com qualidade máxima (ou proporcional ao score inicial, escala 0-10)
     current_quality = float(initial_score) * 10.0 if initial_score else 100.0
     current_quality = min(100.0, max(0.0, current_quality))
+
+    # Lote cinético (estado inicial do preset, com o brix medido se existir)
+    preset_key = preset_key_for_name(culture_name)
+    batch = None
+    if preset_key:
+        p = dict(FRUIT_PRESETS[preset_key])
+        if lifecycle_presets:
+            p.update(lifecycle_presets)
+        batch_brix = float(brix) if brix else float(p["brix_0_default"])
+        batch = {
+            'dureza': float(p["dureza_0_default"]),
+            'brix': min(float(p["brix_max"]), max(float(p["brix_min"]), batch_brix)),
+            'mold': 0.0,
+            'E_int': float(p.get("E0_int", 0.01)),
+            'age': 0.0
+        }
+        # O score inicial (0-10) escala a qualidade biológica do lote
+        quality_scale = current_quality / 100.0
+        current_quality = batch_quality(p, batch['dureza'], batch['brix']) * quality_scale
     
     decay_curve = []
     today = datetime.date.today()
@@ -120,6 +144,26 @@ def calculate_quality_decay_curve(culture_name, initial_score=10.0, sensor_readi
             humidity = fallback_humidity
             ethylene = fallback_ethylene
             
+        if batch is not None:
+            full_curve.append({
+                "day": day_offset,
+                "date": target_date.strftime("%Y-%m-%d"),
+                "quality": round(current_quality, 1),
+                "temperature": temp,
+                "humidity": humidity,
+                "ethylene": ethylene
+            })
+
+            # RSL = dias até a qualidade cair abaixo do limiar de deterioração (mesmo critério dos agentes)
+            if current_quality < QUALITY_SPOILED:
+                rsl_days = day_offset
+                break
+
+            # Avançar 1 dia com o clima do dia
+            batch = advance_batch(p, batch, temp, humidity, ethylene)
+            current_quality = batch['quality'] * quality_scale
+            continue
+
         # 1. Multiplicador de Temperatura
         temp_diff = max(0.0, temp - ideal_temp)
         temp_multiplier = math.pow(2.0, temp_diff / 10.0)
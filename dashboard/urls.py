@@ -59,6 +59,7 @@ urlpatterns = [
     path('api/soil-characteristics/', api_views.get_soil_characteristics, name='api_soil_characteristics'),
     path('api/harvest-history/<int:harvest_id>/', views.get_harvest_history, name='get_harvest_history'), # [NEW]
     path('api/agent-simulation/', views.agent_simulation, name='api_agent_simulation'),
+    path('api/agent-minmax-sweep/', views.agent_minmax_sweep, name='api_agent_minmax_sweep'),
     path('api/agent-recommendations/', views.get_agent_recommendations, name='api_agent_recommendations'),
     path('api/stock-recommendations/', views.get_stock_recommendations, name='api_stock_recommendations'),
     path('api/producer-agent-simulation/', views.producer_agent_simulation, name='api_producer_agent_simulation'),
@@ -1733,7 +1733,7 @@ def get_agent_recommendations(request):
                 
         from environment_constrained import StockEnvironment
         from agent.ppo_agent import ParallelPPOAgent
-        from dashboard.services.agent_service import compute_daily_agent_decision
+        from dashboard.services.agent_service import compute_daily_agent_decision, compute_min_required_shelf_life
         from dashboard.services.lc_service import calculate_quality_decay_curve
 
         recommendations = []
@@ -1774,8 +1774,8 @@ def get_agent_recommendations(request):
                         sensor_readings=sensor_readings
                     )
                 
-                # Determinar o mínimo requerido de shelf life de forma robusta
-                min_required_shelf_life = 5 if recommended_qty > 0 else 0
+                # Shelf-life mínimo para escoar stock + encomenda com a procura prevista desta cultura
+                min_required_shelf_life = compute_min_required_shelf_life(request.user, subfamily, recommended_qty)
                 
                 recommendations.append({
                     'item_id': str(subfamily.subfamily_id),
@@ -1818,7 +1818,8 @@ def get_stock_recommendations(request):
         if not os.path.exists(novos_dias_path):
             return JsonResponse({'status': 'error', 'message': f'Ficheiro {novos_dias_path} não encontrado.'}, status=404)
             
-        df_novos = pd.read_excel(novos_dias_path)
+        from orchestration.dataset_cache import load_dataset
+        df_novos = load_dataset(novos_dias_path)
         
         sku_culture_map = {
             "3_080": "Gala",
@@ -1917,6 +1918,7 @@ def get_stock_recommendations(request):
                 env.data.loc[0, 'humidity'] = row['humidity']
             if 'ethylene' in df_novos.columns:
                 env.data.loc[0, 'ethylene'] = row['ethylene']
+            env.refresh_columns()
                 
             # Obter estado do novo dia (sem simulação de malha fechada dos 40% restantes)
             state = env._get_state()
@@ -1931,7 +1933,7 @@ def get_stock_recommendations(request):
             culture = ProductSubFamily.objects.filter(name=culture_name).first()
             
             # Stock real simulado no final da simulação do split de teste
-            total_stock_kg = sum(b['quantity'] for b in env.active_batches if b['quantity'] > 0)
+            total_stock_kg = env.batches.total_quantity()
             if total_stock_kg <= 0.0:
                 total_stock_kg = 100.0  # Fallback se a simulação terminou com stock vazio
                 
@@ -2113,6 +2115,31 @@ def agent_simulation(request):
         return JsonResponse({'status': 'error', 'message': f'Erro crítico na simulação: {str(e)}'}, status=500)
 
 
+@login_required
+def agent_minmax_sweep(request):
+    from django.http import JsonResponse
+
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Método não permitido.'}, status=405)
+
+    try:
+        from .services.agent_simulation import suggest_minmax_thresholds
+        product_sku = request.POST.get('product_sku', '3_080')
+        max_capacity = int(request.POST.get('max_capacity', 500))
+
+        if product_sku not in ['3_080', '3_090', '3_252', '3_586', '911753']:
+            return JsonResponse({'status': 'error', 'message': 'SKU inválido.'}, status=400)
+
+        # Mesmo horizonte da simulação do Buyer Agent (150 dias)
+        payload = suggest_minmax_thresholds(product_sku=product_sku, max_capacity=max_capacity, num_days=150)
+        return JsonResponse({'status': 'success', 'data': payload})
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'status': 'error', 'message': f'Erro no varrimento Min-Max: {str(e)}'}, status=500)
+
+
 @login_required
 def import_sensor_readings(request, warehouse_id):
     import pandas as pd
@@ -2908,6 +2935,7 @@ def get_lc_decay_data(request):
     if is_producer:
         harvest_item = get_object_or_404(Harvest, pk=stock_id)
         culture_name = f"{harvest_item.subfamily.name} ({harvest_item.subfamily.fruit_type})"
+        lifecycle_presets = harvest_item.subfamily.lifecycle_presets
         initial_score = harvest_item.avg_quality_score or 10.0
         brix = harvest_item.soluble_solids or 10.0
         caliber = harvest_item.caliber or 65.0
@@ -2918,6 +2946,7 @@ def get_lc_decay_data(request):
     else:
         stock_item = get_object_or_404(ConsolidatedStock, pk=stock_id)
         culture_name = f"{stock_item.culture.name} ({stock_item.culture.fruit_type})"
+        lifecycle_presets = stock_item.culture.lifecycle_presets
         initial_score = stock_item.avg_quality_score or 10.0
         brix = stock_item.avg_soluble_solids or 10.0
         caliber = stock_item.avg_caliber or 65.0
@@ -2944,7 +2973,9 @@ def get_lc_decay_data(request):
     decay_curve, rsl_days = calculate_quality_decay_curve(
         culture_name=culture_name,
         initial_score=initial_score,
-        sensor_readings=sensor_readings
+        sensor_readings=sensor_readings,
+        brix=brix,
+        lifecycle_presets=lifecycle_presets
     )
     
     # Obter dados climáticos de hoje
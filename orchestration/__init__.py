@@ -0,0 +1,15 @@
+# Infraestrutura partilhada de dados, treino e avaliação (caches em disco, memória partilhada, agendadores)
+import os
+
+
+def user_cache_dir(name):
+    """
+    Pasta de cache do utilizador para `name`, fora da árvore de código: $RETAIL_EUREKA_CACHE/<name> se definida,
+    senão <cache do sistema>/retail_eureka/<name> ($XDG_CACHE_HOME, %LOCALAPPDATA% ou ~/.cache).
+    """
+    base = os.environ.get('RETAIL_EUREKA_CACHE')
+    if not base:
+        root = (os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA')
+                or os.path.join(os.path.expanduser('~'), '.cache'))
+        base = os.path.join(root, 'retail_eureka')
+    return os.path.join(base, name)
@@ -0,0 +1,176 @@
+"""
+Checkpoints dos treinos PPO: retenção dos melhores, paragem por patamar e estado completo para retomar.
+
+CheckpointKeeper guarda apenas os top-k checkpoints por score de avaliação (p.ex. lucro no split de teste):
+o snapshot dos pesos é feito no momento (cópia em CPU) e a escrita dos .pth corre numa thread dedicada, sem
+bloquear o learner. Os checkpoints que saem do top-k são apagados e <save_dir>/checkpoints.json lista os que
+ficam, do melhor para o pior.
+
+PlateauStopper conta as avaliações seguidas sem melhoria e indica quando o treino deve parar.
+
+save_training_state / load_training_state gravam e leem o estado completo de um treino (pesos, momentos do
+Adam, contadores, estados dos geradores aleatórios, estatísticas dos ambientes) num único ficheiro
+<checkpoint>_training_state.pt, substituído atomicamente no fim de cada iteração: um treino interrompido
+retoma (--resume) no início da iteração que estava em curso.
+"""
+import copy
+import json
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+TRAINING_STATE_SUFFIX = '_training_state.pt'
+
+
+def _snapshot(obj):
+    """ Cópia independente (tensores em CPU) que pode ser gravada noutra thread enquanto o treino continua """
+    if torch.is_tensor(obj):
+        return obj.detach().cpu().clone()
+    if isinstance(obj, dict):
+        return {k: _snapshot(v) for k, v in obj.items()}
+    return copy.deepcopy(obj)
+
+
+def rng_state():
+    """ Estado dos geradores aleatórios do processo (random, NumPy, PyTorch e CUDA se existir) """
+    state = {'python': random.getstate(), 'numpy': np.random.get_state(), 'torch': torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def save_training_state(path, state):
+    """
+    Grava o estado de treino em `path` de forma atómica: escreve num ficheiro temporário, força-o para disco e
+    só depois substitui o anterior, para que uma interrupção a meio da escrita deixe o estado antigo intacto.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        torch.save(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_training_state(path):
+    """ Estado gravado por save_training_state (tensores em CPU) """
+    return torch.load(path, map_location='cpu', weights_only=False)
+
+
+class PlateauStopper:
+    """
+    Regra de paragem por patamar: o treino deve parar ao fim de `patience` avaliações seguidas sem superar
+    o melhor score em mais de `min_delta`. Com patience = 0 nunca pára.
+    """
+
+    def __init__(self, patience, min_delta=0.0):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best = None
+        self.best_step = None
+        self.evals_without_improvement = 0
+
+    def update(self, score, step=None):
+        """ Regista uma avaliação; devolve True se melhorou o melhor score """
+        if self.best is None or score > self.best + self.min_delta:
+            self.best, self.best_step = score, step
+            self.evals_without_improvement = 0
+            return True
+        self.evals_without_improvement += 1
+        return False
+
+    @property
+    def should_stop(self):
+        return self.patience > 0 and self.evals_without_improvement >= self.patience
+
+    def state_dict(self):
+        return {'best': self.best, 'best_step': self.best_step,
+                'evals_without_improvement': self.evals_without_improvement}
+
+    def load_state_dict(self, state):
+        self.best = state['best']
+        self.best_step = state['best_step']
+        self.evals_without_improvement = state['evals_without_improvement']
+
+
+class CheckpointKeeper:
+    """
+    Mantém em save_dir os `top_k` checkpoints com maior score. offer() recebe os ficheiros do checkpoint como
+    {sufixo: objeto} (ex.: {'_actor.pth': state_dict, ...}, gravados como <nome><sufixo>) e devolve o caminho
+    base se o checkpoint entrou no top-k, ou None. As escritas e remoções correm por ordem numa única thread;
+    close() espera por elas e propaga o primeiro erro de escrita.
+    """
+
+    INDEX_NAME = 'checkpoints.json'
+
+    def __init__(self, save_dir, top_k=3):
+        self.save_dir = save_dir
+        self.top_k = top_k
+        self.kept = []
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint-writer')
+        os.makedirs(save_dir, exist_ok=True)
+
+    @property
+    def best(self):
+        """ Entrada do melhor checkpoint ({'path', 'score', 'step', ...}) ou None """
+        return self.kept[0] if self.kept else None
+
+    def offer(self, name, score, files, step=None):
+        if self.top_k <= 0 or (len(self.kept) >= self.top_k and score <= self.kept[-1]['score']):
+            return None
+        path = os.path.join(self.save_dir, name)
+        entry = {'name': name, 'path': path, 'score': float(score), 'step': step, 'files': sorted(files)}
+        # Ordenação estável: com scores iguais fica o checkpoint mais antigo
+        self.kept = sorted(self.kept + [entry], key=lambda e: -e['score'])
+        dropped = self.kept[self.top_k:]
+        del self.kept[self.top_k:]
+        snapshot = {suffix: _snapshot(obj) for suffix, obj in files.items()}
+        index = [dict(e) for e in self.kept]
+        self._futures.append(self._executor.submit(self._write, path, snapshot, dropped, index))
+        return path
+
+    def state_dict(self):
+        return {'kept': [dict(e) for e in self.kept]}
+
+    def load_state_dict(self, state):
+        """ Retoma a lista de checkpoints mantidos (os ficheiros já estão em save_dir) """
+        self.kept = [dict(e) for e in state['kept']]
+
+    def _write(self, path, snapshot, dropped, index):
+        for suffix, obj in snapshot.items():
+            tmp_path = f"{path}{suffix}.tmp"
+            torch.save(obj, tmp_path)
+            os.replace(tmp_path, path + suffix)
+        for entry in dropped:
+            for suffix in entry['files']:
+                if os.path.exists(entry['path'] + suffix):
+                    os.remove(entry['path'] + suffix)
+        index_path = os.path.join(self.save_dir, self.INDEX_NAME)
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2)
+        os.replace(index_path + '.tmp', index_path)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from orchestration import user_cache_dir
+
+# Cópias binárias dos datasets (uma por conteúdo do ficheiro de origem), reutilizadas entre processos
+CACHE_DIR = user_cache_dir('dataset_cache')
+CACHE_VERSION = 1
+
+
+def _file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _to_records(df):
+    """
+    DataFrame -> array estruturado (uma coluna por campo). Colunas object, mesmo com tipos mistos (ex.: item_id
+    com ints e strings em NovosDias.xlsx), passam a str; None se uma delas tiver valores em falta ou se alguma
+    coluna não couber num dtype fixo.
+    """
+    fields = []
+    for name in df.columns:
+        values = df[name].to_numpy()
+        if values.dtype == object:
+            if pd.isna(values).any():
+                return None
+            values = values.astype(str)
+        if values.dtype.hasobject:
+            return None
+        fields.append((str(name), values))
+    records = np.empty(len(df), dtype=[(name, values.dtype) for name, values in fields])
+    for name, values in fields:
+        records[name] = values
+    return records
+
+
+def _to_frame(records):
+    """ Array estruturado (ou memmap) -> DataFrame novo, com cada coluna copiada para memória própria """
+    return pd.DataFrame({name: np.array(records[name]) for name in records.dtype.names}, copy=False)
+
+
+def _source_hash(path, index_path):
+    """
+    Hash do ficheiro de origem. Se o mtime e o tamanho coincidirem com o índice guardado, reutiliza o hash
+    sem voltar a ler o ficheiro; caso contrário recalcula-o e atualiza o índice.
+    """
+    st = os.stat(path)
+    if os.path.exists(index_path):
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+            if index.get('mtime_ns') == st.st_mtime_ns and index.get('size') == st.st_size:
+                return index['sha1']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    sha1 = _file_sha1(path)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'source': os.path.abspath(path), 'mtime_ns': st.st_mtime_ns, 'size': st.st_size,
+                   'sha1': sha1, 'version': CACHE_VERSION}, f)
+    os.replace(tmp_path, index_path)
+    return sha1
+
+
+def _index_path(abs_path, cache_dir):
+    stem = os.path.splitext(os.path.basename(abs_path))[0]
+    path_key = hashlib.sha1(abs_path.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{stem}_{path_key}.json")
+
+
+def dataset_hash(path, cache_dir=CACHE_DIR):
+    """ SHA-1 do conteúdo do ficheiro do dataset (reutiliza o índice de load_dataset enquanto o ficheiro não mudar) """
+    os.makedirs(cache_dir, exist_ok=True)
+    abs_path = os.path.abspath(path)
+    return _source_hash(abs_path, _index_path(abs_path, cache_dir))
+
+
+def load_dataset(path, cache_dir=CACHE_DIR):
+    """
+    Lê um dataset Excel através de uma cache binária (.npy estruturado).
+    A primeira leitura de cada versão do ficheiro usa pd.read_excel e grava a cache; as seguintes
+    (em qualquer processo) só fazem stat + np.load. A cache é aberta em memory-map, mas as colunas são
+    copiadas: devolve sempre um DataFrame novo, que o chamador pode alterar. Colunas object saem como str
+    (também na primeira leitura, para que as duas leituras devolvam o mesmo).
+    """
+    abs_path = os.path.abspath(path)
+    stem = os.path.splitext(os.path.basename(abs_path))[0]
+    sha1 = dataset_hash(abs_path, cache_dir)
+    cache_path = os.path.join(cache_dir, f"{stem}_{sha1[:16]}_v{CACHE_VERSION}.npy")
+
+    if os.path.exists(cache_path):
+        return _to_frame(np.load(cache_path, mmap_mode='r'))
+
+    df = pd.read_excel(abs_path)
+    records = _to_records(df)
+    if records is None:
+        return df
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, records)
+    os.replace(tmp_path, cache_path)
+    return _to_frame(records)
@@ -0,0 +1,283 @@
+"""
+Avaliação em lote do Buyer Agent no split de teste: grelha SKUs x políticas x parâmetros corrida num pool
+persistente de processos (um por core), com os resultados numa cache endereçada por conteúdo (ResultsCache).
+A chave de cada célula junta o hash do código do simulador, o hash do dataset, o hash dos ficheiros do checkpoint
+(PPO), a política e os parâmetros, por isso só as células novas ou alteradas são calculadas; as restantes vêm da
+cache sem reler os Excel nem carregar modelos.
+
+Políticas: 'ppo' (checkpoint por SKU, ação amostrada com a seed dada) e as baselines de evaluation.POLICIES
+('minmax', 'oracle', 'dos', 'cnn', 'minmax_position'). Sem --param, o Min-Max corre com todos os pares (s, S)
+distintos de MIN_MAX_CONFIGS em todos os SKUs. Exemplos:
+
+    python -m orchestration.evaluation_scheduler --out avaliacoes/todos.csv
+    python -m orchestration.evaluation_scheduler --skus 3_080 3_252 --policies minmax --param minmax.s=10,24 --param minmax.S=60,130
+"""
+import argparse
+import itertools
+import multiprocessing as mp
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from orchestration.dataset_cache import dataset_hash
+from orchestration.results_cache import CACHE_DIR, ResultsCache, files_hash, result_key
+from orchestration.shared_dataset import SharedDataset
+from orchestration.training_scheduler import ROOT, SKU_DATASETS, _init_worker, _parse_hparam, agent_module, dataset_path
+
+# Muda quando o formato dos resultados guardados muda; alterações ao simulador e às métricas já mudam a chave
+# através do hash de SIMULATOR_SOURCES
+RESULTS_VERSION = 1
+
+# Código que determina os resultados de uma célula: ambiente, políticas/métricas de evaluation.py e cinética
+SIMULATOR_SOURCES = [
+    os.path.join('BuyerAgent', 'environment_constrained.py'),
+    os.path.join('BuyerAgent', 'evaluation.py'),
+    os.path.join('biology', 'batch_store.py'),
+    os.path.join('biology', 'maturation.py'),
+    os.path.join('biology', 'presets.py'),
+    os.path.join('biology', 'rsl_cache.py'),
+]
+
+DEFAULT_POLICIES = ['ppo', 'minmax', 'oracle']
+CHECKPOINT_NAME = 'ppo_constrained_iter313'
+CHECKPOINT_SUFFIXES = ['_actor.pth', '_critic.pth', '_scaler.pth', '_econ_stat.pth']
+
+
+def _evaluation_module():
+    return agent_module('buyer', 'evaluation')
+
+
+def default_checkpoint(sku):
+    """ Checkpoint de produção do SKU (modelos_producao_constrained/<sku>/), ou o do 3_080 se não existir """
+    base = os.path.join(ROOT, 'BuyerAgent', 'modelos_producao_constrained')
+    path = os.path.join(base, sku, CHECKPOINT_NAME)
+    if not os.path.exists(path + '_actor.pth'):
+        path = os.path.join(base, '3_080', CHECKPOINT_NAME)
+    return path
+
+
+def _checkpoint_files(checkpoint):
+    return [checkpoint + suffix for suffix in CHECKPOINT_SUFFIXES if os.path.exists(checkpoint + suffix)]
+
+
+def _param_grid(policy, grid):
+    """ Combinações dos parâmetros 'politica.nome' da grelha que pertencem a `policy` """
+    own = {name.split('.', 1)[1]: values for name, values in grid.items() if name.split('.', 1)[0] == policy}
+    if not own:
+        return []
+    names = sorted(own)
+    return [dict(zip(names, values)) for values in itertools.product(*(own[name] for name in names))]
+
+
+def build_cells(skus, policies, param_grid=None, seeds=(1337,), checkpoints=None, max_capacity=500):
+    """
+    Produto cartesiano SKUs x políticas x parâmetros. param_grid: {'politica.parametro': [valores]};
+    checkpoints: {sku: caminho base} para a política 'ppo' (por omissão, default_checkpoint).
+    """
+    evaluation = _evaluation_module()
+    grid = param_grid or {}
+    unknown = {name.split('.', 1)[0] for name in grid} - set(policies)
+    if unknown or any('.' not in name for name in grid):
+        raise ValueError(f"Parâmetros inválidos {sorted(grid)} (usar politica.parametro com políticas de {policies})")
+    minmax_pairs = sorted({(c['s'], c['S']) for c in evaluation.MIN_MAX_CONFIGS.values()})
+
+    cells = []
+    for sku, policy in itertools.product(skus, policies):
+        if policy == 'ppo':
+            checkpoint = (checkpoints or {}).get(sku) or default_checkpoint(sku)
+            combos = [{'checkpoint': checkpoint, 'seed': int(seed), **extra}
+                      for seed, extra in itertools.product(seeds, _param_grid(policy, grid) or [{}])]
+        elif policy in evaluation.POLICIES:
+            combos = _param_grid(policy, grid)
+            if not combos and policy == 'minmax':
+                combos = [{'s': s, 'S': S} for s, S in minmax_pairs]
+            combos = combos or [{}]
+            if policy in ('minmax', 'oracle'):
+                combos = [{'max_capacity': max_capacity, **combo} for combo in combos]
+        else:
+            raise ValueError(f"Política desconhecida: {policy!r} (conhecidas: {['ppo'] + sorted(evaluation.POLICIES)})")
+        for params in combos:
+            cells.append({'sku': sku, 'policy': policy, 'params': params, 'dataset': dataset_path('buyer', sku)})
+    return cells
+
+
+def simulator_hash():
+    """ SHA-1 do código-fonte do simulador (SIMULATOR_SOURCES): editar um destes ficheiros invalida a cache """
+    return files_hash([os.path.join(ROOT, path) for path in SIMULATOR_SOURCES])
+
+
+def cell_key(cell, max_capacity, num_days, hashes):
+    """ Chave de cache da célula; `hashes` memoriza os hashes de código, datasets e checkpoints já calculados """
+    if 'simulator' not in hashes:
+        hashes['simulator'] = simulator_hash()
+    if cell['dataset'] not in hashes:
+        hashes[cell['dataset']] = dataset_hash(cell['dataset'])
+    params = dict(cell['params'])
+    checkpoint_hash = None
+    if cell['policy'] == 'ppo':
+        checkpoint = params.pop('checkpoint')
+        if checkpoint not in hashes:
+            files = _checkpoint_files(checkpoint)
+            if not files:
+                raise FileNotFoundError(f"Checkpoint não encontrado: {checkpoint}")
+            hashes[checkpoint] = files_hash(files)
+        checkpoint_hash = hashes[checkpoint]
+    return result_key(version=RESULTS_VERSION, simulator=hashes['simulator'], dataset=hashes[cell['dataset']],
+                      checkpoint=checkpoint_hash,
+                      policy=cell['policy'], params=params, max_capacity=max_capacity, num_days=num_days)
+
+
+def _run_cell(cell, dataset_spec, max_capacity, num_days):
+    """ Corre uma célula num processo do pool; devolve as métricas ou o traceback do erro """
+    start = time.time()
+    dataset = None
+    env = None
+    try:
+        evaluation = _evaluation_module()
+        dataset = SharedDataset.attach(dataset_spec)
+        params = dict(cell['params'])
+        if cell['policy'] == 'ppo':
+            import torch
+            ppo_agent = agent_module('buyer', 'agent.ppo_agent')
+            env = evaluation.make_test_env(cell['dataset'], max_capacity, data_frame=dataset.frame)
+            agent = ppo_agent.ParallelPPOAgent(state_dim=17, action_dim=1, max_action=env.max_order_limit)
+            agent.load(params['checkpoint'])
+            econ_stat_path = params['checkpoint'] + '_econ_stat.pth'
+            if os.path.exists(econ_stat_path):
+                econ_state = torch.load(econ_stat_path, map_location='cpu', weights_only=False)
+                env.stat_profit.n, env.stat_profit.mean, env.stat_profit.S = econ_state['n'], econ_state['mean'], econ_state['S']
+            torch.manual_seed(params['seed'])
+            log, _, _ = evaluation.run_agent(env, agent, num_days=num_days)
+        else:
+            env = evaluation.make_baseline_env(cell['dataset'], max_capacity, data_frame=dataset.frame)
+            log = evaluation.run_policy(env, cell['policy'], params, num_days)
+        result = {'status': 'ok', 'metrics': evaluation.summarize_log(log)}
+    except Exception:
+        result = {'status': 'error', 'error': traceback.format_exc()}
+    finally:
+        env = None
+        if dataset is not None:
+            dataset.close()
+    result['wall_s'] = time.time() - start
+    return result
+
+
+def run_cells(cells, max_capacity=500, num_days=None, cache=None, max_workers=None, force=False, on_result=None):
+    """
+    Devolve uma linha por célula ({sku, policy, params, key, cached, status, metrics, ...}), pela ordem de
+    `cells`. As células com resultado na cache (salvo force=True) não são recalculadas; as restantes correm
+    num pool de max_workers processos (por omissão, um por core) e os resultados ok entram na cache.
+    """
+    cache = cache or ResultsCache()
+    hashes = {}
+    rows = []
+    pending = []
+    for cell in cells:
+        key = cell_key(cell, max_capacity, num_days, hashes)
+        stored = None if force else cache.get(key)
+        row = {**cell, 'key': key, 'cached': stored is not None}
+        if stored is not None:
+            row.update(status='ok', metrics=stored['metrics'], wall_s=stored['wall_s'])
+        else:
+            pending.append(row)
+        rows.append(row)
+
+    if pending:
+        max_workers = min(max_workers or os.cpu_count() or 1, len(pending))
+        datasets = {}
+        try:
+            for row in pending:
+                if row['dataset'] not in datasets:
+                    datasets[row['dataset']] = SharedDataset.publish(row['dataset'])
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context('spawn'),
+                                     initializer=_init_worker) as pool:
+                futures = {pool.submit(_run_cell, {k: row[k] for k in ('sku', 'policy', 'params', 'dataset')},
+                                       datasets[row['dataset']].spec, max_capacity, num_days): row for row in pending}
+                for done, future in enumerate(as_completed(futures), 1):
+                    row = futures[future]
+                    row.update(future.result())
+                    if row['status'] == 'ok':
+                        cache.put(row['key'], {
+                            'sku': row['sku'], 'policy': row['policy'], 'params': row['params'],
+                            'dataset_sha1': hashes[row['dataset']], 'simulator_sha1': hashes['simulator'],
+                            'version': RESULTS_VERSION,
+                            'max_capacity': max_capacity, 'num_days': num_days,
+                            'metrics': row['metrics'], 'wall_s': row['wall_s'], 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                        })
+                    if on_result is not None:
+                        on_result(row, done, len(pending))
+        finally:
+            for dataset in datasets.values():
+                dataset.close()
+                dataset.unlink()
+    return rows
+
+
+def results_frame(rows):
+    """ Tabela plana: uma linha por célula, parâmetros e métricas em colunas """
+    records = []
+    for row in rows:
+        params = {k: v for k, v in row['params'].items() if k != 'checkpoint'}
+        record = {'sku': row['sku'], 'policy': row['policy'],
+                  'params': ', '.join(f"{k}={v}" for k, v in sorted(params.items())),
+                  'status': row['status'], 'cached': row['cached'], 'wall_s': row.get('wall_s'), 'key': row['key']}
+        record.update(row.get('metrics') or {})
+        records.append(record)
+    return pd.DataFrame(records)
+
+
+def _print_result(row, done, total):
+    label = f"{row['sku']}/{row['policy']} {row['params']}"
+    if row['status'] == 'ok':
+        print(f"[{done}/{total}] {label}: lucro {row['metrics']['lucro_total']:.2f}€ em {row['wall_s']:.1f}s", flush=True)
+    else:
+        print(f"[{done}/{total}] {label}: ERRO\n{row['error']}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Avaliação em lote do Buyer Agent (SKU x política x parâmetros) com cache")
+    parser.add_argument('--skus', nargs='+', default=sorted(SKU_DATASETS))
+    parser.add_argument('--policies', nargs='+', default=DEFAULT_POLICIES)
+    parser.add_argument('--param', action='append', type=_parse_hparam, default=[],
+                        help="politica.parametro=valor[,valor...] (repetível; vários valores formam uma grelha)")
+    parser.add_argument('--seeds', nargs='+', type=int, default=[1337], help="seeds da política 'ppo'")
+    parser.add_argument('--checkpoint', action='append', default=[], metavar='SKU=CAMINHO',
+                        help="checkpoint PPO de um SKU (caminho base, sem _actor.pth)")
+    parser.add_argument('--max-capacity', type=int, default=500)
+    parser.add_argument('--num-days', type=int, default=None, help="dias avaliados (por omissão, todo o split de teste)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help="pasta da cache de resultados (por omissão %(default)s; ver RETAIL_EUREKA_CACHE)")
+    parser.add_argument('--force', action='store_true', help="recalcula mesmo as células já em cache")
+    parser.add_argument('--workers', type=int, default=None, help="processos no pool (por omissão, um por core)")
+    parser.add_argument('--out', default=None, help="CSV com uma linha por célula")
+    args = parser.parse_args()
+
+    checkpoints = dict(item.split('=', 1) for item in args.checkpoint)
+    cells = build_cells(args.skus, args.policies, dict(args.param), args.seeds, checkpoints, args.max_capacity)
+    start = time.time()
+    rows = run_cells(cells, args.max_capacity, args.num_days, ResultsCache(args.cache_dir), args.workers, args.force,
+                     on_result=_print_result)
+    df = results_frame(rows)
+    cached = int(df['cached'].sum())
+    failed = int((df['status'] != 'ok').sum())
+
+    ok = df[df['status'] == 'ok']
+    if not ok.empty:
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(ok.sort_values(['sku', 'lucro_total'], ascending=[True, False])
+                    [['sku', 'policy', 'params', 'lucro_total', 'fill_rate', 'descarte_total', 'cached']].to_string(index=False))
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        df.to_csv(args.out, index=False)
+        print(f"[OK] Resultados guardados em {args.out}")
+    print(f"{len(cells)} células ({cached} da cache, {len(cells) - cached} calculadas) em {time.time() - start:.0f}s | "
+          f"{failed} com erro")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
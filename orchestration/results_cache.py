@@ -0,0 +1,57 @@
+"""
+Cache de resultados de avaliação endereçada por conteúdo: cada resultado é guardado em
+<cache_dir>/<k[:2]>/<k>.json, onde k é o SHA-1 das entradas que o determinam (hash do código do simulador, hash
+do dataset, hash dos ficheiros do checkpoint, política, parâmetros). Mudar o simulador, o Excel ou retreinar o
+modelo muda a chave; mover ou renomear ficheiros não. Escritas atómicas, por isso vários processos podem partilhar a mesma pasta.
+"""
+import hashlib
+import json
+import os
+
+from orchestration import user_cache_dir
+from orchestration.dataset_cache import _file_sha1
+
+CACHE_DIR = user_cache_dir('evaluation_cache')
+
+
+def files_hash(paths):
+    """ SHA-1 combinado do conteúdo de vários ficheiros (p.ex. os .pth de um checkpoint), pela ordem dada """
+    h = hashlib.sha1()
+    for path in paths:
+        h.update(os.path.basename(path).encode('utf-8'))
+        h.update(_file_sha1(path).encode('ascii'))
+    return h.hexdigest()
+
+
+def result_key(**parts):
+    """ Chave de um resultado: SHA-1 do JSON canónico (chaves ordenadas) das entradas """
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class ResultsCache:
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """ Resultado guardado para a chave, ou None (também se o ficheiro estiver ilegível) """
+        try:
+            with open(self.path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
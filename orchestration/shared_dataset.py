@@ -0,0 +1,99 @@
+import os
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from orchestration.dataset_cache import load_dataset
+
+
+class SharedDataset:
+    """
+    Dataset publicado uma vez em memória partilhada (um bloco SharedMemory por coluna numérica) para os
+    workers PPO. O processo principal chama publish() e passa `spec` (picklable) aos workers, que fazem
+    attach() e constroem os ambientes sobre `frame` sem reler o Excel nem copiar os dados: as colunas do
+    DataFrame são vistas só de leitura sobre os blocos partilhados.
+
+    Colunas não numéricas (texto) não cabem num bloco de tamanho fixo e seguem por cópia dentro do spec.
+    Só o processo que publicou chama unlink(), depois de todos os workers terem terminado.
+    """
+
+    def __init__(self, spec, blocks, frame, owner):
+        self.spec = spec
+        self.frame = frame
+        self._blocks = blocks
+        self._owner = owner
+
+    @classmethod
+    def publish(cls, path):
+        df = load_dataset(path)
+        blocks = []
+        columns = []
+        for name in df.columns:
+            values = df[name].to_numpy()
+            if values.dtype.hasobject:
+                columns.append((str(name), None, values.copy()))
+                continue
+            shm = shared_memory.SharedMemory(create=True, size=max(1, values.nbytes))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[:] = values
+            blocks.append(shm)
+            columns.append((str(name), values.dtype.str, shm.name))
+
+        spec = {'source': os.path.abspath(path), 'n_rows': len(df), 'columns': columns}
+        return cls(spec, blocks, cls._build_frame(spec, blocks), owner=True)
+
+    @classmethod
+    def attach(cls, spec):
+        blocks = []
+        for _, dtype, ref in spec['columns']:
+            if dtype is None:
+                continue
+            # Em Python < 3.13 o attach regista o bloco no resource tracker; com spawn os workers partilham
+            # o tracker do processo principal, pelo que o registo é idempotente e o unlink continua a ser dele
+            if sys.version_info >= (3, 13):
+                blocks.append(shared_memory.SharedMemory(name=ref, track=False))
+            else:
+                blocks.append(shared_memory.SharedMemory(name=ref))
+        return cls(spec, blocks, cls._build_frame(spec, blocks), owner=False)
+
+    @staticmethod
+    def _build_frame(spec, blocks):
+        n = spec['n_rows']
+        shared = iter(blocks)
+        data = {}
+        for name, dtype, ref in spec['columns']:
+            if dtype is None:
+                data[name] = ref
+                continue
+            values = np.ndarray((n,), dtype=np.dtype(dtype), buffer=next(shared).buf)
+            values.flags.writeable = False
+            data[name] = values
+        return pd.DataFrame(data, copy=False)
+
+    def nbytes(self):
+        return sum(shm.size for shm in self._blocks)
+
+    def close(self):
+        """ Larga as vistas e fecha os blocos neste processo """
+        self.frame = None
+        for shm in self._blocks:
+            try:
+                shm.close()
+            except BufferError:
+                # Ainda há arrays (p.ex. de um ambiente vivo) a apontar para o bloco; fecha com o processo
+                pass
+
+    def unlink(self):
+        """ Remove os blocos do sistema (só no processo que os publicou) """
+        if self._owner:
+            for shm in self._blocks:
+                shm.unlink()
+            self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.unlink()
@@ -0,0 +1,70 @@
+import multiprocessing as mp
+
+import torch
+
+
+class SharedRollout:
+    """
+    Tensores de rollout pré-alocados em memória partilhada para os workers PPO, com layout
+    [HORIZON, NUM_ENVS, ...]: o worker w escreve diretamente nas colunas [w * E, (w + 1) * E) e só um
+    pequeno sinal de "pronto" atravessa a fila. O learner lê os mesmos tensores sem torch.cat.
+
+    `states` tem HORIZON + 1 passos: o último é o estado final usado para bootstrapping.
+    Os tensores só podem ser reescritos depois de o learner ter consumido a ronda anterior.
+    """
+
+    def __init__(self, horizon, num_envs, state_dim, action_dim, logprob_dim=1):
+        self.horizon = horizon
+        self.num_envs = num_envs
+        self.states = torch.zeros(horizon + 1, num_envs, state_dim).share_memory_()
+        self.actions = torch.zeros(horizon, num_envs, action_dim).share_memory_()
+        self.logprobs = torch.zeros(horizon, num_envs, logprob_dim).share_memory_()
+        self.rewards = torch.zeros(horizon, num_envs, dtype=torch.float64).share_memory_()
+        self.dones = torch.zeros(horizon, num_envs, dtype=torch.bool).share_memory_()
+        self.profits = torch.zeros(horizon, num_envs, dtype=torch.float64).share_memory_()
+
+    def write_step(self, t, lo, states, actions, logprobs, rewards, dones, profits):
+        """ Escreve o passo t dos ambientes [lo, lo + len(states)) de um worker """
+        hi = lo + len(states)
+        self.states[t, lo:hi] = states
+        self.actions[t, lo:hi] = actions
+        self.logprobs[t, lo:hi] = logprobs
+        self.rewards[t, lo:hi] = torch.as_tensor(rewards, dtype=torch.float64)
+        self.dones[t, lo:hi] = torch.as_tensor(dones, dtype=torch.bool)
+        self.profits[t, lo:hi] = torch.as_tensor(profits, dtype=torch.float64)
+
+    def write_final_states(self, lo, states):
+        self.states[self.horizon, lo:lo + len(states)] = states
+
+    def fill_buffer(self, buffer, device):
+        """ Passa a ronda para o ParallelRolloutBuffer do learner (uma cópia em bloco por campo) """
+        buffer.load(self.states.to(device), self.actions.to(device), self.logprobs.to(device),
+                    self.rewards, self.dones)
+
+
+class SharedWeights:
+    """
+    Pesos do ator em memória partilhada: o learner publica-os no lugar (copy_) a cada iteração e
+    os workers carregam-nos para a sua cópia local quando recebem o sinal, em vez de um state_dict
+    serializado por worker. `version` conta as publicações.
+
+    Com o treino assíncrono o learner pode publicar enquanto um worker está a carregar os pesos; o lock
+    garante que o worker lê sempre uma versão completa (e devolve o número dessa versão).
+    """
+
+    def __init__(self, module):
+        self.tensors = {k: v.detach().cpu().clone().share_memory_() for k, v in module.state_dict().items()}
+        self.version = torch.zeros(1, dtype=torch.int64).share_memory_()
+        self.lock = mp.Lock()
+
+    def publish(self, module):
+        with self.lock, torch.no_grad():
+            for k, v in module.state_dict().items():
+                self.tensors[k].copy_(v)
+            self.version += 1
+            return int(self.version.item())
+
+    def load_into(self, module):
+        with self.lock:
+            module.load_state_dict(self.tensors)
+            return int(self.version.item())
@@ -0,0 +1,231 @@
+"""
+Agendador de treinos PPO: recebe uma matriz de trabalhos (tipo de agente, SKU, seed, hiperparâmetros) e
+distribui-os por um pool persistente de processos, um por core. Cada trabalho corre o treino completo num só
+processo (train_single_process do script de treino do agente) e grava tudo numa pasta própria:
+
+    <out-dir>/<agente>/<sku>/seed<seed>[_<hiperparâmetros>]/
+        job.json      definição do trabalho
+        train.log     progresso por iteração
+        result.json   resumo (lucro, losses, episódios/s) ou traceback do erro
+        *.pth         modelo final
+
+Cada dataset é publicado uma única vez em memória partilhada (SharedDataset) e servido a todos os trabalhos
+que o usam. Exemplo (retreino noturno dos 5 SKUs x 2 seeds numa só passagem):
+
+    python -m orchestration.training_scheduler --agents buyer pricing --seeds 42 1337 --out-dir treinos/noturno
+    python -m orchestration.training_scheduler --agents pricing --skus 3_080 --hparam gamma=0.8,0.9 --hparam max_episodes=640
+"""
+import argparse
+import ast
+import importlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from orchestration.shared_dataset import SharedDataset
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Tipo de agente -> (pasta, módulo de treino)
+AGENTS = {
+    'buyer': ('BuyerAgent', '0_training_constrained'),
+    'pricing': ('StockManagement', 'train_pricing'),
+}
+
+# SKU -> ficheiro do dataset dentro de <pasta do agente>/datasets
+SKU_DATASETS = {
+    '3_080': 'm5_foods_3_080.xlsx',
+    '3_090': 'm5_foods_3_090.xlsx',
+    '3_252': 'm5_foods_3_252.xlsx',
+    '3_586': 'm5_foods_3_586.xlsx',
+    '911753': '911753_151dias_com_real.xlsx',
+}
+
+DEFAULT_SEEDS = [42, 1337]
+
+
+def dataset_path(agent, sku):
+    if sku not in SKU_DATASETS:
+        raise ValueError(f"SKU desconhecido: {sku!r} (conhecidos: {sorted(SKU_DATASETS)})")
+    return os.path.join(ROOT, AGENTS[agent][0], 'datasets', SKU_DATASETS[sku])
+
+
+def build_jobs(agents, skus, seeds, hparam_grid=None):
+    """ Produto cartesiano agentes x SKUs x seeds x grelha de hiperparâmetros ({nome: [valores]}) """
+    grid = hparam_grid or {}
+    names = sorted(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    jobs = []
+    for agent, sku, seed, hparams in itertools.product(agents, skus, seeds, combos):
+        if agent not in AGENTS:
+            raise ValueError(f"Agente desconhecido: {agent!r} (conhecidos: {sorted(AGENTS)})")
+        jobs.append({'agent': agent, 'sku': sku, 'seed': int(seed), 'hparams': hparams,
+                     'dataset': dataset_path(agent, sku)})
+    return jobs
+
+
+def job_dir(out_dir, job):
+    name = f"seed{job['seed']}"
+    if job['hparams']:
+        tag = '_'.join(f"{key}-{value}" for key, value in sorted(job['hparams'].items()))
+        name += '_' + re.sub(r'[^A-Za-z0-9._\-]+', '', tag)
+    return os.path.join(out_dir, job['agent'], job['sku'], name)
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+def _init_worker():
+    """ Um treino por core: o PyTorch de cada processo do pool fica com uma só thread """
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+    import torch
+    torch.set_num_threads(1)
+
+
+def agent_module(agent, module_name):
+    """
+    Importa um módulo da pasta do agente neste processo. BuyerAgent e StockManagement têm ambos um pacote
+    `agent`; como cada script fica com as suas referências depois de importado, basta garantir que no momento
+    do import o `agent` em sys.modules é o da pasta certa.
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    for name in [n for n in sys.modules if n == 'agent' or n.startswith('agent.')]:
+        del sys.modules[name]
+    path = os.path.join(ROOT, AGENTS[agent][0])
+    if path in sys.path:
+        sys.path.remove(path)
+    sys.path.insert(0, path)
+    if ROOT not in sys.path:
+        sys.path.append(ROOT)
+    return importlib.import_module(module_name)
+
+
+def _training_module(agent):
+    return agent_module(agent, AGENTS[agent][1])
+
+
+def _run_job(job, dataset_spec, out_path):
+    """ Corre um trabalho num processo do pool; os erros ficam no result.json em vez de parar o agendador """
+    os.makedirs(out_path, exist_ok=True)
+    _write_json(os.path.join(out_path, 'job.json'), job)
+    start = time.time()
+    dataset = None
+    try:
+        module = _training_module(job['agent'])
+        dataset = SharedDataset.attach(dataset_spec)
+        extra = {'sku_name': job['sku']} if job['agent'] == 'pricing' else {}
+        with open(os.path.join(out_path, 'train.log'), 'w', encoding='utf-8') as log_file:
+            def log(message):
+                log_file.write(f"{message}\n")
+                log_file.flush()
+            summary = module.train_single_process(job['seed'], job['dataset'], out_path, data_frame=dataset.frame,
+                                                  hparams=job['hparams'], log=log, **extra)
+        result = {'status': 'ok', **summary}
+    except Exception:
+        result = {'status': 'error', 'error': traceback.format_exc()}
+    finally:
+        if dataset is not None:
+            dataset.close()
+    result.update(job=job, out_dir=out_path, pid=os.getpid(), wall_s=time.time() - start)
+    _write_json(os.path.join(out_path, 'result.json'), result)
+    return result
+
+
+def run_jobs(jobs, out_dir, max_workers=None, on_result=None):
+    """
+    Corre todos os trabalhos num pool persistente de max_workers processos (por omissão, um por core) e
+    devolve os resultados pela ordem de conclusão. Também grava <out_dir>/summary.json.
+    """
+    if not jobs:
+        return []
+    max_workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.time()
+    datasets = {}
+    results = []
+    try:
+        for job in jobs:
+            if job['dataset'] not in datasets:
+                datasets[job['dataset']] = SharedDataset.publish(job['dataset'])
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context('spawn'),
+                                 initializer=_init_worker) as pool:
+            futures = [pool.submit(_run_job, job, datasets[job['dataset']].spec, job_dir(out_dir, job)) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result is not None:
+                    on_result(result, len(results), len(jobs))
+    finally:
+        for dataset in datasets.values():
+            dataset.close()
+            dataset.unlink()
+
+    wall_s = time.time() - start
+    _write_json(os.path.join(out_dir, 'summary.json'), {
+        'wall_s': wall_s,
+        'sum_job_s': sum(r['wall_s'] for r in results),
+        'max_workers': max_workers,
+        'jobs': results,
+    })
+    return results
+
+
+def _parse_hparam(text):
+    """ 'nome=v1,v2' -> ('nome', [v1, v2]), com os valores convertidos para número quando possível """
+    if '=' not in text:
+        raise argparse.ArgumentTypeError(f"Hiperparâmetro inválido {text!r} (usar nome=valor[,valor...])")
+    name, raw = text.split('=', 1)
+    values = []
+    for item in raw.split(','):
+        try:
+            values.append(ast.literal_eval(item))
+        except (ValueError, SyntaxError):
+            values.append(item)
+    return name.strip(), values
+
+
+def _print_result(result, done, total):
+    job = result['job']
+    label = f"{job['agent']}/{job['sku']}/seed{job['seed']}" + (f" {job['hparams']}" if job['hparams'] else '')
+    if result['status'] == 'ok':
+        print(f"[{done}/{total}] {label}: {result['episodes']} episódios em {result['wall_s']:.0f}s | "
+              f"lucro médio final {result['final_avg_profit']:.2f}€", flush=True)
+    else:
+        print(f"[{done}/{total}] {label}: ERRO (ver {os.path.join(result['out_dir'], 'result.json')})", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agendador de treinos PPO (agente x SKU x seed x hiperparâmetros)")
+    parser.add_argument('--agents', nargs='+', choices=sorted(AGENTS), default=['buyer', 'pricing'])
+    parser.add_argument('--skus', nargs='+', default=sorted(SKU_DATASETS))
+    parser.add_argument('--seeds', nargs='+', type=int, default=DEFAULT_SEEDS)
+    parser.add_argument('--hparam', action='append', type=_parse_hparam, default=[],
+                        help="nome=valor[,valor...] (repetível; vários valores formam uma grelha)")
+    parser.add_argument('--out-dir', default=os.path.join('treinos', time.strftime('%Y%m%d_%H%M%S')))
+    parser.add_argument('--workers', type=int, default=None, help="processos no pool (por omissão, um por core)")
+    args = parser.parse_args()
+
+    jobs = build_jobs(args.agents, args.skus, args.seeds, dict(args.hparam))
+    workers = min(args.workers or os.cpu_count() or 1, len(jobs))
+    print(f"{len(jobs)} trabalhos em {workers} processos -> {os.path.abspath(args.out_dir)}", flush=True)
+    start = time.time()
+    results = run_jobs(jobs, args.out_dir, max_workers=args.workers, on_result=_print_result)
+    failed = [r for r in results if r['status'] != 'ok']
+    total_job_s = sum(r['wall_s'] for r in results)
+    print(f"Concluído em {time.time() - start:.0f}s (soma dos trabalhos: {total_job_s:.0f}s) | {len(failed)} com erro")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+# Testes de regressão das versões vetorizadas face às implementações escalares/em ciclo de referência.
+# Correr a partir da raiz do repositório: python -m pytest tests (ou python -m unittest discover tests)
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUYER_AGENT_DIR = os.path.join(ROOT, 'BuyerAgent')
+for path in (ROOT, BUYER_AGENT_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
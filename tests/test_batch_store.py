@@ -0,0 +1,121 @@
+import unittest
+
+import numpy as np
+
+from biology.batch_store import BatchStore, FIELDS
+from biology.maturation import STATE_FIELDS
+
+
+def random_state(rng):
+    return {name: float(rng.uniform(0.0, 50.0)) for name in STATE_FIELDS}
+
+
+def reference_consume(batches, demand):
+    """ Venda FEFO sobre a lista de dicts já ordenada, como no ambiente original """
+    remaining = demand
+    sold = 0
+    for b in batches:
+        if b['quantity'] <= 0:
+            continue
+        take = min(b['quantity'], remaining)
+        b['quantity'] -= take
+        sold += take
+        remaining -= take
+        if remaining <= 0:
+            break
+    return sold, remaining
+
+
+class BatchStoreTest(unittest.TestCase):
+
+    def assert_same_batches(self, store, batches):
+        got = store.to_dicts()
+        self.assertEqual(len(got), len(batches))
+        for g, b in zip(got, batches):
+            for name in FIELDS:
+                self.assertEqual(g[name], b[name], name)
+
+    def test_daily_cycle_matches_dict_list(self):
+        """ Chegadas, ordenação FEFO estável por RSL, venda, envelhecimento e remoção, ao longo de 300 dias """
+        rng = np.random.default_rng(0)
+        store = BatchStore(capacity=4)
+        batches = []
+        for day in range(300):
+            for _ in range(int(rng.integers(0, 3))):
+                b = {'quantity': float(rng.integers(1, 80)), **random_state(rng)}
+                batches.append(b)
+                store.add(b['quantity'], b)
+            self.assert_same_batches(store, batches)
+
+            # RSL com empates frequentes: a ordem anterior desempata (sort estável)
+            rsls = rng.integers(0, 4, len(batches))
+            order = sorted(range(len(batches)), key=lambda i: rsls[i])
+            batches = [batches[i] for i in order]
+            ordered = store.sort_fefo(store.live_slots(), rsls)
+            self.assert_same_batches(store, batches)
+
+            demand = float(rng.integers(0, 150))
+            self.assertEqual(store.consume(ordered, demand), reference_consume(batches, demand))
+
+            # Envelhecimento: novo estado para os lotes com stock; sai o que foi vendido ou se deteriorou
+            live = ordered[store.cols['quantity'][ordered] > 0]
+            aged = {name: rng.uniform(0.0, 50.0, live.size) for name in STATE_FIELDS}
+            store.write(live, aged)
+            spoiled = rng.random(live.size) < 0.1
+            store.remove(ordered[store.cols['quantity'][ordered] <= 0])
+            store.remove(live[spoiled])
+            live_batches = [b for b in batches if b['quantity'] > 0]
+            for i, b in enumerate(live_batches):
+                b.update({name: float(aged[name][i]) for name in STATE_FIELDS})
+            batches = [b for b, s in zip(live_batches, spoiled) if not s]
+            self.assert_same_batches(store, batches)
+            self.assertEqual(store.total_quantity(), sum(b['quantity'] for b in batches))
+
+    def test_consume_by_owner_matches_sequential_consume(self):
+        rng = np.random.default_rng(1)
+        n_owners = 5
+        store = BatchStore()
+        singles = [BatchStore() for _ in range(n_owners)]
+        for _ in range(40):
+            owner = int(rng.integers(n_owners))
+            b = {'quantity': float(rng.integers(0, 60)), **random_state(rng)}
+            store.add(b['quantity'], b, owner=owner)
+            singles[owner].add(b['quantity'], b)
+        rsls = rng.integers(0, 6, len(store))
+        slots = store.slots()
+        ordered = store.sort_fefo(slots, rsls)
+        demand = rng.integers(0, 200, n_owners).astype(np.float64)
+        sold, missed = store.consume_by_owner(ordered, demand)
+        for owner, single in enumerate(singles):
+            own_rsls = rsls[store.owner[slots] == owner]
+            expected = single.consume(single.sort_fefo(single.slots(), own_rsls), demand[owner])
+            self.assertEqual((sold[owner], missed[owner]), expected)
+            left = store.cols['quantity'][ordered[store.owner[ordered] == owner]]
+            np.testing.assert_array_equal(left, single.cols['quantity'][single.slots()])
+
+    def test_copy_and_snapshot_are_independent(self):
+        rng = np.random.default_rng(2)
+        store = BatchStore.from_dicts([{'quantity': float(q), **random_state(rng)} for q in (10, 20, 30)])
+        before = store.to_dicts()
+
+        fork = store.copy()
+        snapshot = store.snapshot()
+        fork.consume(fork.slots(), 25.0)
+        fork.add(5.0, random_state(rng))
+        self.assertEqual(store.to_dicts(), before)
+
+        store.consume(store.slots(), 15.0)
+        store.remove(store.slots()[:1])
+        restored = BatchStore()
+        restored.restore(snapshot)
+        self.assertEqual(restored.to_dicts(), before)
+
+        # O store reposto continua a comportar-se como o original (slots livres e ordem das novas chegadas)
+        state = random_state(rng)
+        original = BatchStore.from_dicts(before)
+        self.assertEqual(restored.add(7.0, state), original.add(7.0, state))
+        self.assertEqual(restored.to_dicts(), original.to_dicts())
+
+
+if __name__ == '__main__':
+    unittest.main()
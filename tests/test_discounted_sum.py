@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+import torch
+
+from agent.ppo_agent import ParallelRolloutBuffer, segmented_discounted_sum
+
+
+def reference_sum(values, dones, discount, tail=None):
+    """ Ciclo invertido original: y_t = x_t + discount * (1 - done_t) * y_{t+1}, com y_T = tail """
+    out = np.empty_like(values)
+    acc = np.zeros(values.shape[1]) if tail is None else tail.copy()
+    for t in reversed(range(values.shape[0])):
+        acc[dones[t]] = 0.0
+        acc = values[t] + discount * acc
+        out[t] = acc
+    return out
+
+
+class SegmentedDiscountedSumTest(unittest.TestCase):
+
+    def check(self, T, N, discount, terminal_rate, with_tail, seed=0):
+        rng = np.random.default_rng(seed)
+        values = rng.normal(0.0, 5.0, (T, N))
+        dones = rng.random((T, N)) < terminal_rate
+        tail = rng.normal(0.0, 5.0, N) if with_tail else None
+        got = segmented_discounted_sum(torch.tensor(values), torch.tensor(dones), discount,
+                                       tail=None if tail is None else torch.tensor(tail))
+        expected = reference_sum(values, dones, discount, tail)
+        np.testing.assert_allclose(got.numpy(), expected, rtol=1e-9, atol=1e-9 * np.abs(expected).max())
+
+    def test_matches_reversed_loop(self):
+        for discount in (0.0, 0.8, 0.99, 1.0):
+            for with_tail in (False, True):
+                self.check(90, 16, discount, 0.05, with_tail)
+
+    def test_terminals_in_every_position(self):
+        # Terminal no primeiro e no último passo, passos seguidos terminais e ambientes sem terminais
+        values = torch.arange(1.0, 7.0, dtype=torch.float64).unsqueeze(1).repeat(1, 4)
+        dones = torch.zeros(6, 4, dtype=torch.bool)
+        dones[0, 0] = dones[5, 1] = True
+        dones[2:4, 2] = True
+        tail = torch.tensor([10.0, 20.0, 30.0, 40.0], dtype=torch.float64)
+        got = segmented_discounted_sum(values, dones, 0.5, tail=tail)
+        expected = reference_sum(values.numpy(), dones.numpy(), 0.5, tail.numpy())
+        np.testing.assert_allclose(got.numpy(), expected, rtol=1e-12)
+
+    def test_long_rollouts_are_chunked(self):
+        # Com discount pequeno, discount^T sai da gama de float64 e a soma é feita em blocos
+        self.check(3000, 4, 0.5, 0.001, True, seed=1)
+        self.check(5000, 3, 0.8, 0.0, True, seed=2)
+
+    def test_buffer_returns_match_reversed_loop(self):
+        rng = np.random.default_rng(3)
+        T, N = 120, 8
+        rewards = rng.normal(0.0, 3.0, (T, N))
+        dones = rng.random((T, N)) < 0.04
+        bootstrap = rng.normal(0.0, 3.0, N)
+        buffer = ParallelRolloutBuffer()
+        buffer.load(torch.zeros(T + 1, N, 17), torch.zeros(T, N, 1), torch.zeros(T, N, 1),
+                    torch.tensor(rewards), torch.tensor(dones))
+        for tail in (None, bootstrap):
+            np.testing.assert_allclose(buffer.discounted_returns(0.8, tail), reference_sum(rewards, dones, 0.8, tail),
+                                       rtol=1e-9, atol=1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+import numpy as np
+
+from biology.maturation import (_day_coefficients, _integrate_day_np, _integrate_one_py, advance_columns,
+                                project_rsl_columns, VECTOR_MIN_BATCHES, QUALITY_SPOILED)
+from biology.presets import FRUIT_PRESETS
+
+# Climas de armazém (T, HR, etileno externo), incluindo humidade acima do limiar de bolor
+CLIMATES = [(1.5, 92.0, 0.05), (6.0, 85.0, 0.4), (12.0, 97.0, 1.5), (-0.5, 99.0, 0.0)]
+
+
+def random_columns(p, n, rng):
+    """ Lotes com estados espalhados entre a colheita e o fim de vida do preset """
+    dureza_min = float(p["dureza_min"])
+    dureza_0 = float(p["dureza_0_default"])
+    return {
+        'dureza': rng.uniform(dureza_min, dureza_0 * 1.05, n),
+        'brix': rng.uniform(float(p["brix_min"]), float(p["brix_max"]), n),
+        'mold': np.where(rng.random(n) < 0.3, rng.uniform(0.0, 0.3, n), 0.0),
+        'E_int': rng.uniform(0.0, 0.6, n),
+        'age': rng.integers(0, 30, n).astype(np.float64),
+        'quality': np.full(n, 100.0),
+    }
+
+
+def reference_rsl(c, state, max_days=60, threshold=QUALITY_SPOILED):
+    """ RSL de um lote avançando dia a dia com o integrador escalar """
+    for day in range(1, max_days + 1):
+        *state, quality = _integrate_one_py(c, *state)
+        if quality < threshold:
+            return day
+    return max_days
+
+
+class VectorizedKernelTest(unittest.TestCase):
+
+    def test_day_kernel_matches_scalar_integrator(self):
+        rng = np.random.default_rng(0)
+        for fruit_key, p in FRUIT_PRESETS.items():
+            for T_c, RH_pct, E_ext in CLIMATES:
+                for with_mold in (True, False):
+                    c = _day_coefficients(p, T_c, RH_pct, E_ext, 0.05, with_mold)
+                    cols = random_columns(p, 40, rng)
+                    got = _integrate_day_np(c, cols['dureza'], cols['brix'], cols['mold'], cols['E_int'], cols['age'])
+                    for i in range(40):
+                        expected = _integrate_one_py(c, cols['dureza'][i], cols['brix'][i], cols['mold'][i],
+                                                     cols['E_int'][i], cols['age'][i])
+                        np.testing.assert_allclose([g[i] for g in got], expected, rtol=1e-9, atol=1e-12,
+                                                   err_msg=f"{fruit_key} {T_c, RH_pct, E_ext} mold={with_mold}")
+
+    def test_advance_columns_is_the_same_on_both_sides_of_the_vector_threshold(self):
+        rng = np.random.default_rng(1)
+        p = FRUIT_PRESETS["kiwi_hayward"]
+        cols = random_columns(p, VECTOR_MIN_BATCHES * 2, rng)
+        vector = advance_columns(p, cols, 3.0, 93.0, 0.2)
+        small = VECTOR_MIN_BATCHES // 2
+        for lo in range(0, len(cols['dureza']), small):
+            part = advance_columns(p, {k: v[lo:lo + small] for k, v in cols.items()}, 3.0, 93.0, 0.2)
+            for name in cols:
+                np.testing.assert_allclose(vector[name][lo:lo + small], part[name], rtol=1e-9, atol=1e-12)
+
+    def test_rsl_projection_matches_day_by_day_walk(self):
+        rng = np.random.default_rng(2)
+        for fruit_key, p in FRUIT_PRESETS.items():
+            T_c, RH_pct, E_ext = CLIMATES[int(rng.integers(len(CLIMATES)))]
+            cols = random_columns(p, 64, rng)
+            c = _day_coefficients(p, T_c, RH_pct, E_ext, 0.05, True)
+            cols['quality'] = np.array([_integrate_one_py(c, *s)[5] for s in zip(
+                cols['dureza'], cols['brix'], cols['mold'], cols['E_int'], cols['age'])])
+            got = project_rsl_columns(p, cols, T_c, RH_pct, E_ext)
+            for i in range(64):
+                state = (cols['dureza'][i], cols['brix'][i], cols['mold'][i], cols['E_int'][i], cols['age'][i])
+                expected = reference_rsl(c, state) if cols['quality'][i] >= QUALITY_SPOILED else 0
+                self.assertEqual(got[i], expected, f"{fruit_key} lote {i}")
+
+
+if __name__ == '__main__':
+    unittest.main()
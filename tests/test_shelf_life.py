@@ -0,0 +1,58 @@
+import os
+import unittest
+
+import numpy as np
+
+from tests import BUYER_AGENT_DIR
+from environment_constrained import (MAX_COVERAGE_DAYS, StockEnvironment, forecast_prefix_sums,
+                                     min_required_shelf_lives)
+
+DATASET = os.path.join(BUYER_AGENT_DIR, 'datasets', '911753_151dias_com_real.xlsx')
+
+
+def reference_shelf_life(prediction, start, target):
+    """ Ciclo original: soma a previsão dia a dia a partir de `start` (último valor depois do fim) """
+    accumulated = 0.0
+    days = 0
+    step_idx = start
+    while accumulated < target:
+        accumulated += prediction[step_idx] if step_idx < len(prediction) else prediction[-1]
+        days += 1
+        step_idx += 1
+        if days > MAX_COVERAGE_DAYS:
+            break
+    return days
+
+
+class MinRequiredShelfLifeTest(unittest.TestCase):
+
+    def test_prefix_sum_search_matches_day_by_day_walk(self):
+        rng = np.random.default_rng(0)
+        # Previsões inteiras com dias a zero: alvos que caem exatamente numa soma acumulada e patamares planos
+        prediction = rng.integers(0, 40, 50).astype(np.float64)
+        prediction[rng.random(50) < 0.2] = 0.0
+        cum = forecast_prefix_sums(prediction)
+        for start in range(len(prediction) + 1):
+            targets = np.concatenate([rng.uniform(1e-6, 2500.0, 30), np.cumsum(prediction[start:])[:10], [1e9]])
+            targets = targets[targets > 0]  # o ambiente só pesquisa para q > 0
+            got = min_required_shelf_lives(cum, start, targets)
+            expected = [reference_shelf_life(prediction, start, t) for t in targets]
+            np.testing.assert_array_equal(got, expected, err_msg=f"start {start}")
+
+    def test_environment_matches_day_by_day_walk(self):
+        env = StockEnvironment(DATASET, max_capacity=500)
+        env.reset()
+        rng = np.random.default_rng(1)
+        prediction = env.columns['prediction']
+        for step in list(rng.integers(0, env.max_steps + 1, 20)) + [0, env.max_steps]:
+            env.current_step = int(step)
+            quantities = np.concatenate([rng.uniform(-20.0, 3000.0, 25), [0.0, 1e7]])
+            stock = env.batches.total_quantity()
+            expected = [reference_shelf_life(prediction, env.current_step + 1, stock + q) if q > 0 else 0
+                        for q in quantities]
+            np.testing.assert_array_equal(env.get_min_required_order_shelf_lives(quantities), expected)
+            self.assertEqual([env.get_min_required_order_shelf_life(q) for q in quantities], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import unittest
+
+import numpy as np
+
+from tests import BUYER_AGENT_DIR
+from environment_constrained import EnvRunningStat, StockEnvironment, VecStockEnvironment
+from orchestration.dataset_cache import load_dataset
+
+# Dataset curto (91 dias de treino): algumas centenas de passos passam por vários resets automáticos
+DATASET = os.path.join(BUYER_AGENT_DIR, 'datasets', '911753_151dias_com_real.xlsx')
+NUM_ENVS = 6
+NUM_STEPS = 300
+
+
+def new_stats():
+    return {'econ': EnvRunningStat(), 'eco': EnvRunningStat(), 'risk': EnvRunningStat()}
+
+
+class VecStockEnvironmentTest(unittest.TestCase):
+
+    def assert_matches_scalar_environments(self, data_frame=None):
+        """
+        N StockEnvironment com estatística partilhada vs um VecStockEnvironment, com dias desfasados.
+        Devolve a quantidade total deteriorada, para o chamador confirmar que o caso foi exercitado.
+        """
+        rng = np.random.default_rng(0)
+        vec = VecStockEnvironment(DATASET, NUM_ENVS, max_capacity=500, shared_stats=new_stats(), data_frame=data_frame)
+        scalar_stats = new_stats()
+        envs = [StockEnvironment(DATASET, max_capacity=500, shared_stats=scalar_stats, data_frame=data_frame)
+                for _ in range(NUM_ENVS)]
+
+        # Cada ambiente começa num dia diferente, para que os lotes avancem com climas diferentes no mesmo passo
+        offsets = np.arange(NUM_ENVS) * 13
+        vec.reset()
+        vec.current_step[:] = offsets
+        vec_states = vec._get_states()
+        states = []
+        for env, offset in zip(envs, offsets):
+            env.reset()
+            env.current_step = int(offset)
+            states.append(env._get_state())
+        np.testing.assert_allclose(vec_states, np.array(states), rtol=1e-9, atol=1e-12)
+
+        resets = 0
+        spoilage = 0.0
+        for t in range(NUM_STEPS):
+            actions = rng.uniform(0.0, 1.2 * vec.max_order_limit, NUM_ENVS) * (rng.random(NUM_ENVS) < 0.6)
+            vec_states, vec_rewards, vec_dones, vec_info = vec.step(actions)
+            spoilage += vec_info['spoilage'].sum()
+            for i, env in enumerate(envs):
+                state, reward, done, info = env.step(actions[i])
+                if done:
+                    state = env.reset()
+                    resets += 1
+                msg = f"passo {t}, ambiente {i}"
+                self.assertEqual(bool(vec_dones[i]), done, msg)
+                np.testing.assert_allclose(vec_states[i], state, rtol=1e-9, atol=1e-12, err_msg=msg)
+                self.assertAlmostEqual(vec_rewards[i], reward, places=9, msg=msg)
+                for key in ('sales', 'order_placed', 'overflow_waste', 'spoilage', 'profit'):
+                    self.assertAlmostEqual(vec_info[key][i], info[key], places=9, msg=f"{msg}: {key}")
+            np.testing.assert_allclose(vec.stock_profile, [env.stock_profile for env in envs], rtol=1e-9, atol=1e-9)
+
+        self.assertGreaterEqual(resets, 2 * NUM_ENVS)
+        self.assertEqual(vec.env.stat_profit.n, scalar_stats['econ'].n)
+        self.assertAlmostEqual(float(vec.env.stat_profit.mean), float(scalar_stats['econ'].mean), places=9)
+        return spoilage
+
+    def test_matches_scalar_environments(self):
+        self.assert_matches_scalar_environments()
+
+    def test_matches_scalar_environments_with_spoilage(self):
+        """ Armazém quente e com temperatura variável: há lotes deteriorados e climas diferentes entre ambientes """
+        frame = load_dataset(DATASET).copy()
+        frame['temperature'] = 22.0 + 6.0 * np.sin(np.arange(len(frame)) / 3.0)
+        self.assertGreater(self.assert_matches_scalar_environments(frame), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()